@@ -0,0 +1,376 @@
+"""
+Resident analysis service: loads an edge list once, detects its communities (or loads them from the stored
+dendrogram) and keeps the partition in memory, together with an index node -> community and the members of every
+community sorted by centrality, so that questions are answered in milliseconds instead of rerunning Runner.py. Clients
+send one JSON query per line over TCP and receive one JSON answer per line (with 'error' set if the query failed):
+    {"query": "membership", "user": "0"}
+    {"query": "top_users", "community": 3, "measure": "pagerank", "k": 2}   (all communities without "community")
+    {"query": "walks", "walks": 3, "seed": 1, "paths": false}
+    {"query": "recompute", "restarts": 4, "seed": 1}
+    {"query": "status"}
+Membership and top users of an already ranked measure are answered on the event loop. Walks, the first ranking by a
+new measure and recomputations run in a process pool, so the event loop keeps serving reads meanwhile. A recomputation
+also picks up a changed edge list and replaces the partition at once when it is done.
+
+Run from the repository root:
+    python AnalysisService.py <edge list> [--host HOST] [--port PORT] [--workers N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from centrality import sparse_centrality
+from centrality.degree_centrality import nr_top_users
+from loader.edge_list_cache import file_fingerprint, load_edge_list
+from louvain.Louvain_detection import LouvainSession
+from louvain.dendrogram import dendrogram_cache_dir
+from random_walk.batched_walks import batched_random_walks, node_community_array
+
+logger = logging.getLogger('louvain.service')
+host = '127.0.0.1'
+port = 8765
+walks_per_query = 3  # messages distributed per walks query, as in randomWalk.distribute_messages
+max_walk_steps = 1000000  # walks are stopped after this many steps, e.g. on graphs with several components
+
+worker_graph = None  # graph of a worker process, loaded on its first task
+worker_version = None  # version of the edge list the graph of the worker was loaded from
+
+
+def graph_version(path):
+    """
+    :param path: path of the edge list
+    :return: string identifying the current state of the edge list file
+    """
+    return json.dumps(file_fingerprint(path), sort_keys=True)
+
+
+def load_worker_graph(path, version, memory_budget=None):
+    """
+    Returns the graph of a worker process, (re)loading it if the task refers to another version of the edge list.
+    Loading only memory-maps the cached arrays (see load_edge_list), so every worker holds the graph once. A task
+    referring to a version the file does not have anymore fails instead of running over another graph than the
+    partition of the task.
+    :param path: path of the edge list
+    :param version: version of the edge list the task refers to, see graph_version
+    :param memory_budget: bytes the edges may occupy in memory, see load_edge_list
+    :return: CSRGraph of the network
+    """
+    global worker_graph, worker_version
+    if worker_version != version:
+        if graph_version(path) != version:
+            raise RuntimeError('The edge list changed, the query can be answered after a recompute')
+        worker_graph = load_edge_list(path, memory_budget=memory_budget)
+        worker_version = version
+    return worker_graph
+
+
+def compute_centrality(path, version, measure, memory_budget=None):
+    """
+    Worker task: computes a centrality measure of the graph, see sparse_centrality.centrality.
+    :return: array with the centrality of each node
+    """
+    return sparse_centrality.centrality(load_worker_graph(path, version, memory_budget), measure)
+
+
+def compute_walks(path, version, community_of, start_nodes, max_steps, seed, record_paths, memory_budget=None):
+    """
+    Worker task: runs random walks from the given start nodes until they visited every community, see
+    batched_random_walks.
+    :return: (steps of each walk, list of paths or None)
+    """
+    graph = load_worker_graph(path, version, memory_budget)
+    if record_paths:
+        return batched_random_walks(graph, community_of, start_nodes, max_steps, seed, record_paths=True)
+    return batched_random_walks(graph, community_of, start_nodes, max_steps, seed), None
+
+
+def compute_partition(path, version, restarts, seed, memory_budget=None):
+    """
+    Worker task: detects the communities of the graph with the array engine, reusing a stored dendrogram of the same
+    graph and settings.
+    :return: (community index of each node, modularity)
+    """
+    session = LouvainSession(load_worker_graph(path, version, memory_budget))
+    session.louvain_method(engine='csr', restarts=restarts, workers=1, seed=seed, memory_budget=memory_budget,
+                           cache_dir=dendrogram_cache_dir)
+    return session.dendrogram.membership(), session.dendrogram.modularity[-1]
+
+
+class Partition:
+    """
+    Snapshot of a partition with the indexes answering the queries: the community index of every node and, per
+    centrality measure, the members of every community sorted by decreasing centrality (ties by node index). A
+    recomputation builds a new snapshot and swaps it in, so queries never see a partially updated partition.
+    """
+
+    def __init__(self, graph, communities, modularity, scores):
+        """
+        :param graph: CSRGraph of the network
+        :param communities: list of communities
+        :param modularity: modularity of the partition
+        :param scores: dictionary of measure -> centrality of each node, the measures ranked right away
+        """
+        self.graph = graph  # keeps the arrays of the graph mapped as long as the partition is in use
+        self.labels = np.asarray(graph.labels)
+        self.communities = communities
+        self.modularity = modularity
+        # also builds the node key index of the graph (CSRGraph.index), before the first membership query
+        self.community_of = node_community_array(graph, communities)
+        self.position = {community.key: c for c, community in enumerate(communities)}
+        self.ranked = {}
+        self.scores = {}
+        for measure, measure_scores in scores.items():
+            self.rank(measure, measure_scores)
+
+    def rank(self, measure, scores):
+        """
+        Sorts the members of every community by a centrality measure, once for all top user queries of the measure.
+        :param measure: name of the measure
+        :param scores: centrality of each node
+        """
+        order = np.lexsort((-scores, self.community_of))  # stable, so ties stay in node order
+        bounds = np.cumsum(np.bincount(self.community_of, minlength=len(self.communities)))
+        self.ranked[measure] = np.split(order, bounds[:-1])
+        self.scores[measure] = scores
+
+    def membership(self, user):
+        """
+        :param user: key of the user
+        :return: dictionary with the key and size of the community of the user
+        """
+        index = self.graph.index.get(str(user))
+        if index is None:
+            raise ValueError('Unknown user: ' + str(user))
+        community = self.communities[self.community_of[index]]
+        return {'user': str(user), 'community': community.key, 'size': community.size}
+
+    def top_users(self, measure, community_key=None, k=nr_top_users):
+        """
+        :param measure: centrality measure, already ranked
+        :param community_key: key of a community, by default the top users of every community are returned
+        :param k: number of top users per community
+        :return: dictionary of community key -> dictionary of top user -> centrality, as degree_centrality.top_users
+        """
+        if community_key is None:
+            positions = range(len(self.communities))
+        elif community_key in self.position:
+            positions = [self.position[community_key]]
+        else:
+            raise ValueError('Unknown community: ' + str(community_key))
+        scores = self.scores[measure]
+        top_users = {}
+        for c in positions:
+            nodes = self.ranked[measure][c][:k]
+            top_users[self.communities[c].key] = dict(zip(self.labels[nodes].tolist(), scores[nodes].tolist()))
+        return top_users
+
+
+class AnalysisService:
+    """
+    Holds the graph and the current Partition of the service and answers the queries, see the module docstring.
+    """
+
+    def __init__(self, path, workers=None, memory_budget=None):
+        """
+        :param path: path of the edge list
+        :param workers: number of worker processes, by default the number of CPUs
+        :param memory_budget: bytes the edges may occupy in memory, see load_edge_list
+        """
+        self.path = path
+        self.memory_budget = memory_budget
+        self.pool = ProcessPoolExecutor(workers)
+        self.pending = {}  # (version, measure) -> future of a centrality computation
+        self.recomputation = None  # future of the running recomputation
+        self.version = None
+        self.partition = None
+
+    def load(self):
+        """
+        Loads the graph and its partition (from the stored dendrogram if there is one) and ranks the community
+        members by degree.
+        """
+        self.version = graph_version(self.path)
+        graph = load_edge_list(self.path, memory_budget=self.memory_budget)
+        session = LouvainSession(graph)
+        communities = session.louvain_method(engine='csr', memory_budget=self.memory_budget,
+                                             cache_dir=dendrogram_cache_dir)
+        self.partition = Partition(graph, communities, session.dendrogram.modularity[-1],
+                                   {'degree': sparse_centrality.centrality(graph, 'degree')})
+
+    async def offload(self, task, *args):
+        """
+        Runs a worker task in the process pool without blocking the event loop.
+        :param task: module-level function taking the path and version of the edge list as first arguments
+        :return: result of the task
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.pool, task, self.path, *args)
+
+    async def ranked_partition(self, measure):
+        """
+        Returns the current partition with its members ranked by the measure, computing the measure in the pool on
+        its first use. Concurrent queries of the same measure share one computation.
+        :param measure: centrality measure, see sparse_centrality.measures
+        :return: Partition
+        """
+        if measure not in sparse_centrality.measures:
+            raise ValueError('Unknown centrality measure: ' + str(measure))
+        partition = self.partition
+        if measure not in partition.ranked:
+            key = (self.version, measure)
+            if key not in self.pending:
+                self.pending[key] = asyncio.ensure_future(self.offload(compute_centrality, self.version, measure,
+                                                                       self.memory_budget))
+            try:
+                scores = await self.pending[key]
+            finally:
+                self.pending.pop(key, None)
+            if measure not in partition.ranked:
+                partition.rank(measure, scores)
+        return partition
+
+    async def membership(self, user):
+        return self.partition.membership(user)
+
+    async def top_users(self, community=None, measure='degree', k=nr_top_users):
+        if community is not None:
+            community = int(community)  # the keys of JSON objects, e.g. of earlier answers, are strings
+        partition = await self.ranked_partition(measure)
+        return {'top_users': {str(key): users for key, users in partition.top_users(measure, community, k).items()}}
+
+    async def walks(self, walks=walks_per_query, seed=None, max_steps=max_walk_steps, paths=False):
+        """
+        Distributes messages as in randomWalk.distribute_messages: every walk starts from the top user (by degree) of
+        a randomly selected community and runs until it visited every community.
+        """
+        partition = self.partition
+        rnd = np.random.default_rng(seed)
+        start_positions = rnd.integers(0, len(partition.communities), walks)
+        start_nodes = np.array([partition.ranked['degree'][c][0] for c in start_positions.tolist()], dtype=np.int64)
+        steps, walked = await self.offload(compute_walks, self.version, partition.community_of, start_nodes, max_steps,
+                                           int(rnd.integers(0, 2 ** 32)), paths, self.memory_budget)
+        answer = {'walks': [{'start_user': user, 'community': partition.communities[c].key, 'steps': step}
+                            for user, c, step in zip(partition.labels[start_nodes].tolist(),
+                                                     start_positions.tolist(), steps.tolist())]}
+        if paths:
+            for walk, path in zip(answer['walks'], walked):
+                walk['path'] = partition.labels[path].tolist()
+        return answer
+
+    async def recompute(self, restarts=1, seed=None):
+        """
+        Detects the communities again in the pool, e.g. after the edge list changed or with several restarts, and
+        swaps in the new partition. Only one recomputation runs at a time. A changed edge list is cached into new
+        files (see edge_list_cache.publish_cache), so the current partition keeps answering queries from the arrays it
+        mapped until the new partition is installed.
+        """
+        if self.recomputation is not None:
+            raise RuntimeError('A recomputation is already running')
+        start_time = time.perf_counter()
+        version = graph_version(self.path)
+        self.recomputation = asyncio.ensure_future(self.offload(compute_partition, version, restarts, seed,
+                                                                self.memory_budget))
+        try:
+            membership, modularity = await self.recomputation
+        finally:
+            self.recomputation = None
+        graph = self.partition.graph
+        scores = self.partition.scores
+        if version != self.version:  # the edge list changed, so do all centralities
+            graph = load_edge_list(self.path, memory_budget=self.memory_budget)
+            scores = {'degree': sparse_centrality.centrality(graph, 'degree')}
+        communities = LouvainSession(graph).communities_from_membership(graph, membership, self.memory_budget)
+        self.partition = Partition(graph, communities, modularity, scores)
+        self.version = version
+        return {'communities': len(communities), 'modularity': modularity,
+                'time': round((time.perf_counter() - start_time) * 1000, 3)}
+
+    async def status(self):
+        partition = self.partition
+        return {'graph': self.path, 'nodes': partition.graph.number_of_nodes(),
+                'edges': partition.graph.number_of_edges(), 'communities': len(partition.communities),
+                'modularity': partition.modularity, 'measures': sorted(partition.ranked),
+                'recomputing': self.recomputation is not None}
+
+    async def answer(self, request):
+        """
+        Answers one query.
+        :param request: dictionary with the kind of the query under 'query' and its arguments
+        :return: dictionary with the answer, or with the error under 'error'
+        """
+        start_time = time.perf_counter()
+        try:
+            arguments = dict(request)
+            query = self.queries.get(arguments.pop('query', None))
+            if query is None:
+                raise ValueError('Unknown query: ' + str(request.get('query')))
+            answer = await query(self, **arguments)
+        except Exception as error:  # a failed query must not stop the service
+            answer = {'error': str(error) if isinstance(error, (ValueError, RuntimeError, TypeError)) else repr(error)}
+        answer['time'] = round((time.perf_counter() - start_time) * 1000, 3)
+        return answer
+
+    queries = {'membership': membership, 'top_users': top_users, 'walks': walks, 'recompute': recompute,
+               'status': status}
+
+    async def handle_client(self, reader, writer):
+        """
+        Serves one connection: answers its queries, one JSON object per line, in order.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as error:
+                    answer = {'error': 'Invalid JSON: ' + str(error)}
+                else:
+                    answer = await self.answer(request) if isinstance(request, dict) \
+                        else {'error': 'A query is a JSON object'}
+                writer.write(json.dumps(answer).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, serve_host=host, serve_port=port):
+        """
+        Loads the graph and serves queries until the task is cancelled.
+        :param serve_host: interface to listen on
+        :param serve_port: TCP port to listen on
+        """
+        start_time = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, self.load)  # keeps the loop responsive to signals
+        logger.info('Loaded %s with %d communities in %.3f ms', self.path, len(self.partition.communities),
+                    (time.perf_counter() - start_time) * 1000)
+        server = await asyncio.start_server(self.handle_client, serve_host, serve_port)
+        logger.info('Serving on %s', ', '.join(str(socket.getsockname()) for socket in server.sockets))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves community queries on a resident graph.')
+    parser.add_argument('edge_list', help='path of the edge list')
+    parser.add_argument('--host', default=host, help='interface to listen on')
+    parser.add_argument('--port', type=int, default=port, help='TCP port to listen on')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--memory-budget', type=int, default=None, help='memory the edges may occupy in MB')
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    service = AnalysisService(arguments.edge_list, arguments.workers,
+                              arguments.memory_budget * 2 ** 20 if arguments.memory_budget is not None else None)
+    try:
+        asyncio.run(service.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
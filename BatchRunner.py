@@ -0,0 +1,199 @@
+"""
+Batch entry point: runs the community detection, the top users and the random walks over many edge lists (e.g. the
+SNAP ego networks), one graph per task of a process pool, and writes the results of every graph as JSON to the output
+directory, together with a summary holding the throughput of the batch. Rendering is skipped unless --render is given.
+
+Run from the repository root:
+    python BatchRunner.py <directory or glob of edge lists> [--workers N] [--worker-memory MB] [--output DIR] [--render]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scipy.sparse.csgraph import connected_components
+
+from centrality import sparse_centrality
+from loader.edge_list_cache import load_edge_list
+from louvain.Louvain_detection import LouvainSession
+from louvain.dendrogram import dendrogram_cache_dir
+from random_walk.batched_walks import batched_random_walks, node_community_array
+from random_walk.randomWalk import community_top_users
+
+edge_list_suffixes = ('.txt', '.edges', '.edgelist')  # files of a directory that are read as edge lists
+output_dir = os.path.join('results', 'batch')
+walks_per_graph = 3  # messages distributed per graph, each from the top user of a random community
+max_walk_steps = 1000000  # walks are stopped after this many steps, e.g. on graphs with several components
+memory_budget = None  # bytes the edges of a graph may occupy in memory, set per worker by limit_memory
+
+
+def edge_list_paths(source):
+    """
+    :param source: directory holding edge lists or glob pattern of edge list files
+    :return: sorted list of the paths of the edge lists
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if name.endswith(edge_list_suffixes) and os.path.isfile(os.path.join(source, name)))
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+
+def result_names(paths):
+    """
+    Names the results of every edge list after its file name without extension, or, where several edge lists share
+    that name (e.g. a/0.edges and b/0.txt), after its path relative to the common directory of all edge lists.
+    :param paths: paths of the edge lists
+    :return: list with a distinct name per path, in the order of the paths
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    names = []
+    for stem, path in zip(stems, paths):
+        if stems.count(stem) > 1:
+            common = os.path.commonpath([os.path.abspath(other) for other in paths])
+            stem = os.path.relpath(os.path.abspath(path), common).replace(os.sep, '_')
+        names.append(stem)
+    if len(set(names)) < len(names):
+        raise ValueError('The edge lists do not have distinct result names: ' + ', '.join(paths))
+    return names
+
+
+def limit_memory(worker_memory):
+    """
+    Initializer of the worker processes: caps the memory (data segment) of the worker, so that a single huge graph
+    fails with a MemoryError instead of exhausting the machine, and lets the edge lists and passages of larger graphs
+    run out of core within a quarter of the limit (memory-mapped arrays are not counted against the limit).
+    :param worker_memory: maximum number of bytes per worker, None for no limit
+    """
+    global memory_budget
+    if worker_memory is None:
+        return
+    import resource  # only available on POSIX systems
+
+    resource.setrlimit(resource.RLIMIT_DATA, (worker_memory, worker_memory))
+    memory_budget = worker_memory // 4
+
+
+def process_graph(path, output_directory, render=False, name=None):
+    """
+    Runs every stage on one edge list and stores its results as JSON, named after the edge list. A graph that fails
+    is recorded with its error instead of stopping the batch.
+    :param path: path of the edge list
+    :param output_directory: directory of the JSON results
+    :param render: if True, also renders the walks as PDF next to the results
+    :param name: name of the result files, by default the file name of the edge list without extension
+    :return: dictionary summarizing the graph (status, size, number of communities, timings)
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    result = {'graph': path, 'name': name, 'status': 'ok', 'timings': {}}
+    timings = result['timings']
+    start_time = time.perf_counter()
+    stage_start_time = start_time
+
+    def stage_done(stage):
+        nonlocal stage_start_time
+        now = time.perf_counter()
+        timings[stage] = round((now - stage_start_time) * 1000, 3)
+        stage_start_time = now
+
+    try:
+        graph = load_edge_list(path, memory_budget=memory_budget)
+        result['nodes'] = graph.number_of_nodes()
+        result['edges'] = graph.number_of_edges()
+        stage_done('load')
+
+        session = LouvainSession(graph)
+        communities = session.louvain_method(engine='csr', memory_budget=memory_budget, cache_dir=dendrogram_cache_dir)
+        result['modularity'] = session.dendrogram.modularity[-1]
+        result['communities'] = [sorted(node.key for node in community.total_nodes) for community in communities]
+        stage_done('louvain_method')
+
+        top_users = session.top_users(communities)
+        result['top_users'] = {str(key): users for key, users in top_users.items()}
+        stage_done('top_users')
+
+        # communities never span two components, so only on a connected graph a walk can reach every community
+        result['components'] = int(connected_components(sparse_centrality.adjacency_matrix(graph), directed=False)[0])
+        paths = []
+        if result['components'] == 1:
+            rnd = random.Random(path)
+            start_users = community_top_users(graph, rnd.choices(communities, k=walks_per_graph))
+            steps, paths = batched_random_walks(graph, node_community_array(graph, communities),
+                                                [graph.index[user] for user in start_users], max_walk_steps,
+                                                rnd.randrange(2 ** 32), record_paths=True)
+            result['walks'] = [{'start_user': user, 'steps': step, 'visited_nodes': len(set(walk.tolist()))}
+                               for user, step, walk in zip(start_users, steps.tolist(), paths)]
+        else:
+            result['walks'] = []
+        stage_done('random_walks')
+
+        if render:
+            from visualization.lod_renderer import NetworkRenderer
+
+            labels = [user for users in top_users.values() for user in users]
+            renderer = NetworkRenderer(graph, communities, labels=labels)
+            for j, (walk, color) in enumerate(zip(paths, ['r', 'g', 'b'] * walks_per_graph)):
+                renderer.render(os.path.join(output_directory, name + '-random_walk' + str(j + 1) + '.pdf'),
+                                [graph.labels[i] for i in walk.tolist()], color)
+            stage_done('render')
+    except Exception as error:  # one broken or oversized graph must not stop the batch
+        result['status'] = 'failed'
+        result['error'] = repr(error)
+    result['time'] = round((time.perf_counter() - start_time) * 1000, 3)
+
+    with open(os.path.join(output_directory, name + '.json'), 'w') as result_file:
+        json.dump(result, result_file)
+    summary = {key: result[key] for key in ('graph', 'name', 'status', 'nodes', 'edges', 'modularity', 'time', 'error')
+               if key in result}
+    summary['communities'] = len(result.get('communities', ()))
+    return summary
+
+
+def run(source, workers=None, worker_memory=None, output_directory=output_dir, render=False):
+    """
+    Processes all edge lists of a directory or glob pattern across a process pool.
+    :param source: directory holding edge lists or glob pattern of edge list files
+    :param workers: number of worker processes, by default the number of CPUs
+    :param worker_memory: maximum number of bytes per worker process, unlimited by default
+    :param output_directory: directory of the JSON results
+    :param render: if True, also renders the walks of every graph
+    :return: dictionary with the summary of the batch, as stored in summary.json
+    """
+    paths = edge_list_paths(source)
+    names = result_names(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(output_directory, exist_ok=True)
+
+    start_time = time.perf_counter()
+    graphs = []
+    with ProcessPoolExecutor(workers, initializer=limit_memory, initargs=(worker_memory,)) as pool:
+        for graph in pool.map(process_graph, paths, [output_directory] * len(paths), [render] * len(paths), names):
+            graphs.append(graph)
+            print(graph['status'], graph['graph'], graph.get('communities'), 'communities', graph['time'], 'ms')
+    elapsed = time.perf_counter() - start_time
+
+    summary = {'source': source, 'workers': workers, 'worker_memory': worker_memory, 'graphs': len(graphs),
+               'failed': sum(graph['status'] != 'ok' for graph in graphs), 'time': round(elapsed, 3),
+               'graphs_per_second': round(len(graphs) / elapsed, 3) if elapsed > 0 else None, 'results': graphs}
+    with open(os.path.join(output_directory, 'summary.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    print('Processed ', summary['graphs'], ' graphs (', summary['failed'], ' failed) in ', summary['time'], 's: ',
+          summary['graphs_per_second'], ' graphs per second')
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the community detection over many edge lists.')
+    parser.add_argument('source', help='directory holding edge lists or glob pattern of edge list files')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--worker-memory', type=int, default=None, help='maximum memory per worker in MB')
+    parser.add_argument('--output', default=output_dir, help='directory of the JSON results')
+    parser.add_argument('--render', action='store_true', help='also render the random walks as PDF')
+    arguments = parser.parse_args()
+    run(arguments.source, arguments.workers,
+        arguments.worker_memory * 2 ** 20 if arguments.worker_memory is not None else None, arguments.output,
+        arguments.render)
@@ -1,25 +1,32 @@
-from centrality.degree_centrality import top_users
-from louvain.Louvain_detection import louvain_method
-from visualization.Visualizer import visualize_network
-from random_walk.randomWalk import distribute_messages
+import logging
 
+from loader.edge_list_cache import load_edge_list
+from louvain.Louvain_detection import LouvainSession
+from louvain.dendrogram import dendrogram_cache_dir
+from louvain.observers import LoggingObserver
+from visualization.lod_renderer import NetworkRenderer
 
-import networkx as nx
 
+memory_budget = None  # bytes the edges may occupy in memory, set it for edge lists larger than the memory
 
-#graph = nx.read_edgelist('data/testgraph2.txt')
-graph = nx.read_edgelist('data/facebook_combined.txt')
+#graph = load_edge_list('data/testgraph2.txt')
+graph = load_edge_list('data/facebook_combined.txt', memory_budget=memory_budget)
 
 
 def main():
-    communities = louvain_method(graph)
-    #visualize_network(graph, "louvain_communities.pdf", communities, [], [])
-    find_top_users(communities)
-    run_random_walks(communities)
-
-
-def run_random_walks(communities):
-    random_walks = distribute_messages(graph, communities)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    session = LouvainSession(graph, observer=LoggingObserver())
+    # the stored partition is reused as long as the graph does not change
+    communities = session.louvain_method(engine='csr', memory_budget=memory_budget, cache_dir=dendrogram_cache_dir)
+    #NetworkRenderer(graph, communities).render("louvain_communities.pdf")
+    find_top_users(session)
+    run_random_walks(session, communities)
+
+
+def run_random_walks(session, communities):
+    random_walks = session.distribute_messages(communities)
+    top_users = [user for users in session.top_users(communities).values() for user in users]
+    renderer = NetworkRenderer(graph, communities, labels=top_users)  # draws the network once for every walk
     edge_colors = ['r', 'g', 'b']
     j = 0
     for walk in random_walks:
@@ -27,11 +34,11 @@ def run_random_walks(communities):
         color = edge_colors[j]
         j += 1
         file_name = 'random_walk' + str(j) + '.pdf'
-        visualize_network(graph, file_name, communities, walk, color)
+        renderer.render(file_name, walk, color)
 
 
-def find_top_users(communities):
-    top_users_in_communities = top_users(graph, communities)
+def find_top_users(session):
+    top_users_in_communities = session.top_users()
     for community in top_users_in_communities:
         print('Community ', community)
         user_dict = top_users_in_communities[community]
@@ -0,0 +1,54 @@
+"""
+Benchmark of the convergence settings of the louvain passages (csr_louvain.Convergence): compares the full local
+moves with the active-node queue and with several minimum modularity gains per iteration, in time, node evaluations,
+iterations and modularity, on data/facebook_combined.txt and a synthetic planted-partition graph.
+
+Run from the repository root: python -m benchmarks.convergence [edge list] [number of nodes of the synthetic graph]
+"""
+import sys
+import time
+
+from benchmarks.suite import planted_partition_graph
+from loader.edge_list_cache import load_edge_list
+from louvain.csr_louvain import Convergence, louvain
+
+settings = [('full', Convergence()),
+            ('active nodes', Convergence(active_nodes=True))] + \
+           [('min gain ' + str(gain), Convergence(min_iteration_gain=gain)) for gain in (1e-3, 1e-4, 1e-5)] + \
+           [('active nodes, min gain ' + str(gain), Convergence(active_nodes=True, min_iteration_gain=gain,
+                                                               min_passage_gain=gain)) for gain in (1e-3, 1e-4)]
+
+
+def run_graph(name, csr):
+    """
+    Runs the array engine with every convergence setting on one graph and prints the trade-off.
+    :param name: name of the graph
+    :param csr: CSRGraph of the network
+    :return: list of dictionaries with the results per setting
+    """
+    print('\n', name, ': ', csr.number_of_nodes(), ' nodes, ', csr.number_of_edges(), ' edges')
+    results = []
+    for setting_name, convergence in settings:
+        start_time = time.time()
+        result = louvain(csr, convergence=convergence)
+        elapsed = round((time.time() - start_time) * 1000, 3)
+        results.append({'setting': setting_name, 'time': elapsed, 'modularity': result.modularity[-1],
+                        'communities': result.passages[-1]['communities'],
+                        'iterations': sum(passage['iterations'] for passage in result.passages),
+                        'evaluated': sum(passage['evaluated'] for passage in result.passages)})
+        print('\t', setting_name, ': ', elapsed, 'ms, ', results[-1]['evaluated'], ' node evaluations in ',
+              results[-1]['iterations'], ' iterations, modularity ', round(result.modularity[-1], 6))
+    return results
+
+
+def run(path='data/facebook_combined.txt', nodes=100000):
+    return run_graph(path, load_edge_list(path)) + run_graph('planted_' + str(nodes), planted_partition_graph(nodes)[0])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(sys.argv[1], int(sys.argv[2]))
+    elif len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        run()
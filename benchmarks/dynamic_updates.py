@@ -0,0 +1,75 @@
+"""
+Benchmark of the dynamic community maintenance (louvain/dynamic_louvain.py): measures the latency of applying
+batches of random edge insertions and deletions to the communities, compared with a full rerun of louvain_method.
+
+Run from the repository root: python -m benchmarks.dynamic_updates [edge list] [batch sizes...]
+"""
+import random
+import sys
+import time
+
+import networkx as nx
+
+from louvain.Louvain_detection import louvain_method
+from louvain.dynamic_louvain import DynamicCommunities
+
+
+def random_batch(graph, size, rnd):
+    """
+    Draws a batch of half removals of existing edges and half insertions of new edges between random nodes.
+    :param graph: networkx graph of the network
+    :param size: number of edge changes in the batch
+    :param rnd: random.Random instance
+    :return: (added edges, removed edges)
+    """
+    nodes = list(graph.nodes)
+    removed = rnd.sample(list(graph.edges()), size // 2)
+    added = []
+    while len(added) < size - size // 2:
+        u, v = rnd.choice(nodes), rnd.choice(nodes)
+        if u != v and not graph.has_edge(u, v):
+            added.append((u, v))
+    return added, removed
+
+
+def run(path='data/facebook_combined.txt', batch_sizes=(1, 10, 100, 1000), batches=5, seed=0):
+    """
+    Runs the benchmark and prints the mean latency per batch next to the time of a full rerun.
+    :param path: edge list of the network
+    :param batch_sizes: numbers of edge changes per batch
+    :param batches: number of batches measured per batch size
+    :param seed: seed of the random batches
+    :return: list of dictionaries with the results per batch size
+    """
+    graph = nx.read_edgelist(path)
+    start_time = time.time()
+    communities = louvain_method(graph, engine='csr')
+    full_time = (time.time() - start_time) * 1000
+    dynamic = DynamicCommunities(graph, communities)
+    rnd = random.Random(seed)
+
+    print('Full rerun of louvain_method (csr engine): ', round(full_time, 3), 'ms')
+    results = []
+    for batch_size in batch_sizes:
+        latencies = []
+        for _ in range(batches):
+            added, removed = random_batch(graph, batch_size, rnd)
+            latencies.append(dynamic.apply_batch(added, removed)['time'])
+        start_time = time.time()
+        louvain_method(graph, engine='csr')
+        rerun_time = (time.time() - start_time) * 1000
+        latency = sum(latencies) / len(latencies)
+        results.append({'batch_size': batch_size, 'latency': latency, 'full_rerun': rerun_time,
+                        'modularity': dynamic.modularity(), 'communities': len(dynamic.communities)})
+        print('Batch size ', batch_size, ': ', round(latency, 3), 'ms per batch vs. ', round(rerun_time, 3),
+              'ms full rerun, modularity ', dynamic.modularity())
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(sys.argv[1], [int(size) for size in sys.argv[2:]])
+    elif len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        run()
@@ -0,0 +1,52 @@
+"""
+Validates the analytical community hitting times (random_walk/hitting_times.py) against simulated walks on
+data/testgraph2.txt and times the analysis on data/facebook_combined.txt.
+
+Run from the repository root: python -m benchmarks.hitting_times
+"""
+import time
+
+import numpy as np
+
+from loader.edge_list_cache import load_edge_list
+from louvain.Louvain_detection import louvain_method
+from random_walk.hitting_times import community_hitting_times, simulated_hitting_times
+
+
+def detect(path):
+    graph = load_edge_list(path)
+    communities = louvain_method(graph, engine='csr')
+    return graph, communities
+
+
+def validate(path='data/testgraph2.txt', walks=20000, seed=0):
+    """
+    Compares the analytical hitting times with the mean of simulated walks.
+    :return: largest relative deviation between the analytical and the simulated hitting times
+    """
+    graph, communities = detect(path)
+    analysis = community_hitting_times(graph, communities)
+    simulated = simulated_hitting_times(graph, communities, analysis['start_users'], walks, seed)
+    expected = analysis['hitting_times']
+    deviation = np.max(np.abs(simulated - expected) / np.maximum(expected, 1))
+    print('Analytical hitting times:\n', np.round(expected, 3))
+    print('Simulated hitting times (', walks, ' walks):\n', np.round(simulated, 3))
+    print('Largest relative deviation: ', round(float(deviation), 4))
+    return deviation
+
+
+def time_analysis(path='data/facebook_combined.txt'):
+    graph, communities = detect(path)
+    start_time = time.time()
+    analysis = community_hitting_times(graph, communities)
+    elapsed = round((time.time() - start_time) * 1000, 3)
+    print('Hitting times of ', len(communities), ' communities on ', path, ': ', elapsed, 'ms')
+    print('Expected steps to reach every community from the top users: between ',
+          round(float(np.min(analysis['cover_time_lower'])), 1), ' and ',
+          round(float(np.max(analysis['cover_time_upper'])), 1))
+    return elapsed
+
+
+if __name__ == '__main__':
+    validate()
+    time_analysis()
@@ -0,0 +1,64 @@
+"""
+Benchmark of the influence simulation (random_walk/influence.py): reports the reach probability and mean time to
+reach of the communities of data/facebook_combined.txt for independent cascades and SIR spread from the top users of a
+few communities, and times thousands of trials on a synthetic planted-partition graph with millions of edges.
+
+Run from the repository root: python -m benchmarks.influence [number of nodes of the synthetic graph] [trials]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.suite import planted_partition_graph
+from loader.edge_list_cache import load_edge_list
+from louvain.Louvain_detection import LouvainSession
+from random_walk.influence import simulate_influence
+
+models = [('independent cascade', 0.02, 1.0), ('SIR', 0.02, 0.3)]  # (name, transmission, recovery)
+
+
+def report(name, results, elapsed, trials):
+    """
+    Prints the reach of the communities from every source community.
+    """
+    print('\t', name, ': ', len(results) * trials, ' trials in ', round(elapsed, 3), 's (',
+          round(len(results) * trials / elapsed, 1), ' trials per second)')
+    for result in results:
+        reached = result['reach_probability'] > 0
+        with np.errstate(invalid='ignore'):
+            mean_time = np.nanmean(result['mean_time_to_reach'][reached])
+        print('\t\tsource ', result['source'], ' (top users ', result['seeds'], '): ', int(reached.sum()),
+              ' of ', reached.size, ' communities reached, mean reach probability ',
+              round(float(result['reach_probability'].mean()), 4), ', mean time to reach ', round(float(mean_time), 2),
+              ' steps, ', round(float(result['reached_users'].mean()), 1), ' users per trial')
+
+
+def run_graph(name, graph, communities, trials, sources):
+    print('\n', name, ': ', graph.number_of_nodes(), ' nodes, ', graph.number_of_edges(), ' edges, ',
+          len(communities), ' communities')
+    for model, transmission, recovery in models:
+        start_time = time.time()
+        results = simulate_influence(graph, communities, sources, trials, transmission, recovery, seed=0)
+        report(model, results, time.time() - start_time, trials)
+
+
+def run(nodes=500000, trials=2000):
+    graph = load_edge_list('data/facebook_combined.txt')
+    communities = LouvainSession(graph).louvain_method(engine='csr')
+    largest = sorted(communities, key=lambda community: community.size, reverse=True)
+    run_graph('data/facebook_combined.txt', graph, communities, 1000, [community.key for community in largest[:3]])
+
+    graph, planted = planted_partition_graph(nodes)
+    communities = LouvainSession(graph).communities_from_membership(graph, planted)
+    largest = max(communities, key=lambda community: community.size)
+    run_graph('planted_' + str(nodes), graph, communities, trials, [largest.key])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(int(sys.argv[1]), int(sys.argv[2]))
+    elif len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
@@ -0,0 +1,53 @@
+"""
+Benchmark of the warm-started resolution sweep (csr_louvain.resolution_sweep): compares its time with a single cold
+detection and with one cold detection per resolution, and the number of communities and modularity at every
+resolution with the cold detections, on data/facebook_combined.txt.
+
+Run from the repository root: python -m benchmarks.resolution_sweep [edge list] [number of resolutions]
+"""
+import sys
+import time
+
+import numpy as np
+
+from loader.edge_list_cache import load_edge_list
+from louvain.csr_louvain import louvain, resolution_sweep
+
+
+def run(path='data/facebook_combined.txt', resolutions=20):
+    csr = load_edge_list(path)
+    louvain(csr)  # loads the compiled kernel, if any, before the timings
+    print(path, ': ', csr.number_of_nodes(), ' nodes, ', csr.number_of_edges(), ' edges')
+    sweep_resolutions = np.linspace(0.2, 4, resolutions).tolist()
+
+    start_time = time.time()
+    louvain(csr)
+    cold_time = time.time() - start_time
+
+    start_time = time.time()
+    partitions = resolution_sweep(csr, sweep_resolutions)
+    sweep_time = time.time() - start_time
+
+    start_time = time.time()
+    cold_results = [louvain(csr, resolution=resolution) for resolution in sweep_resolutions]
+    cold_sweep_time = time.time() - start_time
+
+    print('\tsingle cold detection: ', round(cold_time * 1000, 3), 'ms')
+    print('\twarm-started sweep of ', resolutions, ' resolutions: ', round(sweep_time * 1000, 3), 'ms (',
+          round(sweep_time / cold_time, 2), ' cold detections)')
+    print('\tcold detection per resolution: ', round(cold_sweep_time * 1000, 3), 'ms (',
+          round(cold_sweep_time / cold_time, 2), ' cold detections)')
+    for partition, cold in zip(partitions, cold_results):
+        print('\t\tresolution ', round(partition['resolution'], 3), ': ', partition['communities'],
+              ' communities, modularity ', round(partition['resolution_modularity'], 6), ' (cold: ',
+              cold.passages[-1]['communities'], ' communities, modularity ', round(cold.modularity[-1], 6), ')')
+    return {'cold': cold_time, 'sweep': sweep_time, 'cold_sweep': cold_sweep_time}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(sys.argv[1], int(sys.argv[2]))
+    elif len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        run()
@@ -0,0 +1,265 @@
+"""
+Benchmark suite over reproducible synthetic graphs with planted communities, from 10^3 to 10^6 nodes, and
+data/facebook_combined.txt. Times louvain_method (per engine), top_users, distribute_messages and the drawing
+(visualize_network on small graphs, the level-of-detail NetworkRenderer on larger ones) separately, and reports wall
+time, peak memory (tracemalloc), modularity and the NMI of the detected against the planted communities. The results
+are stored as JSON in results/benchmarks, named after the current commit, so runs can be compared across commits.
+
+Wall times are measured while tracemalloc traces the allocations, which slows down the pure Python parts; pass
+--no-memory for untraced wall times.
+
+Run from the repository root: python -m benchmarks.suite [--no-memory] [numbers of nodes...]
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from loader.edge_list_cache import load_edge_list
+from louvain import csr_louvain
+from louvain.Louvain_detection import LouvainSession
+from louvain.csr_graph import from_edge_arrays, from_networkx
+from random_walk.batched_walks import node_community_array
+from visualization import layout_cache
+from visualization.Visualizer import visualize_network
+from visualization.lod_renderer import NetworkRenderer
+
+sizes = (1000, 10000, 100000, 1000000)
+engines = ('objects', 'csr')
+max_object_nodes = 100000  # the object engine is only run up to this number of nodes
+max_visualized_nodes = 5000  # visualize_network is only run up to this number of nodes
+max_rendered_nodes = 100000  # NetworkRenderer is only run up to this number of nodes
+results_dir = os.path.join('results', 'benchmarks')
+
+
+def planted_partition_graph(n, average_degree=10, mixing=0.2, seed=0):
+    """
+    Generates an LFR-style graph with planted communities: community sizes and node degrees follow power laws, and
+    every edge leaves the community of its source node with probability mixing. A random tree inside every community
+    and a random tree between the communities keep the graph connected, so that every walk can reach every community.
+    Edges are drawn as whole arrays, so graphs with millions of nodes take seconds.
+    :param n: number of nodes
+    :param average_degree: average degree of the nodes
+    :param mixing: fraction of the edges between communities
+    :param seed: seed of the generator, the same seed gives the same graph
+    :return: (CSRGraph with the integers 0..n-1 as node keys, planted community of each node)
+    """
+    rng = np.random.default_rng(seed)
+    min_size, max_size = 20, max(20, 5 * int(np.sqrt(n)))
+    sizes = power_law(rng, n // min_size + 1, min_size, max_size, 1.5).astype(np.int64)
+    number_of_communities = int(np.searchsorted(np.cumsum(sizes), n)) + 1
+    sizes = sizes[:number_of_communities]
+    sizes[-1] = n - sizes[:-1].sum()
+    first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    planted = np.repeat(np.arange(number_of_communities), sizes)
+
+    # every node but the first of its community links to an earlier node of its community, every community but the
+    # first links to a node of an earlier community
+    position = np.arange(n) - first[planted]
+    branch = position > 0
+    tree_source = np.concatenate([np.flatnonzero(branch), first[1:]])
+    tree_target = np.concatenate([first[planted[branch]] + (rng.random(int(branch.sum())) * position[branch])
+                                  .astype(np.int64), (rng.random(number_of_communities - 1) * first[1:])
+                                  .astype(np.int64)])
+
+    # sources drawn by power-law propensity, targets inside the source's community unless the edge is mixed
+    edges = max(n * average_degree // 2 - tree_source.size, 0)
+    propensity = power_law(rng, n, 1, n ** 0.5, 2.5)
+    source = rng.choice(n, edges, p=propensity / propensity.sum())
+    community = planted[source]
+    target = first[community] + (rng.random(edges) * sizes[community]).astype(np.int64)
+    mixed = rng.random(edges) < mixing
+    target[mixed] = rng.integers(0, n, int(mixed.sum()))
+    source = np.concatenate([tree_source, source])
+    target = np.concatenate([tree_target, target])
+    keep = source != target
+
+    # shuffle the node numbers, so that the communities are not contiguous ranges of nodes
+    permutation = rng.permutation(n)
+    membership = np.empty(n, dtype=np.int64)
+    membership[permutation] = planted
+    csr = from_edge_arrays(list(range(n)), permutation[source[keep]], permutation[target[keep]])
+    return csr, membership
+
+
+def power_law(rng, count, low, high, exponent):
+    """
+    Draws values from a power law p(x) ~ x^-exponent between low and high by inverse transform sampling.
+    """
+    a, b = low ** (1 - exponent), high ** (1 - exponent)
+    return (a + rng.random(count) * (b - a)) ** (1 / (1 - exponent))
+
+
+def normalized_mutual_information(first, second):
+    """
+    Normalized mutual information of two partitions (arithmetic normalization), 1 for identical partitions.
+    :param first: community of each node in the first partition
+    :param second: community of each node in the second partition
+    :return: NMI between 0 and 1
+    """
+    _, a = np.unique(first, return_inverse=True)
+    _, b = np.unique(second, return_inverse=True)
+    n = a.size
+    pairs, counts = np.unique(a.astype(np.int64) * (b.max() + 1) + b, return_counts=True)
+    p_a = np.bincount(a) / n
+    p_b = np.bincount(b) / n
+    joint = counts / n
+    mutual = np.sum(joint * np.log(joint / (p_a[pairs // (b.max() + 1)] * p_b[pairs % (b.max() + 1)])))
+    entropy = -np.sum(p_a * np.log(p_a)) - np.sum(p_b * np.log(p_b))
+    return 1.0 if entropy == 0 else float(2 * mutual / entropy)
+
+
+def partition_modularity(csr, membership):
+    """
+    Modularity of a partition given as membership array, independent of the engine that found it.
+    :param csr: CSRGraph of the network
+    :param membership: community of each node
+    :return: modularity
+    """
+    number_of_communities = int(membership.max()) + 1
+    source = np.repeat(membership, np.diff(csr.indptr))
+    inside = source == membership[csr.indices]
+    internal = np.bincount(source[inside], weights=csr.weights[inside] / 2, minlength=number_of_communities)
+    internal += np.bincount(membership, weights=csr.loops, minlength=number_of_communities)
+    strength = np.bincount(source, weights=csr.weights, minlength=number_of_communities)
+    total_degree = strength + 2 * np.bincount(membership, weights=csr.loops, minlength=number_of_communities)
+    m = csr.weights.sum() / 2 + csr.loops.sum()
+    return csr_louvain.modularity(internal.tolist(), total_degree.tolist(), m)
+
+
+def measure(stage, trace_memory=True):
+    """
+    Runs one stage of the benchmark with its output suppressed.
+    :param stage: function without arguments
+    :param trace_memory: if True, records the peak memory allocated during the stage with tracemalloc
+    :return: (return value of the stage, dictionary with the wall time in ms and the peak memory in MB)
+    """
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            result = stage()
+            wall_time = (time.perf_counter() - start_time) * 1000
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, {'time': round(wall_time, 3), 'peak_memory': None if peak is None else round(peak, 3)}
+
+
+def run_graph(name, csr, planted=None, trace_memory=True):
+    """
+    Runs every stage of the benchmark on one graph.
+    :param name: name of the graph in the results
+    :param csr: CSRGraph of the network
+    :param planted: planted community of each node, if known
+    :param trace_memory: if True, records the peak memory of every stage
+    :return: dictionary with the results of the graph
+    """
+    n = csr.number_of_nodes()
+    result = {'graph': name, 'nodes': n, 'edges': csr.number_of_edges(),
+              'planted_communities': None if planted is None else int(planted.max()) + 1, 'stages': {}}
+    print('\n', name, ': ', n, ' nodes, ', result['edges'], ' edges')
+
+    session = None
+    communities = None
+    # both engines get the node and neighbour order of the networkx graph, as long as the object engine runs
+    network = csr.to_networkx() if 'objects' in engines and n <= max_object_nodes else None
+    for engine in engines:
+        if engine == 'objects' and network is None:
+            continue
+        if engine == 'objects':
+            graph = network
+        else:
+            graph = csr if network is None else from_networkx(network)
+        engine_session = LouvainSession(graph)
+        engine_communities, stage = measure(lambda: engine_session.louvain_method(engine=engine), trace_memory)
+        membership = node_community_array(csr, engine_communities)
+        stage['communities'] = len(engine_communities)
+        stage['modularity'] = partition_modularity(csr, membership)
+        stage['nmi'] = None if planted is None else normalized_mutual_information(planted, membership)
+        result['stages']['louvain_method_' + engine] = stage
+        session, communities = engine_session, engine_communities
+        report('louvain_method (' + engine + ')', stage)
+
+    top_users, stage = measure(lambda: session.top_users(communities), trace_memory)
+    result['stages']['top_users'] = stage
+    report('top_users', stage)
+
+    walks, stage = measure(lambda: session.distribute_messages(communities), trace_memory)
+    stage['walk_lengths'] = [len(walk) for walk in walks]
+    result['stages']['distribute_messages'] = stage
+    report('distribute_messages', stage)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        if n <= max_visualized_nodes:
+            graph = csr.to_networkx()
+            _, stage = measure(lambda: visualize_network(graph, os.path.join(output_dir, 'walk.pdf'), communities,
+                                                         walks[0], 'r'), trace_memory)
+            result['stages']['visualize_network'] = stage
+            report('visualize_network', stage)
+        if n <= max_rendered_nodes:
+            labels = [user for users in top_users.values() for user in users]
+            _, stage = measure(lambda: NetworkRenderer(csr, communities, pos=layout_cache.node_positions(
+                csr, communities, method='community', cache_dir=None), labels=labels).render(
+                os.path.join(output_dir, 'walk.pdf'), walks[0], 'r'), trace_memory)
+            result['stages']['network_renderer'] = stage
+            report('network_renderer', stage)
+    return result
+
+
+def report(stage_name, stage):
+    print('\t', stage_name, ': ', stage['time'], 'ms, peak memory ', stage['peak_memory'], 'MB',
+          *([', modularity ', round(stage['modularity'], 4), ', NMI ', stage['nmi']] if 'modularity' in stage else []))
+
+
+def current_commit():
+    """
+    :return: short hash of the checked out commit, 'unknown' outside of a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(node_counts=sizes, facebook='data/facebook_combined.txt', trace_memory=True, seed=0):
+    """
+    Runs the suite and stores the results as JSON.
+    :param node_counts: numbers of nodes of the synthetic graphs
+    :param facebook: edge list of the real-world graph, None to skip it
+    :param trace_memory: if True, records the peak memory of every stage
+    :param seed: seed of the synthetic graphs
+    :return: dictionary with the results, as stored
+    """
+    results = {'commit': current_commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(), 'numpy': np.__version__, 'trace_memory': trace_memory,
+               'graphs': []}
+    for n in node_counts:
+        csr, planted = planted_partition_graph(n, seed=seed)
+        results['graphs'].append(run_graph('planted_' + str(n), csr, planted, trace_memory))
+    if facebook:
+        results['graphs'].append(run_graph(os.path.basename(facebook), load_edge_list(facebook),
+                                           trace_memory=trace_memory))
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, results['commit'] + '-' + time.strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print('\nResults saved as ', path)
+    return results
+
+
+if __name__ == '__main__':
+    arguments = [argument for argument in sys.argv[1:] if argument != '--no-memory']
+    run([int(n) for n in arguments] if arguments else sizes, trace_memory='--no-memory' not in sys.argv)
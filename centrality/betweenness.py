@@ -0,0 +1,126 @@
+from __future__ import division
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from louvain import multistart
+from louvain.csr_graph import as_csr
+
+betweenness_samples = 500  # default number of sampled source nodes
+confidence = 0.95  # probability with which the error bound holds for all nodes at once
+
+
+def approximate_betweenness(graph_network, samples=betweenness_samples, workers=None, seed=None):
+    """
+    Approximates the (normalized) betweenness centrality of every node by running Brandes' algorithm only from a
+    uniform sample of source nodes and scaling the summed dependencies up to all sources. The sampled sources are
+    split into chunks, which are processed across a process pool over the CSR arrays in shared memory (see
+    multistart.share_graph). Paths follow the unweighted edges, as the random walks do.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param samples: number of sampled source nodes, all nodes (exact betweenness) if there are not more
+    :param workers: number of worker processes, by default the number of CPUs; 1 runs in this process
+    :param seed: seed of the source sample
+    :return: (array with the approximate betweenness of each node, normalized like nx.betweenness_centrality,
+        bound on the absolute error of every node, see error_bound)
+    """
+    csr = as_csr(graph_network)
+    n = csr.number_of_nodes()
+    samples = min(samples, n)
+    if samples == 0:
+        return np.zeros(n), 0.0
+    sources = np.random.default_rng(seed).choice(n, samples, replace=False)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, samples))
+
+    if workers == 1:
+        dependencies = source_dependencies(csr.indptr, csr.indices, sources)
+    else:
+        chunks = np.array_split(sources, 4 * workers)
+        blocks, spec = multistart.share_graph(csr)
+        try:
+            with ProcessPoolExecutor(workers, initializer=multistart.attach_shared_graph, initargs=(spec,)) as pool:
+                dependencies = sum(pool.map(shared_source_dependencies, chunks))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    if n <= 2:
+        return np.zeros(n), 0.0
+    scale = n / samples / ((n - 1) * (n - 2))
+    return dependencies * scale, error_bound(n, samples)
+
+
+def error_bound(n, samples):
+    """
+    Bound on the absolute error of the sampled betweenness of every node, holding for all nodes at once with the
+    probability given by confidence: every sampled source adds a dependency within [0, n / (n - 1)] to the normalized
+    estimate, so Hoeffding's inequality with a union bound over the n nodes applies. The bound shrinks with
+    1 / sqrt(samples), and is 0 if all nodes are sources.
+    :param n: number of nodes
+    :param samples: number of sampled source nodes
+    :return: error bound
+    """
+    if samples >= n:
+        return 0.0
+    return n / (n - 1) * math.sqrt(math.log(2 * n / (1 - confidence)) / (2 * samples))
+
+
+def shared_source_dependencies(sources):
+    """
+    Runs source_dependencies in a worker process over the shared graph.
+    :param sources: integer array of source nodes
+    :return: array with the summed dependencies of each node
+    """
+    graph = multistart.shared_graph
+    return source_dependencies(graph.indptr, graph.indices, sources)
+
+
+def source_dependencies(indptr, indices, sources):
+    """
+    Sums up the dependencies of every node on the shortest paths from the given sources (Brandes' accumulation).
+    Every search is level-synchronous: a breadth-first level is expanded, counted and later accumulated as whole
+    arrays, so the Python work per source grows with the depth of the search and not with the number of edges.
+    :param indptr: CSR index pointer array
+    :param indices: CSR neighbour array
+    :param sources: integer array of source nodes
+    :return: array with the summed dependencies of each node
+    """
+    indptr = np.asarray(indptr)
+    indices = np.asarray(indices)
+    n = indptr.size - 1
+    dependencies = np.zeros(n)
+    for source in np.asarray(sources).tolist():
+        distance = np.full(n, -1, dtype=np.int64)
+        distance[source] = 0
+        paths = np.zeros(n)
+        paths[source] = 1
+        levels = []  # edges (predecessor, successor) between two consecutive levels of the search
+        frontier = np.array([source], dtype=np.int64)
+        depth = 0
+        while frontier.size:
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            predecessors = np.repeat(frontier, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            successors = indices[np.repeat(starts, counts) + offsets].astype(np.int64)
+            new = successors[distance[successors] < 0]
+            distance[new] = depth + 1
+            on_path = distance[successors] == depth + 1
+            predecessors, successors = predecessors[on_path], successors[on_path]
+            paths += np.bincount(successors, weights=paths[predecessors], minlength=n)
+            levels.append((predecessors, successors))
+            frontier = np.unique(new)
+            depth += 1
+
+        delta = np.zeros(n)
+        for predecessors, successors in reversed(levels):
+            delta += np.bincount(predecessors, weights=paths[predecessors] / paths[successors] *
+                                 (1 + delta[successors]), minlength=n)
+        delta[source] = 0
+        dependencies += delta
+    return dependencies
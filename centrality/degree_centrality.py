@@ -1,36 +1,35 @@
-import networkx as nx
-from collections import defaultdict
+import heapq
+
+from centrality import sparse_centrality
+from centrality.betweenness import betweenness_samples
 
-graph = nx.Graph()
-community_top_users = defaultdict(list)
 nr_top_users = 2
 
 
-def top_users(graph_network, communities):
+def top_users(graph_network, communities, measure='degree', samples=betweenness_samples, workers=None):
     """
-    Returns the n top users (in our case n=2) with the highest old_centrality degree from each community.
+    Returns the n top users (in our case n=2) with the highest centrality from each community.
+    :param graph_network: graph of the network the communities belong to
     :param communities: list of communities
+    :param measure: centrality ranking the users, 'degree', 'pagerank', 'eigenvector' or
+        'betweenness' (see sparse_centrality.py)
+    :param samples: number of sampled source nodes of the betweenness, see sparse_centrality.error_bound
+    :param workers: number of worker processes of the betweenness, by default the number of CPUs
     :return: a dictionary of community top users with the community as key and the list of top users as values
     """
-    global graph
-    graph = graph_network
-    for community in communities:
-        top_users = highest_degrees_in_community(graph_network, community)
-        community_top_users[community.key] = top_users
-    return community_top_users
+    return sparse_centrality.top_users(graph_network, communities, measure, nr_top_users, samples, workers)
 
 
 def highest_degrees_in_community(graph_network, community):
     """
     Returns the highest n top users from single community based on degree old_centrality
+    :param graph_network: graph of the network the community belongs to
     :param community: Community object holding the node objects
     :return: a list of the n top user's node keys
     """
-    global graph
-    graph = graph_network
-    sorted_community_nodes = list(sorted(community.total_nodes, key=lambda node: node.degree, reverse=True))
+    top_nodes = heapq.nlargest(nr_top_users, community.total_nodes, key=lambda node: node.degree)
 
     top_users = {}
-    for i in range(nr_top_users):
-        top_users[sorted_community_nodes[i].key] = sorted_community_nodes[i].degree
+    for node in top_nodes:
+        top_users[node.key] = node.degree
     return top_users
@@ -0,0 +1,190 @@
+from __future__ import division
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+
+from centrality.betweenness import approximate_betweenness, betweenness_samples
+from centrality.betweenness import error_bound as betweenness_error_bound
+from louvain.csr_graph import as_csr
+from random_walk.batched_walks import node_community_array
+
+centralities = OrderedDict()  # in-memory cache: (graph fingerprint, measure, samples) -> centrality, LRU order
+max_cached_centralities = 8  # centrality arrays kept in memory, the least recently used one is dropped beyond
+centralities_lock = threading.Lock()  # guards the LRU order of centralities, the measures are computed outside of it
+max_iterations = 100  # iteration cap of the power iterations
+tolerance = 1e-06  # convergence tolerance of the power iterations, per node
+
+
+def adjacency_matrix(csr):
+    """
+    Builds the weighted sparse adjacency matrix of the graph, with self-loops on the diagonal.
+    :param csr: CSRGraph of the network
+    :return: scipy sparse matrix in CSR format
+    """
+    n = csr.number_of_nodes()
+    adjacency = sp.csr_matrix((np.asarray(csr.weights, dtype=np.float64), np.asarray(csr.indices),
+                               np.asarray(csr.indptr)), shape=(n, n))
+    return (adjacency + sp.diags(np.asarray(csr.loops, dtype=np.float64))).tocsr()
+
+
+def degree(csr):
+    """
+    Degree centrality: the number of incident edges of every node (as graph.degree counts them).
+    :param csr: CSRGraph of the network
+    :return: integer array with the degree of each node
+    """
+    return csr.degrees()
+
+
+def pagerank(csr, alpha=0.85, tol=tolerance, max_iter=max_iterations):
+    """
+    PageRank by power iteration over the sparse transition matrix: a walker follows a random (weighted) edge with
+    probability alpha and jumps to a uniformly chosen node otherwise, as well as from nodes without edges.
+    :param csr: CSRGraph of the network
+    :param alpha: damping factor
+    :param tol: convergence tolerance, the iteration stops once the scores change by less than n * tol in total
+    :param max_iter: maximum number of iterations
+    :return: array with the PageRank of each node, summing up to 1
+    """
+    n = csr.number_of_nodes()
+    adjacency = adjacency_matrix(csr)
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    transition = (sp.diags(np.where(dangling, 0, 1 / np.where(dangling, 1, out_weight))) @ adjacency).T.tocsr()
+
+    scores = np.full(n, 1 / n)
+    for _ in range(max_iter):
+        previous = scores
+        scores = alpha * (transition @ previous) + (alpha * previous[dangling].sum() + 1 - alpha) / n
+        if np.abs(scores - previous).sum() < n * tol:
+            return scores
+    raise RuntimeError('PageRank did not converge in ' + str(max_iter) + ' iterations')
+
+
+def eigenvector(csr, tol=tolerance, max_iter=max_iterations):
+    """
+    Eigenvector centrality by power iteration over the sparse adjacency matrix. Like networkx, the iteration runs over
+    A + I, which has the same leading eigenvector but also converges on bipartite graphs.
+    :param csr: CSRGraph of the network
+    :param tol: convergence tolerance, the iteration stops once the scores change by less than n * tol in total
+    :param max_iter: maximum number of iterations
+    :return: array with the eigenvector centrality of each node, with euclidean norm 1
+    """
+    n = csr.number_of_nodes()
+    adjacency = adjacency_matrix(csr)
+    scores = np.full(n, 1 / n)
+    for _ in range(max_iter):
+        previous = scores
+        scores = previous + adjacency @ previous
+        scores /= np.linalg.norm(scores) or 1
+        if np.abs(scores - previous).sum() < n * tol:
+            return scores
+    raise RuntimeError('Eigenvector centrality did not converge in ' + str(max_iter) + ' iterations')
+
+
+def betweenness(csr, samples=betweenness_samples, workers=None):
+    """
+    Approximate betweenness centrality from a sample of source nodes, see betweenness.py. Ranks the bridge users
+    between communities higher than the hubs inside a single community.
+    :param csr: CSRGraph of the network
+    :param samples: number of sampled source nodes
+    :param workers: number of worker processes, by default the number of CPUs
+    :return: array with the approximate betweenness of each node, see error_bound for its accuracy
+    """
+    return approximate_betweenness(csr, samples, workers)[0]
+
+
+measures = {'degree': degree, 'pagerank': pagerank, 'eigenvector': eigenvector, 'betweenness': betweenness}
+
+
+def centrality(graph_network, measure='degree', samples=betweenness_samples, workers=None):
+    """
+    Computes a centrality measure for the whole graph, once per graph: the scores are cached in memory, keyed by the
+    fingerprint of the graph, for the max_cached_centralities most recently used graphs and measures. Safe to call
+    from several threads; threads missing the same entry at the same time each compute it.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param measure: 'degree', 'pagerank', 'eigenvector' or 'betweenness'
+    :param samples: number of sampled source nodes of the betweenness, see error_bound
+    :param workers: number of worker processes of the betweenness, by default the number of CPUs
+    :return: array with the centrality of each node, in the node order of the graph
+    """
+    if measure not in measures:
+        raise ValueError('Unknown centrality measure: ' + str(measure))
+    csr = as_csr(graph_network)
+    sampled = measure == 'betweenness'
+    cache_key = (csr.fingerprint(), measure, samples if sampled else None)
+    with centralities_lock:
+        scores = centralities.get(cache_key)
+        if scores is not None:
+            centralities.move_to_end(cache_key)
+    if scores is None:
+        scores = betweenness(csr, samples, workers) if sampled else measures[measure](csr)
+        with centralities_lock:
+            centralities[cache_key] = scores
+            if len(centralities) > max_cached_centralities:
+                centralities.popitem(last=False)
+    return scores
+
+
+def error_bound(graph_network, measure='degree', samples=betweenness_samples):
+    """
+    Bound on the absolute error of the scores returned by centrality: the Hoeffding bound of the sampled betweenness
+    (see betweenness.error_bound), 0 for the exact measures.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param measure: 'degree', 'pagerank', 'eigenvector' or 'betweenness'
+    :param samples: number of sampled source nodes of the betweenness
+    :return: error bound
+    """
+    if measure != 'betweenness':
+        return 0.0
+    n = as_csr(graph_network).number_of_nodes()
+    return betweenness_error_bound(n, min(samples, n))
+
+
+def top_k_per_community(scores, community_of, k):
+    """
+    Selects the k nodes with the highest scores of every community. Every community only partitions its own scores
+    (np.argpartition) and sorts the k selected nodes, instead of sorting all of its members.
+    :param scores: centrality of each node
+    :param community_of: community index of each node, see node_community_array
+    :param k: number of nodes to select per community
+    :return: list with an integer array of the selected nodes of each community, highest score first (ties by node
+        index)
+    """
+    number_of_communities = int(community_of.max()) + 1 if community_of.size else 0
+    nodes = np.flatnonzero(community_of >= 0)  # nodes without community are never selected
+    order = nodes[np.argsort(community_of[nodes], kind='stable')]
+    bounds = np.cumsum(np.bincount(community_of[order], minlength=number_of_communities))
+
+    selected = []
+    start = 0
+    for end in bounds.tolist():
+        members = order[start:end]
+        if members.size > k:
+            members = members[np.argpartition(-scores[members], k - 1)[:k]]
+        selected.append(members[np.lexsort((members, -scores[members]))])
+        start = end
+    return selected
+
+
+def top_users(graph_network, communities, measure='degree', k=2, samples=betweenness_samples, workers=None):
+    """
+    Returns the k top users with the highest centrality of each community.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param communities: list of communities
+    :param measure: 'degree', 'pagerank', 'eigenvector' or 'betweenness'
+    :param k: number of top users per community
+    :param samples: number of sampled source nodes of the betweenness, see error_bound
+    :param workers: number of worker processes of the betweenness, by default the number of CPUs
+    :return: a dictionary of community top users with the community key as key and a dictionary of top user ->
+        centrality as values
+    """
+    csr = as_csr(graph_network)
+    scores = centrality(csr, measure, samples, workers)
+    selected = top_k_per_community(scores, node_community_array(csr, communities), k)
+    labels = np.asarray(csr.labels, dtype=object)
+    return {community.key: dict(zip(labels[nodes].tolist(), scores[nodes].tolist()))
+            for community, nodes in zip(communities, selected)}
@@ -0,0 +1,328 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+try:
+    import fcntl  # only available on POSIX systems, elsewhere the cache is used without locks
+except ImportError:
+    fcntl = None
+
+from louvain.csr_graph import CSRGraph, from_edge_arrays
+from louvain.csr_louvain import row_blocks
+
+cache_version = 2
+cache_arrays = ('labels', 'indptr', 'indices', 'weights', 'loops')
+bytes_per_line = 200  # memory of a parsed line (tokens and node ids) while streaming an edge list
+
+
+def load_edge_list(path, cache_dir=None, verify_hash=False, memory_budget=None):
+    """
+    Loads a text edge list (one "u v" pair per line, as read by nx.read_edgelist) as CSRGraph. The first call parses
+    the text file and stores the graph as binary arrays in the cache directory, every later call memory-maps these
+    arrays, which takes almost no time. The cache is only used as long as it matches the source file. A changed file
+    is cached into a new directory of arrays (see publish_cache), so graphs loaded before, also by other processes,
+    keep their memory-mapped arrays.
+    :param path: path of the edge list file
+    :param cache_dir: directory holding the cache, by default .edge_list_cache next to the edge list file
+    :param verify_hash: if True, the content hash of the source file is always checked, otherwise only when its size
+        matches but its modification time does not
+    :param memory_budget: if given, number of bytes the edges may occupy in memory while the cache is built: the file
+        is then streamed into the cache in chunks (see stream_edge_list) instead of being parsed as a whole, for edge
+        lists larger than the memory
+    :return: CSRGraph of the network, with memory-mapped arrays
+    """
+    cache_path = edge_list_cache_path(path, cache_dir)
+    if is_cache_valid(path, cache_path, verify_hash):
+        return read_cache(cache_path)
+
+    if memory_budget is not None:
+        stream_edge_list(path, cache_path, file_fingerprint(path, with_hash=True), memory_budget)
+    else:
+        csr = read_edge_list(path)
+        write_cache(csr, cache_path, file_fingerprint(path, with_hash=True))
+    return read_cache(cache_path)
+
+
+def read_edge_list(path):
+    """
+    Parses a text edge list into a CSRGraph. Nodes are numbered in the order of their first appearance, like
+    nx.read_edgelist numbers them, and lines starting with # are comments.
+    :param path: path of the edge list file
+    :return: CSRGraph of the network
+    """
+    pairs = []
+    with open(path) as edge_file:
+        for line in edge_file:
+            columns = line.split('#', 1)[0].split()
+            if len(columns) >= 2:
+                pairs.append(columns[:2])
+    tokens = np.array(pairs, dtype=str).reshape(-1)
+
+    # number the nodes in the order of their first appearance
+    keys, first_index, inverse = np.unique(tokens, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind='stable')
+    node_ids = np.empty(order.size, dtype=np.int64)
+    node_ids[order] = np.arange(order.size)
+    edges = node_ids[inverse.reshape(-1)].reshape(-1, 2)
+    return from_edge_arrays(keys[order], edges[:, 0], edges[:, 1])
+
+
+def stream_edge_list(path, cache_path, fingerprint, memory_budget):
+    """
+    Builds the cache of an edge list without holding its edges in memory, with the same arrays as
+    write_cache(read_edge_list(path)) would store. Only the node keys and arrays with one entry per node are kept in
+    memory, the edges go through files in the cache directory in chunks of about memory_budget bytes:
+    1. the lines are parsed chunk by chunk, numbering the nodes in the order of their first appearance, and the integer
+       edges are appended to a temporary file,
+    2. the degrees of the nodes give the index pointers of the adjacency,
+    3. every chunk of edges is written into the rows of both of its end nodes, which keeps the neighbours ordered by
+       the position of their edge,
+    4. duplicate edges are merged row block by row block, keeping the first occurrence, which is the same in the rows
+       of both end nodes.
+    :param path: path of the edge list file
+    :param cache_path: directory holding the cached arrays
+    :param fingerprint: fingerprint of the source file, see file_fingerprint
+    :param memory_budget: number of bytes the edges may occupy in memory
+    """
+    build_path = new_cache_build(cache_path)
+    chunk_edges = max(memory_budget // bytes_per_line, 1)
+    edges_path = os.path.join(build_path, 'edges.tmp')
+    adjacency_path = os.path.join(build_path, 'adjacency.tmp')
+
+    # 1. parse the lines into integer edges
+    node_ids = {}
+    with open(path) as edge_file, open(edges_path, 'wb') as edges_file:
+        pairs = []
+        for line in edge_file:
+            columns = line.split('#', 1)[0].split()
+            if len(columns) >= 2:
+                pairs.append((node_ids.setdefault(columns[0], len(node_ids)),
+                              node_ids.setdefault(columns[1], len(node_ids))))
+                if len(pairs) == chunk_edges:
+                    np.array(pairs, dtype=np.int64).tofile(edges_file)
+                    pairs = []
+        np.array(pairs, dtype=np.int64).reshape(-1, 2).tofile(edges_file)
+    n = len(node_ids)
+    labels = np.array(list(node_ids), dtype=str)
+    del node_ids
+    edges = np.memmap(edges_path, dtype=np.int64, mode='r').reshape(-1, 2) if os.path.getsize(edges_path) \
+        else np.zeros((0, 2), dtype=np.int64)
+    chunks = range(0, edges.shape[0], chunk_edges)
+
+    # 2. degrees including duplicate edges, self-loops are kept apart
+    loops = np.zeros(n, dtype=np.float64)
+    degree = np.zeros(n, dtype=np.int64)
+    for start in chunks:
+        source, target = edges[start:start + chunk_edges].T
+        loop = source == target
+        loops[source[loop]] = 1
+        degree += np.bincount(source[~loop], minlength=n) + np.bincount(target[~loop], minlength=n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(degree, out=indptr[1:])
+
+    # 3. fill the rows in the order of the edges
+    adjacency = np.memmap(adjacency_path, dtype=np.int32, mode='w+', shape=(max(int(indptr[-1]), 1),))
+    cursor = indptr[:-1].copy()
+    for start in chunks:
+        source, target = edges[start:start + chunk_edges].T
+        loop = source == target
+        source, target = source[~loop], target[~loop]
+        both_source = np.concatenate([source, target])
+        both_target = np.concatenate([target, source])
+        position = np.concatenate([np.arange(source.size), np.arange(source.size)])
+        order = np.lexsort((position, both_source))
+        both_source, both_target = both_source[order], both_target[order]
+        group_start = np.flatnonzero(np.r_[True, both_source[1:] != both_source[:-1]])
+        rank = np.arange(both_source.size) - np.repeat(group_start, np.diff(np.r_[group_start, both_source.size]))
+        adjacency[cursor[both_source] + rank] = both_target
+        cursor += np.bincount(both_source, minlength=n)
+    del edges
+    os.remove(edges_path)
+
+    # 4. merge duplicate edges in place, every block of rows only moves towards the front
+    write_position = 0
+    for start, end in row_blocks(indptr, chunk_edges):
+        first, last = int(indptr[start]), int(indptr[end])
+        targets = np.array(adjacency[first:last], dtype=np.int64)
+        rows = np.repeat(np.arange(start, end), np.diff(indptr[start:end + 1]))
+        _, keep = np.unique(rows * n + targets, return_index=True)
+        keep.sort()
+        adjacency[write_position:write_position + keep.size] = targets[keep]
+        write_position += keep.size
+        degree[start:end] = np.bincount(rows[keep] - start, minlength=end - start)
+    np.cumsum(degree, out=indptr[1:])
+
+    indices = np.lib.format.open_memmap(os.path.join(build_path, 'indices.npy'), mode='w+', dtype=np.int32,
+                                        shape=(write_position,))
+    weights = np.lib.format.open_memmap(os.path.join(build_path, 'weights.npy'), mode='w+', dtype=np.float64,
+                                        shape=(write_position,))
+    for start in range(0, write_position, chunk_edges):
+        end = min(start + chunk_edges, write_position)
+        indices[start:end] = adjacency[start:end]
+        weights[start:end] = 1
+    indices.flush()
+    weights.flush()
+    del adjacency, indices, weights
+    os.remove(adjacency_path)
+
+    for name, array in (('labels', labels), ('indptr', indptr), ('loops', loops)):
+        np.save(os.path.join(build_path, name + '.npy'), array)
+    publish_cache(cache_path, build_path, fingerprint)
+
+
+def edge_list_cache_path(path, cache_dir=None):
+    """
+    Returns the directory holding the cached arrays of an edge list file.
+    :param path: path of the edge list file
+    :param cache_dir: directory holding the cache, by default .edge_list_cache next to the edge list file
+    :return: path of the cache directory of the file
+    """
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), '.edge_list_cache')
+    return os.path.join(cache_dir, os.path.basename(path))
+
+
+def file_fingerprint(path, with_hash=False):
+    """
+    Describes the state of the source file, which the cache is validated against.
+    :param path: path of the edge list file
+    :param with_hash: if True, includes the sha256 hash of the file content
+    :return: dictionary with the size, modification time and (optionally) content hash of the file
+    """
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source_file:
+            for chunk in iter(lambda: source_file.read(1 << 20), b''):
+                digest.update(chunk)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def is_cache_valid(path, cache_path, verify_hash=False):
+    """
+    Checks whether the cache of an edge list file exists and still matches the file. A changed size invalidates the
+    cache right away, a changed modification time only if the content hash changed as well.
+    :param path: path of the edge list file
+    :param cache_path: directory holding the cached arrays
+    :param verify_hash: if True, always compares the content hash
+    :return: True if the cached arrays can be used
+    """
+    meta_path = os.path.join(cache_path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('version') != cache_version or not os.path.isdir(os.path.join(cache_path, meta['arrays'])):
+        return False
+
+    fingerprint = file_fingerprint(path)
+    if fingerprint['size'] != meta['size']:
+        return False
+    if fingerprint['mtime'] == meta['mtime'] and not verify_hash:
+        return True
+    if file_fingerprint(path, with_hash=True)['sha256'] != meta['sha256']:
+        return False
+    if fingerprint['mtime'] != meta['mtime']:  # same content, just touched: remember the new modification time
+        meta['mtime'] = fingerprint['mtime']
+        with cache_lock(cache_path, exclusive=True):
+            write_meta(cache_path, meta)
+    return True
+
+
+def write_cache(csr, cache_path, fingerprint):
+    """
+    Stores the arrays of a CSRGraph as .npy files in a new directory of the cache and publishes it, see publish_cache.
+    :param csr: CSRGraph to be stored
+    :param cache_path: directory holding the cached arrays
+    :param fingerprint: fingerprint of the source file, see file_fingerprint
+    """
+    build_path = new_cache_build(cache_path)
+    for name in cache_arrays:
+        np.save(os.path.join(build_path, name + '.npy'), np.asarray(getattr(csr, name)))
+    publish_cache(cache_path, build_path, fingerprint)
+
+
+def new_cache_build(cache_path):
+    """
+    Creates the directory a new version of the cached arrays is written to, next to the published ones, which are
+    never written to again.
+    :param cache_path: directory holding the cached arrays
+    :return: path of the new, empty directory
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    return tempfile.mkdtemp(prefix='building-', dir=cache_path)
+
+
+def publish_cache(cache_path, build_path, fingerprint):
+    """
+    Makes a completely written directory of arrays the cache of the edge list: the directory is renamed to its final
+    name and the meta file, which names it, is replaced atomically. Directories of earlier versions are deleted
+    afterwards, which leaves graphs that memory-mapped their arrays intact, as the mapped files keep existing until they
+    are unmapped. The whole step holds the exclusive lock of the cache, so that no process is between reading the meta
+    file and mapping the arrays it names (see read_cache).
+    :param cache_path: directory holding the cached arrays
+    :param build_path: directory holding the new arrays, see new_cache_build
+    :param fingerprint: fingerprint of the source file, see file_fingerprint
+    """
+    arrays = 'arrays-' + os.path.basename(build_path)[len('building-'):]
+    with cache_lock(cache_path, exclusive=True):
+        os.replace(build_path, os.path.join(cache_path, arrays))
+        write_meta(cache_path, dict(fingerprint, version=cache_version, arrays=arrays))
+        for name in os.listdir(cache_path):
+            if name.startswith('arrays-') and name != arrays:
+                shutil.rmtree(os.path.join(cache_path, name), ignore_errors=True)
+            elif name in [array + '.npy' for array in cache_arrays]:  # arrays of the first version of the cache
+                os.remove(os.path.join(cache_path, name))
+
+
+def write_meta(cache_path, meta):
+    """
+    Replaces the meta file of the cache atomically, so that it is never read half written.
+    :param cache_path: directory holding the cached arrays
+    :param meta: dictionary with the fingerprint of the source file, the cache version and the directory of the arrays
+    """
+    meta_path = os.path.join(cache_path, 'meta.json')
+    temporary_path = meta_path + '.' + str(os.getpid()) + '.tmp'
+    with open(temporary_path, 'w') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(temporary_path, meta_path)
+
+
+@contextlib.contextmanager
+def cache_lock(cache_path, exclusive=False):
+    """
+    Holds the lock of a cache directory across processes: shared while the arrays are mapped, exclusive while a new
+    version is published. Without fcntl, nothing is locked.
+    :param cache_path: directory holding the cached arrays
+    :param exclusive: if True, the lock is exclusive, otherwise shared
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(cache_path, 'lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_cache(cache_path):
+    """
+    Memory-maps the cached arrays of an edge list as CSRGraph, from the directory the meta file names.
+    :param cache_path: directory holding the cached arrays
+    :return: CSRGraph of the network
+    """
+    with cache_lock(cache_path):
+        with open(os.path.join(cache_path, 'meta.json')) as meta_file:
+            arrays_path = os.path.join(cache_path, json.load(meta_file)['arrays'])
+        arrays = [np.load(os.path.join(arrays_path, name + '.npy'), mmap_mode='r') for name in cache_arrays]
+    return CSRGraph(*arrays)
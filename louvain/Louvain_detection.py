@@ -1,319 +1,694 @@
 from __future__ import division
 from collections import defaultdict
+from itertools import count
 
-import networkx as nx
 import time
 import math
 
+import numpy as np
 
-graph = nx.Graph()
-m = 0
-graph_nodes = {}
-community_dict = {}
+from centrality import degree_centrality, sparse_centrality
+from centrality.betweenness import betweenness_samples
+from louvain import csr_graph, csr_louvain, dendrogram, multistart
+from random_walk import influence, randomWalk
 
 
-def louvain_method(graph_network):
+def louvain_method(graph_network, engine='objects', check_consistency=False, restarts=1, workers=None, seed=None,
+                   observer=None, convergence=None, memory_budget=None, cache_dir=None, resolution=1):
     """
-    Runs the louvain algorithm over the nodes of the networks and e.g. forms new communities that maximize the
-    modularity gain. First, it creates a single node community for each node in the network. We then iterate over all
-    nodes. For each node, we remove it from its community, get its neighbouring communities, calculates the modularity
-    gain of putting the node into these communities and the picks the one with the highest gain. We repeat this process
-    as long as there are nodes that change partitions. When the partitions i.e. communities don't change anymore (end
-    of first passage), we create hypernodes from our communities and repeat the whole process again (second passage).
-    We repeat the iterations and hypernode creations as long as there is a positive modularity gain i.e. the communities
-    change.
-
+    Runs the louvain algorithm on the given graph in a fresh LouvainSession, see LouvainSession.louvain_method.
+    :param graph_network: networkx graph or CSRGraph (e.g. from loader/edge_list_cache.py) of the network
+    :param engine: 'objects' or 'csr', the engine running the algorithm
+    :param check_consistency: if True, verifies the incrementally maintained community values after every passage
+    :param restarts: number of randomized detections to run in parallel, keeping the one with the highest modularity
+    :param workers: number of worker processes for the restarts
+    :param seed: seed of the randomized node orders of the restarts
+    :param observer: optional callable receiving the progress events of the detection, see louvain/observers.py
+    :param convergence: csr_louvain.Convergence settings (active nodes, thresholds, iteration cap)
+    :param memory_budget: bytes the edges of a passage of the csr engine may occupy in memory, see csr_louvain.louvain
+    :param cache_dir: directory of persisted dendrograms, see LouvainSession.louvain_method
+    :param resolution: resolution of the modularity, see LouvainSession.louvain_method
     :return: a list of communities for the network
     """
-    global graph, m
-    graph = graph_network
-    m = graph.number_of_edges()
-    repeat_louvain = True
-    is_hyperrun = False
-    passage = 0
-    dendrogram = defaultdict(list)
-    total_start_time = time.time()
-
-    # louvain algorithm: merges communities and creates hyper-nodes as long as there is a positive modularity gain
-    # and as long as communities still change and there are more than one community left.
-    while repeat_louvain:
-        passage += 1
-        print('\nPassage ', passage, ':')
-
-        if is_hyperrun:  # if we are in the hypernode stage, create hypernodes from communities
-            nodes = create_hypernodes(communities)
-        else:  # single node communities
-            nodes = create_node_objects(graph.nodes)
-            for node in nodes:
-                node.total_nodes.add(node)
-
-        communities = turn_nodes_into_communities(nodes)
-
-        if not is_hyperrun:
-            old_mod = modularity(communities)
+    return LouvainSession(graph_network, observer).louvain_method(engine, check_consistency, restarts, workers, seed,
+                                                                  convergence, memory_budget, cache_dir, resolution)
 
-        # start the louvain algorithm for given list of communities and nodes
-        passage_start_time = time.time()
-        communities, iteration, new_mod = louvain_passage(communities, nodes)
-        passage_end_time = round((time.time() - passage_start_time) * 1000, 3)
-
-        dendrogram[passage] = communities.copy()
-
-        # Termination criterion: as long as new modularity is higher than the old modularity
-        if new_mod < old_mod:
-            repeat_louvain = False
-            communities = dendrogram[passage - 1]  # communities from previous passage are optimal
-        else:
-            old_mod = new_mod
 
-        print_communities(communities, iteration, passage_end_time)
-        is_hyperrun = True  # from now on working with hypernodes
-
-    total_end_time = round((time.time() - total_start_time) * 1000, 3)
-    print('\nTotal performance time louvain method: ', total_end_time, 'ms')
-    print('Total number of communities detected: ', len(communities), ' Communities')
-    print('Modularity: ', old_mod, '\n')
-    return communities
-
-
-def louvain_passage(communities, nodes):
+class LouvainSession:
     """
-    Iterates over all nodes of a given list and runs the louvain iterations ie. removes the node from its community,
-    gets the neighbouring communities and find the community maximizing the modularity gain. Then it adds the node to
-    the found community. It repeats the process as long as the partitions change
-    :param communities: list of communities of the network
-    :param nodes: list of nodes to iterate over
-    :return: (updated) list of communities
+    Holds all the state of the community detection on one graph: the graph, its number of edges, the Node objects,
+    the assignment of nodes to communities and the resulting communities. Every session is independent of all others,
+    so several detections can run concurrently in one process. The graph is either a networkx graph or a CSRGraph,
+    the latter only works with the array engine. Progress is reported as events to the optional observer (e.g.
+    observers.LoggingObserver or observers.TimelineCollector), without observer the detection runs silently.
     """
-    updated = True
-    iteration = 0
-    while updated:  # iterate as long as the partitions change during the iteration
-        updated = False  # keeps track of whether a community changed during the iteration or not
-        iteration += 1
-        print('\tIteration ', iteration, '...')
-        for node in nodes:
-            community = community_dict[node.key]  # get the community that the node belongs to
-            prev_community = id(community)  # get the id of the community to compare later on
-
-            community.remove_node(node)  # removes the nodes from the community
-            max_community = find_maximizing_community(node)  # returns the community with the highest modularity gain
-            max_community.add_node(node)  # adds the node to the community with the highest modularity gain
-
-            new_community = id(max_community)  # gets the ID of the new community
-            if prev_community != new_community:  # if the node belongs to a different community, mark updated as true
-                updated = True
-
-            # remove redundant empty communities from the list of communities
-            if len(community.nodes) == 0:
-                communities.remove(community)
-    modularity = get_total_modularity(communities)
-    return communities, iteration, modularity
-
+    m: int
+
+    def __init__(self, graph_network, observer=None):
+        self.graph = graph_network
+        self.observer = observer
+        self.m = graph_network.number_of_edges()
+        self.resolution = 1  # resolution of the modularity of the last detection, see csr_louvain.modularity
+        self.graph_nodes = {}
+        self.community_dict = {}
+        self.community_ids = count()  # stable integer ids of the communities, their labels are only built on demand
+        self.communities = None
+        self.levels = []  # membership arrays of the passages of the object engine, see louvain_method_objects
+        self.dendrogram = None  # csr_louvain.LouvainResult holding the hierarchy of the last detection
+        self.restart_stats = []  # statistics of every run of the last multi-start detection
+        self.centrality_error = 0.0  # error bound of the centrality of the last top_users or distribute_messages call
+
+    def louvain_method(self, engine='objects', check_consistency=False, restarts=1, workers=None, seed=None,
+                       convergence=None, memory_budget=None, cache_dir=None, resolution=1):
+        """
+        Runs the louvain algorithm over the nodes of the networks and e.g. forms new communities that maximize the
+        modularity gain. First, it creates a single node community for each node in the network. We then iterate over
+        all nodes. For each node, we remove it from its community, get its neighbouring communities, calculates the
+        modularity gain of putting the node into these communities and the picks the one with the highest gain. We
+        repeat this process as long as there are nodes that change partitions. When the partitions i.e. communities
+        don't change anymore (end of first passage), we create hypernodes from our communities and repeat the whole
+        process again (second passage). We repeat the iterations and hypernode creations as long as there is a positive
+        modularity gain i.e. the communities change.
+
+        The hierarchy of the detection (the membership of every passage and its modularity) is kept in dendrogram,
+        communities_at turns any of its levels into communities. With a cache_dir, the dendrogram is persisted, keyed by
+        the fingerprint of the graph and the settings of the detection, and reused as long as the graph does not change.
+
+        :param engine: 'objects' runs the algorithm over Node and Community objects, 'csr' runs it over integer-indexed
+            arrays (see louvain/csr_louvain.py), which is much faster and lighter on large graphs
+        :param check_consistency: if True, the incrementally maintained internal links and degrees of the communities
+            are recomputed from scratch after every passage of the object engine and compared (see
+            check_community_accounting)
+        :param restarts: if larger than 1, runs this many detections with different node visiting orders across a
+            process pool (always with the array engine) and keeps the partition with the highest modularity. The
+            statistics of every run are kept in restart_stats
+        :param workers: number of worker processes for the restarts, by default the number of CPUs
+        :param seed: seed of the randomized node orders of the restarts
+        :param convergence: csr_louvain.Convergence settings of both engines: only re-evaluating the nodes around
+            moved nodes, minimum modularity gains per iteration and per passage and a maximum number of iterations. By
+            default every passage runs until no node moves anymore
+        :param memory_budget: number of bytes the edges of a passage of the array engine may occupy in memory. Graphs
+            larger than that, e.g. memory-mapped edge lists loaded with load_edge_list(path, memory_budget=...), are
+            processed in blocks of rows (see csr_louvain.louvain), only the arrays with one entry per node are held in
+            memory completely. Unlimited by default
+        :param cache_dir: directory of persisted dendrograms (e.g. dendrogram.dendrogram_cache_dir). If a dendrogram of
+            the same graph and settings is stored there, its last level is returned without running the detection,
+            otherwise the dendrogram of the detection is stored there. None (default) disables the persistence
+        :param resolution: resolution of the modularity the detection maximizes (see csr_louvain.modularity), higher
+            values lead to more and smaller communities, lower values to fewer and larger ones. The modularity of the
+            passages is the one at this resolution. Default 1, the standard modularity
+        :return: a list of communities for the network
+        """
+        self.resolution = resolution
+        self.graph_nodes = {}
+        self.community_dict = {}
+        self.levels = []
+        if convergence is None:
+            convergence = csr_louvain.Convergence()
+        if engine not in ('objects', 'csr'):
+            raise ValueError('Unknown louvain engine: ' + str(engine))
+        path = None
+        if cache_dir is not None:
+            start_time = time.time()
+            csr = csr_graph.as_csr(self.graph)
+            settings = {'engine': 'csr' if restarts > 1 else engine, 'restarts': restarts, 'seed': seed,
+                        'convergence': vars(convergence), 'resolution': resolution}
+            path = dendrogram.dendrogram_path(csr.fingerprint(), settings, cache_dir)
+            self.dendrogram = dendrogram.load_dendrogram(path, csr.labels)
+            if self.dendrogram is not None:
+                self.communities = self.communities_at()
+                if self.observer is not None:
+                    self.observer({'event': 'finish', 'engine': settings['engine'],
+                                   'communities': len(self.communities), 'modularity': self.dendrogram.modularity[-1],
+                                   'time': round((time.time() - start_time) * 1000, 3), 'loaded': True})
+                return self.communities
+
+        if engine == 'csr' or restarts > 1:
+            self.communities = self.louvain_method_csr(restarts, workers, seed, convergence, memory_budget,
+                                                       resolution)
+        else:
+            self.communities = self.louvain_method_objects(check_consistency, convergence)
+        if path is not None:
+            dendrogram.save_dendrogram(self.dendrogram, path)
+        return self.communities
 
-def get_total_modularity(communities):
-    """
-    Updates the list of neighbours to be the list of neighbouring communities, updates the number of internal links
-    and calculates the modularity of the new communities.
-    :param communities: list of generated communities
-    :return: modularity of new communities
-    """
-    for community in communities:
-        neighbours = {}
-        for neighbour in community.neighbouring_communities:
-            neigh_community = community_dict[neighbour]
-            if neigh_community.key in neighbours:
-                neighbours[neigh_community.key] += community.neighbouring_communities[neighbour]
+    def louvain_method_objects(self, check_consistency=False, convergence=None):
+        """
+        Runs the louvain algorithm with the object engine, over Node and Community objects. The membership of every
+        passage is kept as an integer array in levels (node of the passage -> index of its community), the original
+        nodes of each community are only collected into total_nodes once, for the communities that are returned.
+        :param check_consistency: if True, verifies the incrementally maintained community values after every passage
+        :param convergence: csr_louvain.Convergence settings
+        :return: a list of communities for the network
+        """
+        if isinstance(self.graph, csr_graph.CSRGraph):
+            raise ValueError('The object engine needs a networkx graph, use the csr engine for a CSRGraph')
+        if convergence is None:
+            convergence = csr_louvain.Convergence()
+        repeat_louvain = True
+        is_hyperrun = False
+        passage = 0
+        passage_communities = defaultdict(list)
+        modularity = []  # modularity of every accepted passage
+        total_start_time = time.time()
+
+        # louvain algorithm: merges communities and creates hyper-nodes as long as there is a positive modularity gain
+        # and as long as communities still change and there are more than one community left.
+        while repeat_louvain:
+            passage += 1
+
+            if is_hyperrun:  # if we are in the hypernode stage, create hypernodes from communities
+                nodes, level = self.create_hypernodes(communities, self.levels[-1], level)
+            else:  # single node communities
+                nodes = self.create_node_objects(self.graph.nodes)
+                csr = csr_graph.from_networkx(self.graph)  # same node order as the Node objects
+                level = csr_louvain.Level(csr.indptr, csr.indices, csr.weights, csr.loops, csr.degrees())
+                node_sizes = np.ones(len(nodes), dtype=np.int64)  # original nodes per (hyper)node, for the observer
+            self.community_dict.clear()  # node keys of the previous passage are not needed anymore
+
+            communities = self.turn_nodes_into_communities(nodes)
+
+            if not is_hyperrun:
+                old_mod = self.modularity(communities)
+
+            # start the louvain algorithm for given list of communities and nodes
+            passage_start_time = time.time()
+            communities, iteration, new_mod = self.louvain_passage(communities, nodes, check_consistency, passage,
+                                                                   convergence, level)
+            passage_end_time = round((time.time() - passage_start_time) * 1000, 3)
+
+            passage_communities[passage] = communities.copy()
+            self.levels.append(self.passage_membership(communities, nodes))
+            if self.observer is not None:
+                node_sizes = np.bincount(self.levels[-1], weights=node_sizes,
+                                         minlength=len(communities)).astype(np.int64)
+                self.observer({'event': 'passage', 'engine': 'objects', 'passage': passage, 'iterations': iteration,
+                               'communities': len(communities), 'modularity': new_mod,
+                               'modularity_delta': new_mod - old_mod, 'largest_community': int(node_sizes.max()),
+                               'accepted': new_mod >= old_mod, 'time': passage_end_time})
+
+            # Termination criterion: as long as new modularity is higher than the old modularity
+            if new_mod < old_mod:
+                repeat_louvain = False
+                communities = passage_communities[passage - 1]  # communities from previous passage are optimal
+                self.levels.pop()
             else:
-                neighbours[neigh_community.key] = community.neighbouring_communities[neighbour]
-        community.neighbouring_communities = neighbours
-
-        internal_links = 0
-        community.total_degree = 0
-        for node in community.total_nodes:
-            community.total_degree += node.degree
-            for node_j in community.total_nodes:
-                if node != node_j:
-                    if graph.has_edge(node.key, node_j.key):
-                        internal_links += 1
-            community.internal_links = internal_links/2
-    mod = modularity(communities)
-    return mod
+                if 0 < new_mod - old_mod < convergence.min_passage_gain:
+                    repeat_louvain = False  # the passage is kept, but further passages would hardly improve it
+                old_mod = new_mod
+                modularity.append(new_mod)
+
+            is_hyperrun = True  # from now on working with hypernodes
+
+        if self.levels:
+            self.collect_members(communities, self.original_membership(self.levels))
+        self.dendrogram = csr_louvain.LouvainResult(list(self.graph_nodes))
+        self.dendrogram.levels = self.levels
+        self.dendrogram.modularity = modularity
+        if self.observer is not None:
+            self.observer({'event': 'finish', 'engine': 'objects', 'communities': len(communities),
+                           'modularity': old_mod, 'time': round((time.time() - total_start_time) * 1000, 3),
+                           'loaded': False})
+        return communities
+
+    def passage_membership(self, communities, nodes):
+        """
+        Records the result of a passage as membership array.
+        :param communities: list of communities of the passage
+        :param nodes: list of nodes of the passage
+        :return: integer array with the index (in communities) of the community of each node
+        """
+        position = {id(community): c for c, community in enumerate(communities)}
+        return np.array([position[id(self.community_dict[node.key])] for node in nodes], dtype=np.int64)
 
+    def original_membership(self, levels):
+        """
+        Maps every original node to its community by following the membership arrays of the passages, i.e. original
+        node -> community of the first passage -> community of the second passage and so on.
+        :param levels: membership arrays of the passages, see passage_membership
+        :return: integer array with the community index of each node, in the node order of the graph
+        """
+        membership = levels[0]
+        for level_membership in levels[1:]:
+            membership = level_membership[membership]
+        return membership
 
-def print_communities(communities, iteration, perf_time):
-    """
-    Prints the results of a passage to the console, including the list and number of communities, the number of iterations
-    that were required and the time elapsed for completing the passage.
-    :param communities: list of communities of the network including the nodes belonging to them
-    :param iteration: int - number of iterations required to complete the passage (until partitions did not change anymore)
-    :param perf_time: time required to complete the passage.
-    """
-    for community in communities:
-        print('\t\tCommunity: ', community)
-    print('\tIn total ', iteration, ' iterations, resulting in ', len(communities), ' communities')
-    print('\tTotal time elapsed: ', perf_time, 'ms')
+    def collect_members(self, communities, membership):
+        """
+        Materializes the members of the final communities: adds the Node object of every original node to the
+        total_nodes of its community.
+        :param communities: list of communities
+        :param membership: community index of each original node, see original_membership
+        """
+        for node, community_index in zip(self.graph_nodes.values(), membership.tolist()):
+            communities[community_index].total_nodes.add(node)
 
+    def louvain_method_csr(self, restarts=1, workers=None, seed=None, convergence=None, memory_budget=None,
+                           resolution=1):
+        """
+        Runs the louvain algorithm with the array engine: the networkx graph is converted once into CSR arrays (unless
+        the session already holds a CSRGraph), all passages run over flat integer arrays and only the final
+        communities are turned into Community objects.
+        :param restarts: number of detections to run in parallel, see louvain/multistart.py
+        :param workers: number of worker processes for the restarts
+        :param seed: seed of the randomized node orders of the restarts
+        :param convergence: csr_louvain.Convergence settings
+        :param memory_budget: bytes the edges of a passage may occupy in memory, ignored by the restarts
+        :param resolution: resolution of the modularity
+        :return: a list of communities for the network
+        """
+        total_start_time = time.time()
+        csr = csr_graph.as_csr(self.graph)
+        if restarts > 1:
+            result, self.restart_stats = multistart.multistart_louvain(csr, restarts, workers, seed, convergence,
+                                                                       resolution)
+            if self.observer is not None:
+                for stats in self.restart_stats:
+                    self.observer(dict(stats, event='restart', engine='csr'))
+        else:
+            result = csr_louvain.louvain(csr, observer=self.observer, convergence=convergence,
+                                         memory_budget=memory_budget, resolution=resolution)
+        self.dendrogram = result
+
+        communities = self.communities_from_membership(csr, result.membership(), memory_budget)
+        if self.observer is not None:
+            self.observer({'event': 'finish', 'engine': 'csr', 'communities': len(communities),
+                           'modularity': result.modularity[-1],
+                           'time': round((time.time() - total_start_time) * 1000, 3), 'loaded': False})
+        return communities
+
+    def communities_at(self, level=-1):
+        """
+        Turns any level of the hierarchy of the last (or loaded) detection into communities, without recomputation.
+        :param level: index of the passage whose communities we want, by default the last (best) one, 0 gives the
+            smallest communities
+        :return: list of communities ordered by community id
+        """
+        return self.communities_from_membership(csr_graph.as_csr(self.graph), self.dendrogram.membership(level))
 
-def create_node_objects(node_keys):
-    """
-    Creates Node objects to given node keys. The Node objects are used to hold the important characteristics of each
-    node, such as the degree or the neighbours.
-    :param node_keys: strings, keys from the networkx graph representing the node, usually as a digit e.g. 1, 7, 10
-    :return: the list of all node objects belonging to the network
-    """
-    nodes = []
-    for key in node_keys:
-        node = Node(key)
-        node.degree = graph.degree(key)
-        node.neighbours = init_neighbours(key)
-        nodes.append(node)
-        graph_nodes[key] = node
-    return nodes
+    def resolution_sweep(self, resolutions, convergence=None, memory_budget=None):
+        """
+        Detects the communities of this session's graph at a range of resolutions with the array engine, every
+        detection after the first warm-started from the partition of the previous resolution (see
+        csr_louvain.resolution_sweep), e.g. to pick the granularity of the communities. The session itself is left
+        unchanged.
+        :param resolutions: resolutions to run
+        :param convergence: csr_louvain.Convergence settings of every detection, by default with active_nodes
+        :param memory_budget: bytes the edges of a passage may occupy in memory, see csr_louvain.louvain
+        :return: list with a dictionary per resolution, in their order: 'resolution', 'communities' (list of
+            communities), 'modularity' (standard modularity, comparable across the resolutions),
+            'resolution_modularity' (modularity at the resolution), 'warm_started' (False for the cold detection at
+            the highest resolution) and 'dendrogram' (csr_louvain.LouvainResult of the detection)
+        """
+        csr = csr_graph.as_csr(self.graph)
+        sweep_session = LouvainSession(csr)  # holds the Node objects of the swept partitions
+        return [{'resolution': partition['resolution'],
+                 'communities': sweep_session.communities_from_membership(csr, partition['membership'], memory_budget),
+                 'modularity': partition['modularity'], 'resolution_modularity': partition['resolution_modularity'],
+                 'warm_started': partition['warm_started'], 'dendrogram': partition['result']}
+                for partition in csr_louvain.resolution_sweep(csr, resolutions, convergence, memory_budget,
+                                                              self.observer)]
+
+    def communities_from_membership(self, csr, membership, memory_budget=None):
+        """
+        Creates the Community objects exposed by louvain_method from a membership array, so that callers get the same
+        structure from both engines: each community holds the Node objects of its members in total_nodes.
+        :param csr: CSRGraph of the network
+        :param membership: community id of each node
+        :param memory_budget: if given, the internal links are summed up over blocks of edges fitting into it
+        :return: list of communities ordered by community id
+        """
+        number_of_communities = int(membership.max()) + 1 if membership.size else 0
+        labels = csr.labels.tolist() if isinstance(csr.labels, np.ndarray) else csr.labels
+        degrees = csr.degrees()
+
+        block_edges = None if memory_budget is None else max(memory_budget // csr_louvain.bytes_per_edge, 1)
+        internal_links = csr_louvain.internal_weights(csr, membership, number_of_communities, block_edges)
+
+        communities = [Community(next(self.community_ids), self.community_dict) for _ in range(number_of_communities)]
+        for key, degree, community_id in zip(labels, degrees.tolist(), membership.tolist()):
+            node = Node(key)
+            node.degree = degree
+            self.graph_nodes[key] = node
+            community = communities[community_id]
+            community.total_nodes.add(node)
+            community.total_degree += node.degree
+            community.size += 1
+        for community, links in zip(communities, internal_links.tolist()):
+            community.internal_links = links
+        return communities
 
+    def louvain_passage(self, communities, nodes, check_consistency=False, passage=None, convergence=None,
+                        level=None):
+        """
+        Iterates over all nodes of a given list and runs the louvain iterations ie. removes the node from its community,
+        gets the neighbouring communities and find the community maximizing the modularity gain. Then it adds the node
+        to the found community. It repeats the process as long as the partitions change. If the graph of the passage is
+        given as level and numba is installed, the iterations run in the compiled kernel instead, see compiled_passage.
+        :param communities: list of communities of the network
+        :param nodes: list of nodes to iterate over
+        :param check_consistency: if True, verifies the incrementally maintained community values at the end of the
+            passage. The passage then always runs the loop below, as the compiled kernel does not maintain them
+        :param passage: number of the passage, for the iteration events of the observer
+        :param convergence: csr_louvain.Convergence settings, by default the nodes move until none of them moves
+        :param level: optional csr_louvain.Level holding the graph of the passage, in the order of the nodes
+        :return: (updated) list of communities
+        """
+        if convergence is None:
+            convergence = csr_louvain.Convergence()
+        if level is not None and not check_consistency and csr_louvain.compiled_kernel() is not None:
+            return self.compiled_passage(communities, nodes, level, check_consistency, passage, convergence)
+        # with active_nodes, a node is only evaluated again once a neighbour moved
+        active = set(self.community_dict) if convergence.active_nodes else None
+        track_gain = self.observer is not None or convergence.min_iteration_gain > 0
+
+        start_time = time.time()
+        previous_mod = self.modularity(communities) if track_gain else None
+        updated = True
+        iteration = 0
+        while updated:  # iterate as long as the partitions change during the iteration
+            updated = False  # keeps track of whether a community changed during the iteration or not
+            iteration += 1
+            moved = 0
+            evaluated = 0
+            for node in nodes:
+                if convergence.active_nodes:
+                    if node.key not in active:
+                        continue
+                    active.discard(node.key)
+                evaluated += 1
+                community = self.community_dict[node.key]  # get the community that the node belongs to
+                prev_community = id(community)  # get the id of the community to compare later on
+
+                community.remove_node(node)  # removes the nodes from the community
+                # returns the community with the highest modularity gain
+                max_community = self.find_maximizing_community(node)
+                max_community.add_node(node)  # adds the node to the community with the highest modularity gain
+
+                new_community = id(max_community)  # gets the ID of the new community
+                # if the node belongs to a different community, mark updated as true
+                if prev_community != new_community:
+                    updated = True
+                    moved += 1
+                    if convergence.active_nodes:
+                        active.update(node.neighbours)
+
+                # remove redundant empty communities from the list of communities
+                if len(community.nodes) == 0:
+                    communities.remove(community)
+
+            iteration_mod = self.modularity(communities) if track_gain else None
+            if self.observer is not None:
+                self.observer({'event': 'iteration', 'engine': 'objects', 'passage': passage, 'iteration': iteration,
+                               'moved': moved, 'evaluated': evaluated, 'communities': len(communities),
+                               'modularity': iteration_mod, 'modularity_delta': iteration_mod - previous_mod,
+                               'time': round((time.time() - start_time) * 1000, 3)})
+            if updated and convergence.passage_done(iteration, iteration_mod - previous_mod if track_gain else None):
+                break
+            previous_mod = iteration_mod
+        modularity = self.get_total_modularity(communities, nodes, check_consistency)
+        return communities, iteration, modularity
+
+    def compiled_passage(self, communities, nodes, level, check_consistency=False, passage=None, convergence=None):
+        """
+        Runs the louvain iterations of a passage with the compiled kernel over the Level of the passage (see
+        csr_louvain.local_moves), which moves the nodes exactly as the loop of louvain_passage does, and writes the
+        result back into the Community objects: the community of every node and the internal links, total degree,
+        degree and size of every community. The node and neighbour counters of the communities are not maintained, as
+        the hypernodes of the next passage are built from the Level and not from the counters.
+        :param communities: list of single node communities of the passage, in the order of the nodes
+        :param nodes: list of nodes of the passage
+        :param level: csr_louvain.Level holding the graph of the passage, in the order of the nodes
+        :param check_consistency: if True, verifies the written back community values at the end of the passage
+        :param passage: number of the passage, for the iteration events of the observer
+        :param convergence: csr_louvain.Convergence settings
+        :return: (list of the remaining communities, number of iterations, modularity)
+        """
+        membership, iteration = csr_louvain.local_moves(level, self.m, observer=self.observer, passage=passage,
+                                                        convergence=convergence, engine='objects', keep_ids=True,
+                                                        resolution=self.resolution)[:2]
+        n = len(nodes)
+        internal = csr_louvain.internal_weights(level, membership, n).tolist()
+        total_degree = np.bincount(membership, weights=level.total_degree, minlength=n).tolist()
+        degree = np.bincount(membership, weights=np.diff(level.indptr), minlength=n).astype(np.int64).tolist()
+        size = np.bincount(membership, minlength=n).tolist()
+        for node, c in zip(nodes, membership.tolist()):
+            self.community_dict[node.key] = communities[c]
+        remaining = []
+        for c in np.unique(membership).tolist():  # the remaining communities keep their order, as in louvain_passage
+            community = communities[c]
+            community.nodes = {}
+            community.neighbouring_communities = {}
+            community.internal_links = internal[c]
+            community.total_degree = total_degree[c]
+            community.degree = degree[c]
+            community.size = size[c]
+            remaining.append(community)
+        return remaining, iteration, self.get_total_modularity(remaining, nodes, check_consistency)
+
+    def get_total_modularity(self, communities, nodes, check_consistency=False):
+        """
+        Calculates the modularity of the new communities. The number of internal links and the total degree are
+        maintained incrementally by Community.add_node and Community.remove_node, so the modularity only costs one step
+        per community. The neighbouring communities of the next passage are coarsened from the graph in
+        create_hypernodes.
+        :param communities: list of generated communities
+        :param nodes: list of nodes of the passage
+        :param check_consistency: if True, recomputes the internal links and total degrees from scratch and compares
+            them
+        :return: modularity of new communities
+        """
+        if check_consistency:
+            membership = self.original_membership(self.levels + [self.passage_membership(communities, nodes)])
+            self.check_community_accounting(communities, membership)
+        mod = self.modularity(communities)
+        return mod
 
-def create_hypernodes(communities):
-    """
-    Creates hypernode object from community objects. Takes over the nodes belonging to the community and adds them to the
-    list of total nodes, takes over the communities neighbours and updates them to be the neighbouring communities incl.
-    updating the edge count. The new degree corresponds to the number of neighbouring communities (one edge per neighbouring
-    community).
-    :param communities: list of communities containing node objects from previous passage
-    :return: list of newly created hypernodes based on previous communities
-    """
-    nodes = []
-    for community in communities:
-        node = Node(community.key)
-        node.neighbours = community.neighbouring_communities
-        node.degree = community.total_degree
-        nodes.append(node)
-        node.total_nodes = community.total_nodes
-    return nodes
+    def check_community_accounting(self, communities, membership):
+        """
+        Recomputes the number of internal links and the total degree of every community from the original graph and
+        compares them with the values maintained incrementally during the passage. Meant for debugging and tests, as it
+        costs one step per edge of the graph.
+        :param communities: list of communities of the network
+        :param membership: community index of each original node, see original_membership
+        """
+        community_of = dict(zip(self.graph_nodes, membership.tolist()))
+        internal = [0] * len(communities)
+        degrees = [0] * len(communities)
+        for key, community_index in community_of.items():
+            degrees[community_index] += self.graph.degree(key)
+            for neighbour_key in self.graph[key]:
+                if community_of[neighbour_key] == community_index:
+                    internal[community_index] += 1 if neighbour_key != key else 2
+
+        for community, internal_links, total_degree in zip(communities, internal, degrees):
+            internal_links = internal_links / 2
+            if not math.isclose(internal_links, community.internal_links, abs_tol=1e-9) \
+                    or not math.isclose(total_degree, community.total_degree, abs_tol=1e-9):
+                raise ValueError('Inconsistent community ' + str(community.key) + ': internal links '
+                                 + str(community.internal_links) + ' (expected ' + str(internal_links)
+                                 + '), total degree ' + str(community.total_degree) + ' (expected '
+                                 + str(total_degree) + ')')
+
+    def create_node_objects(self, node_keys):
+        """
+        Creates Node objects to given node keys. The Node objects are used to hold the important characteristics of each
+        node, such as the degree or the neighbours.
+        :param node_keys: strings, keys from the networkx graph representing the node, usually as a digit e.g. 1, 7, 10
+        :return: the list of all node objects belonging to the network
+        """
+        nodes = []
+        for key in node_keys:
+            node = Node(key)
+            node.degree = self.graph.degree(key)
+            node.total_degree = node.degree
+            node.neighbours = self.init_neighbours(key)
+            if key in node.neighbours:  # a self-loop is an internal link of the node's own community, not a neighbour
+                node.internal_links = node.neighbours.pop(key)
+            nodes.append(node)
+            self.graph_nodes[key] = node
+        return nodes
+
+    def create_hypernodes(self, communities, membership, level):
+        """
+        Creates hypernode objects from community objects, keyed by the community id. The graph of the hypernodes is
+        coarsened from the graph of the previous passage as a sparse matrix operation (see csr_louvain.aggregate): the
+        edges between two communities become one weighted edge between their hypernodes, the edges inside a
+        community become internal links of the hypernode. The new degree corresponds to the number of neighbouring
+        communities (one edge per neighbouring community), the total degree of the community is carried over.
+        :param communities: list of communities containing node objects from previous passage
+        :param membership: membership array of the previous passage, see passage_membership
+        :param level: csr_louvain.Level holding the graph of the previous passage, in the order of its nodes
+        :return: (list of newly created hypernodes based on previous communities, Level holding their graph)
+        """
+        level = csr_louvain.aggregate(level, membership, len(communities))
+
+        keys = [community.key for community in communities]
+        indptr = level.indptr.tolist()
+        neighbour_keys = [keys[j] for j in level.indices.tolist()]
+        weights = level.weights.tolist()
+        hypernodes = []
+        for c, (community, internal_links, total_degree) in enumerate(zip(communities, level.loops.tolist(),
+                                                                         level.total_degree.tolist())):
+            node = Node(community.key)
+            node.neighbours = dict(zip(neighbour_keys[indptr[c]:indptr[c + 1]], weights[indptr[c]:indptr[c + 1]]))
+            node.total_degree = total_degree
+            node.internal_links = internal_links
+            hypernodes.append(node)
+        return hypernodes, level
+
+    def turn_nodes_into_communities(self, nodes):
+        """
+        Creates Community objects each holding exactly one Node object i.e. single node communities, each with a new
+        integer id. We update the list of nodes belonging to the community, the total community degree and the list of
+        neighbouring nodes. Last, we add the community object to the list of all communities in the network
+        :param nodes: list of Node objects belonging to the network
+        :return: list of Community objects belonging to the network
+        """
+        communities = []
+        for node in nodes:
+            community = Community(next(self.community_ids), self.community_dict)
+            community.nodes[node.key] = 1
+            self.community_dict[node.key] = community  # assign node to community
+            for neighbour_key in node.neighbours:  # add neighbours of node to list of neighbours of the community
+                # take over the nodes neighbouring communities as the communities neighbouring communities
+                if neighbour_key in community.neighbouring_communities:
+                    community.neighbouring_communities[neighbour_key] += node.neighbours[neighbour_key]
+                else:
+                    community.neighbouring_communities[neighbour_key] = node.neighbours[neighbour_key]
+
+            community.total_degree = node.total_degree
+            community.internal_links = node.internal_links
+            node.degree = len(node.neighbours)
+            community.degree = node.degree
+            community.size = 1
+            communities.append(community)
+        return communities
+
+    def edge_count(self, communities):
+        graph_edges = set()
+        for community in communities:
+            for neighbour_key in community.neighbouring_communities:
+                # count the edges in the new hyper-graph
+                graph_edges.add((min(community.key, neighbour_key), max(community.key, neighbour_key)))
+        self.m = len(graph_edges)
+
+    def find_maximizing_community(self, node):
+        """
+        Gets all the neighbouring communities of a node and calculates the modularity gain for each neighbouring
+        community.
+        :param node: Node object that we want to move to the community with the highest modularity gain.
+        :return: the community object with the highest modularity gain for the node
+        """
+        degree_i = node.degree
+        max_modularity_gain = 0  # only update the community, if there is a positive modularity gain
+        best_fitting_community = self.community_dict[node.key]
 
+        # get neighbouring communities of node
+        for neighbour_key in node.neighbours:
+            neighbouring_community = self.community_dict[neighbour_key]  # gets the neighbour's community
+            degree_j = neighbouring_community.degree
+
+            # to get the shared edge weight, we simply get the communities reference counter to the corresponding node,
+            # then we know how many nodes in the community have an edge to the given node
+            d_ij = 2 * neighbouring_community.neighbouring_communities[node.key]
+            modularity_gain = 1.0 / (2 * self.m) * (d_ij - self.resolution * degree_i * degree_j / self.m)
+            if max_modularity_gain < modularity_gain:
+                max_modularity_gain = modularity_gain
+                best_fitting_community = neighbouring_community
+        return best_fitting_community
+
+    def modularity(self, communities):
+        """
+        Calculates the communities modularity using the number of internal links, at the resolution of the session
+        :param communities:
+        :return:
+        """
+        mod = 0
+        for community in communities:
+            mod += ((community.internal_links / self.m)
+                    - self.resolution * math.pow(community.total_degree/(2*self.m), 2))
+        return mod
 
-def turn_nodes_into_communities(nodes):
-    """
-    Creates Community objects each holding exactly one Node object i.e. single node communities. We update the list
-    of nodes belonging to the community, the total community degree and the list of neighbouring nodes. Last, we
-    add the community object to the list of all communities in the network
-    :param nodes: list of Node objects belonging to the network
-    :return: list of Community objects belonging to the network
-    """
-    global m
-    communities = []
-    for node in nodes:
-        community = Community(node.key)
-        community.nodes[node.key] = 1
-        community_dict[node.key] = community  # assign node to community
-        for neighbour_key in node.neighbours:  # add neighbours of node to list of neighbours of the community
-            # take over the nodes neighbouring communities as the communities neighbouring communities
-            if neighbour_key in community.neighbouring_communities:
-                community.neighbouring_communities[neighbour_key] += node.neighbours[neighbour_key]
-            else:
-                community.neighbouring_communities[neighbour_key] = node.neighbours[neighbour_key]
-
-        community.total_degree = node.degree
-        node.degree = len(node.neighbours)
-        community.degree = node.degree
-        community.size = 1
-        communities.append(community)
-
-        # take over all children nodes from hyper-nodes
-        for child_node in node.total_nodes:
-            community.total_nodes.add(child_node)
-    return communities
-
-
-def edge_count(communities):
-    global m
-    graph_edges = set()
-    for community in communities:
-        for neighbour_key in community.neighbouring_communities:
-            # count the edges in the new hyper-graph
-            if community.key < neighbour_key:
-                graph_edges.add(community.key + neighbour_key)
+    def init_neighbours(self, key):
+        """
+        Sets then neighbouring nodes and initializes the edge count to the neighbours to 1
+        :param key: str - key of node to which we are searching the neighbours
+        :return: dictionary of neighbours with corresponding edge count
+        """
+        neighbours = {}
+        neighbouring_nodes = self.graph[key]
+        for node in neighbouring_nodes:
+            if neighbouring_nodes[node] == {}:
+                neighbours[node] = 1
             else:
-                graph_edges.add(neighbour_key + community.key)
-    m = len(graph_edges)
+                neighbours[node] = neighbouring_nodes[node]
+        return neighbours
 
+    def top_users(self, communities=None, measure='degree', samples=betweenness_samples, workers=None):
+        """
+        Returns the top users with the highest centrality of each community of this session's graph. The error bound of
+        the centrality (see sparse_centrality.error_bound) is kept in centrality_error.
+        :param communities: list of communities, by default the ones found by the last louvain_method call
+        :param measure: centrality ranking the users, 'degree', 'pagerank', 'eigenvector' or 'betweenness'
+        :param samples: number of sampled source nodes of the betweenness
+        :param workers: number of worker processes of the betweenness, by default the number of CPUs
+        :return: a dictionary of community top users with the community key as key and the top users as values
+        """
+        self.centrality_error = sparse_centrality.error_bound(self.graph, measure, samples)
+        return degree_centrality.top_users(self.graph, communities if communities is not None else self.communities,
+                                           measure, samples, workers)
 
-def find_maximizing_community(node):
-    """
-    Gets all the neighbouring communities of a node and calculates the modularity gain for each neighbouring community.
-    :param node: Node object that we want to move to the community with the highest modularity gain.
-    :return: the community object with the highest modularity gain for the node
-    """
-    global m
-    degree_i = node.degree
-    max_modularity_gain = 0  # only update the community, if there is a positive modularity gain
-    best_fitting_community = community_dict[node.key]
-
-    # get neighbouring communities of node
-    for neighbour_key in node.neighbours:
-        neighbouring_community = community_dict[neighbour_key]  # gets the neighbour's community
-        degree_j = neighbouring_community.degree
-
-        # to get the shared edge weight, we simply get the communities reference counter to the corresponding node,
-        # then we know how many nodes in the community have an edge to the given node
-        d_ij = 2 * neighbouring_community.neighbouring_communities[node.key]
-        modularity_gain = 1.0 / (2 * m) * (d_ij - degree_i * degree_j / m)
-        if max_modularity_gain < modularity_gain:
-            max_modularity_gain = modularity_gain
-            best_fitting_community = neighbouring_community
-    return best_fitting_community
-
-
-def modularity(communities):
-    """
-    Calculates the communities modularity using the number of internal links
-    :param communities:
-    :return:
-    """
-    global m
-    mod = 0
-    for community in communities:
-        mod += ((community.internal_links / m) - math.pow(community.total_degree/(2*m), 2))
-    return mod
+    def distribute_messages(self, communities=None, measure='degree', samples=betweenness_samples, workers=None):
+        """
+        Runs the random walks distributing messages across this session's graph. The error bound of the centrality
+        selecting the start users (see sparse_centrality.error_bound) is kept in centrality_error.
+        :param communities: list of communities, by default the ones found by the last louvain_method call
+        :param measure: centrality selecting the start user of each walk, e.g. 'betweenness' for bridge users
+        :param samples: number of sampled source nodes of the betweenness
+        :param workers: number of worker processes of the betweenness, by default the number of CPUs
+        :return: list of walked paths
+        """
+        self.centrality_error = sparse_centrality.error_bound(self.graph, measure, samples)
+        return randomWalk.distribute_messages(self.graph, communities if communities is not None else self.communities,
+                                              measure=measure, samples=samples, workers=workers)
+
+    def simulate_influence(self, communities=None, **settings):
+        """
+        Simulates the spread of messages reshared from the top users of the communities of this session's graph.
+        :param communities: list of communities, by default the ones found by the last louvain_method call
+        :param settings: sources, trials, transmission, recovery, measure, k, workers, max_steps and seed, see
+            influence.simulate_influence
+        :return: list with the reach of the communities from every source community, see influence.simulate_influence
+        """
+        return influence.simulate_influence(self.graph, communities if communities is not None else self.communities,
+                                            **settings)
 
 
 class Node:
-    key: str
+    key: object
     degree: int
 
     def __init__(self, key):
         self.key = key
         self.degree = 0
+        self.total_degree = 0
         self.neighbours = {}
-        self.total_nodes = set()
         self.internal_links = 0
 
     def __str__(self) -> str:
-        return self.key
-
-
-def init_neighbours(key):
-    """
-    Sets then neighbouring nodes and initializes the edge count to the neighbours to 1
-    :param key: str - key of node to which we are searching the neighbours
-    :return: dictionary of neighbours with corresponding edge count
-    """
-    neighbours = {}
-    neighbouring_nodes = graph[key]
-    for node in neighbouring_nodes:
-        if neighbouring_nodes[node] == {}:
-            neighbours[node] = 1
-        else:
-            neighbours[node] = neighbouring_nodes[node]
-    return neighbours
+        return str(self.key)
 
 
 class Community:
-    key: str
+    key: int
     degree: int
 
-    def __init__(self, key):
+    def __init__(self, key, community_dict=None):
         self.key = key
+        self.community_dict = community_dict if community_dict is not None else {}  # node key -> community
         self.nodes = {}
-        self.total_nodes = set()
+        self.total_nodes = set()  # original nodes of the community, only filled for the final communities
         self.neighbouring_communities = {}
         self.internal_links = 0
         self.degree = 0
@@ -321,7 +696,15 @@ class Community:
         self.size = 0
 
     def __str__(self) -> str:
-        return self.key
+        return self.label()
+
+    def label(self):
+        """
+        Concatenates the string representation of all nodes belonging to the community. Built on demand only, mainly
+        used for nice console output, as the community itself is identified by its integer key.
+        :return: string representation of the community i.e. string with all node keys belonging to community
+        """
+        return ''.join('|' + str(node) for node in self.total_nodes)
 
     def add_node(self, node):
         """
@@ -331,28 +714,23 @@ class Community:
         """
         # the neighbouring community counter keeps track of how many nodes in the community have an edge to the node
         # we want to add to the community. So we simply move this counter to the list of node counters of the community,
-        # increment it and delete the neighbour reference counter
-        self.nodes[node.key] = self.neighbouring_communities[node.key] + 1
-        self.internal_links += self.neighbouring_communities[node.key] - 1
-        del self.neighbouring_communities[node.key]
+        # increment it and delete the neighbour reference counter. The counter is exactly the number of links between
+        # the node and the community, which together with the node's own internal links become internal links
+        links = self.neighbouring_communities.pop(node.key, 0)  # no entry if the node has no link to the community
+        self.nodes[node.key] = links + 1
+        self.internal_links += node.internal_links + links
 
         # update the community the node belongs to
-        community_dict[node.key] = self
+        self.community_dict[node.key] = self
 
         # Add all neighbours of node we're adding to the community to list of community neighbours and update edge count
         self.add_node_neighbours(node)
 
-        # add all nodes belonging to possible hypernodes to the communities list of nodes
-        for child_node in node.total_nodes:
-            self.total_nodes.add(child_node)
-
         # Update the community degree and size
         self.degree += node.degree
+        self.total_degree += node.total_degree
         self.size += 1
 
-        # update the string representation of the community
-        self.updated_string_representation()
-
     def add_node_neighbours(self, node):
         """
         Adds all neighbours of node to the community list of neighbours and updates the edge counters.
@@ -376,14 +754,11 @@ class Community:
         # remove the node from the list of nodes belonging to the community by decrementing the node counter
         self.nodes[node2remove.key] -= 1
 
-        # remove node2remove and all possible sub-nodes belonging to it (hypernode) from the total list of nodes
-        for child_node in node2remove.total_nodes:
-            self.total_nodes.discard(child_node)
-
-        # add the node we remove from the community to the list of community neighbours
-        self.neighbouring_communities[node2remove.key] = self.nodes[node2remove.key]
-        self.internal_links -= self.nodes[node2remove.key] - 1
-        del self.nodes[node2remove.key]
+        # add the node we remove from the community to the list of community neighbours, unless it has no link to it
+        links = self.nodes.pop(node2remove.key)
+        if links:
+            self.neighbouring_communities[node2remove.key] = links
+        self.internal_links -= node2remove.internal_links + links
 
         # update the dict of neighbouring communities, i.e. decrement the counter of neighbours or nodes of the
         # community that are neighbours of the node we are removing. If the counter gets 0, we remove the entry
@@ -391,11 +766,9 @@ class Community:
 
         # update the degree of the community, by subtracting the node's degree
         self.degree -= node2remove.degree
+        self.total_degree -= node2remove.total_degree
         self.size -= 1
 
-        # update the string representation of the community
-        self.updated_string_representation()
-
     def remove_node_neighbours(self, node2remove):
         """
         Removes all neighbours of the node2remove from the list of community neighbours i.e. it updates the edge
@@ -411,13 +784,3 @@ class Community:
                 self.neighbouring_communities[neighbour_key] -= node2remove.neighbours[neighbour_key]
                 if self.neighbouring_communities[neighbour_key] == 0:
                     del self.neighbouring_communities[neighbour_key]
-
-    def updated_string_representation(self):
-        """
-        Iterates over all nodes belonging to the community and adds their string representation to the string
-        representation of the community. Mainly used for nice console output whilst running the algorithm
-        :return: string representation of the community i.e. string with all node keys belonging to community
-        """
-        self.key = ""
-        for node in self.total_nodes:
-            self.key += "|" + str(node)
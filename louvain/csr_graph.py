@@ -0,0 +1,188 @@
+from __future__ import division
+
+import hashlib
+
+import numpy as np
+
+fingerprint_chunk = 1 << 20  # array entries (and node keys) hashed at once, bounds the copies of memory-mapped arrays
+
+
+class CSRGraph:
+    """
+    Integer-indexed, compressed sparse row (CSR) representation of an undirected graph. Node i is stored as the
+    integer i, its original key is labels[i], and its neighbours are indices[indptr[i]:indptr[i + 1]] with the
+    corresponding edge weights in weights[indptr[i]:indptr[i + 1]]. Every undirected edge is stored in both directions.
+    Self-loops are not part of the adjacency, their weight is kept separately in loops. The arrays may be memory-mapped
+    (see loader/edge_list_cache.py), in which case labels is a numpy array of strings.
+    """
+    labels: list
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    loops: np.ndarray
+
+    def __init__(self, labels, indptr, indices, weights, loops=None):
+        self.labels = labels
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        if loops is None:
+            loops = np.zeros(len(labels), dtype=weights.dtype)
+        self.loops = loops
+        self._index = None
+        self._fingerprint = None
+
+    @property
+    def index(self):
+        """
+        Dictionary mapping the original node keys to their integer index. Built lazily, as the engines themselves
+        only work with the integer indices.
+        :return: dictionary of node key -> integer index
+        """
+        if self._index is None:
+            self._index = {label: i for i, label in enumerate(self.labels)}
+        return self._index
+
+    def fingerprint(self):
+        """
+        Hash of the node keys and the adjacency, identifying the graph e.g. for caches of layouts or results. The same
+        graph gives the same fingerprint whether it was converted from networkx or loaded from an edge list. Computed
+        once per CSRGraph.
+        :return: hex string of the sha256 hash
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for start in range(0, len(self.labels), fingerprint_chunk):
+                if start:
+                    digest.update(b'\n')
+                digest.update('\n'.join(str(label) for label in self.labels[start:start + fingerprint_chunk]).encode())
+            for array, dtype in ((self.indptr, np.int64), (self.indices, np.int32), (self.weights, np.float64),
+                                 (self.loops, np.float64)):
+                # slice by slice, so that memory-mapped arrays are read in place rather than copied as a whole
+                for start in range(0, array.size, fingerprint_chunk):
+                    digest.update(memoryview(np.ascontiguousarray(array[start:start + fingerprint_chunk], dtype=dtype)))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __getitem__(self, key):
+        """
+        Returns the keys of the neighbours of a node, so that code walking over a networkx graph (graph[node]) can
+        walk over a CSRGraph as well.
+        :param key: key of the node
+        :return: list of the keys of the neighbouring nodes
+        """
+        i = self.index[key]
+        indices = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        if isinstance(self.labels, np.ndarray):
+            neighbours = self.labels[indices].tolist()
+        else:
+            neighbours = [self.labels[j] for j in indices.tolist()]
+        if self.loops[i]:
+            neighbours.append(key)
+        return neighbours
+
+    def number_of_nodes(self):
+        return len(self.labels)
+
+    def number_of_edges(self):
+        """
+        Number of undirected edges, counting every self-loop once (as networkx does).
+        """
+        return self.indices.size // 2 + int(np.count_nonzero(self.loops))
+
+    def degrees(self):
+        """
+        Degree of every node as networkx reports it, i.e. the number of incident edges with self-loops counted twice.
+        :return: integer array with the degree of each node
+        """
+        return np.diff(self.indptr) + 2 * (self.loops != 0)
+
+    def to_networkx(self):
+        """
+        Materializes the graph as a networkx graph, e.g. for drawing it.
+        :return: networkx graph with the same nodes, edges and node order
+        """
+        import networkx as nx
+
+        graph = nx.Graph()
+        graph.add_nodes_from(self.labels)
+        source = np.repeat(np.arange(self.number_of_nodes()), np.diff(self.indptr))
+        for i, j in zip(source.tolist(), self.indices.tolist()):
+            if i < j:
+                graph.add_edge(self.labels[i], self.labels[j])
+        for i in np.flatnonzero(self.loops).tolist():
+            graph.add_edge(self.labels[i], self.labels[i])
+        return graph
+
+
+def as_csr(graph):
+    """
+    Returns the graph as CSRGraph, converting it if it is a networkx graph.
+    :param graph: CSRGraph or networkx graph
+    :return: CSRGraph of the network
+    """
+    if isinstance(graph, CSRGraph):
+        return graph
+    return from_networkx(graph)
+
+
+def from_networkx(graph):
+    """
+    Converts a networkx graph into a CSRGraph. Nodes are numbered in the graph's node order and neighbours keep the
+    graph's adjacency order, so the array engine visits nodes and neighbours in the same order as the object engine.
+    :param graph: networkx graph
+    :return: CSRGraph of the network
+    """
+    labels = list(graph.nodes)
+    index = {label: i for i, label in enumerate(labels)}
+    indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+    indices = []
+    weights = []
+    loops = np.zeros(len(labels), dtype=np.float64)
+    for i, key in enumerate(labels):
+        for neighbour, data in graph[key].items():
+            weight = data.get('weight', 1)
+            if neighbour == key:
+                loops[i] = weight
+                continue
+            indices.append(index[neighbour])
+            weights.append(weight)
+        indptr[i + 1] = len(indices)
+    return CSRGraph(labels, indptr, np.array(indices, dtype=np.int32), np.array(weights, dtype=np.float64), loops)
+
+
+def from_edge_arrays(labels, source, target, weights=None):
+    """
+    Builds a CSRGraph from integer edge arrays, e.g. as read from an edge list file. Duplicate edges are merged (the
+    first occurrence wins) and the neighbours of every node are ordered by the position of their edge in the arrays,
+    which is the order networkx uses when the edges are added one after the other.
+    :param labels: node keys, labels[i] is the key of node i
+    :param source: integer array with the first node of every edge
+    :param target: integer array with the second node of every edge
+    :param weights: optional array with the weight of every edge, 1 by default
+    :return: CSRGraph of the network
+    """
+    n = len(labels)
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    weights = np.ones(source.size) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    # merge duplicate edges, keeping the first occurrence of each
+    _, first = np.unique(np.minimum(source, target) * n + np.maximum(source, target), return_index=True)
+    first.sort()
+    source, target, weights = source[first], target[first], weights[first]
+
+    loop = source == target
+    loops = np.zeros(n, dtype=np.float64)
+    loops[source[loop]] = weights[loop]
+    source, target, weights = source[~loop], target[~loop], weights[~loop]
+
+    # store every edge in both directions, ordered by node and then by the position of the edge
+    both_source = np.concatenate([source, target])
+    both_target = np.concatenate([target, source])
+    position = np.concatenate([np.arange(source.size), np.arange(source.size)])
+    order = np.lexsort((position, both_source))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(both_source, minlength=n), out=indptr[1:])
+    return CSRGraph(labels, indptr, both_target[order].astype(np.int32), np.concatenate([weights, weights])[order],
+                    loops)
@@ -0,0 +1,501 @@
+from __future__ import division
+
+import math
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from louvain import kernels
+
+
+class Level:
+    """
+    Graph of a single passage in array form. At the first passage the nodes are the vertices of the network, at every
+    later passage they are the communities of the previous passage (hypernodes). Besides the CSR adjacency, every node
+    carries the weight of the edges hidden inside it (self-loop weight) and the sum of the original degrees of the
+    vertices it contains.
+    """
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    loops: np.ndarray
+    total_degree: np.ndarray
+
+    def __init__(self, indptr, indices, weights, loops, total_degree):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.loops = loops
+        self.total_degree = total_degree
+
+    def number_of_nodes(self):
+        return self.indptr.size - 1
+
+
+class Convergence:
+    """
+    Convergence settings of a detection, used by both engines. The defaults run every passage until not a single node
+    moves anymore and stop once a passage decreases the modularity.
+    """
+    active_nodes: bool
+    min_iteration_gain: float
+    min_passage_gain: float
+    max_iterations: int
+
+    def __init__(self, active_nodes=False, min_iteration_gain=0, min_passage_gain=0, max_iterations=None):
+        """
+        :param active_nodes: if True, only the first iteration of a passage evaluates every node, afterwards only the
+            nodes are evaluated whose neighbouring communities changed, i.e. the neighbours of nodes that moved
+        :param min_iteration_gain: if positive, a passage ends as soon as an iteration improves the modularity by less
+        :param min_passage_gain: if positive, the detection ends as soon as a passage improves the modularity by less
+            (the passage itself is kept)
+        :param max_iterations: maximum number of iterations per passage, unlimited by default
+        """
+        self.active_nodes = active_nodes
+        self.min_iteration_gain = min_iteration_gain
+        self.min_passage_gain = min_passage_gain
+        self.max_iterations = max_iterations
+
+    def passage_done(self, iteration, gain):
+        """
+        :param iteration: number of iterations run so far in the passage
+        :param gain: modularity improvement of the last iteration, only needed with a min_iteration_gain
+        :return: True if the passage ends before all nodes stopped moving
+        """
+        return (self.max_iterations is not None and iteration >= self.max_iterations) \
+            or (self.min_iteration_gain > 0 and gain < self.min_iteration_gain)
+
+
+class LouvainResult:
+    """
+    Result of the array engine: one membership array per accepted passage, where levels[p][i] is the community (at
+    passage p) of node i of passage p, i.e. of the hypernode created by passage p - 1. Community ids at each level are
+    consecutive integers in the order of the first node of each community.
+    """
+    labels: list
+    levels: list
+    modularity: list
+    passages: list
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.levels = []
+        self.modularity = []
+        self.passages = []
+
+    def membership(self, level=-1):
+        """
+        Maps every vertex of the original network to its community at the given level.
+        :param level: index of the passage whose communities we want, by default the last (best) one
+        :return: integer array with the community id of each original vertex
+        """
+        if level < 0:
+            level += len(self.levels)
+        membership = self.levels[0]
+        for level_membership in self.levels[1:level + 1]:
+            membership = level_membership[membership]
+        return membership
+
+
+bytes_per_edge = 100  # memory of an edge during the local moves (entries of python lists) and the aggregation
+use_compiled_kernel = True  # run the local moves with the compiled kernel of louvain/kernels.py if numba is installed
+
+
+def compiled_kernel():
+    """
+    :return: the compiled local-move kernel (kernels.compiled_sweep) if numba is installed and use_compiled_kernel is
+        set, None otherwise
+    """
+    return kernels.compiled_sweep if use_compiled_kernel else None
+
+
+def louvain(csr, seed=None, observer=None, convergence=None, memory_budget=None, resolution=1, initial=None):
+    """
+    Runs the louvain algorithm over a CSRGraph. It follows the same passages as the object engine: local moves until
+    no node changes its community, then aggregation of the communities into hypernodes, as long as the modularity
+    does not decrease. Nodes and neighbours are visited in the same order and the same modularity gain is used, so the
+    first passage takes exactly the same decisions as the object engine.
+    :param csr: CSRGraph of the network
+    :param seed: if given, every passage visits the nodes in a random order drawn from this seed instead of the node
+        order, which leads to a different local optimum per seed
+    :param observer: optional callable receiving the iteration and passage events, see louvain/observers.py
+    :param convergence: Convergence settings, by default every passage runs until no node moves anymore
+    :param memory_budget: if given, number of bytes the edges of a passage may occupy in memory. Passages over larger
+        graphs (typically the first one, over memory-mapped arrays, see loader/edge_list_cache.py) load and process
+        the adjacency in blocks of rows that fit into the budget, and visit the nodes in node order. Only the arrays
+        with one entry per node are held in memory completely. Once the aggregated graph fits into the budget, the
+        passages run in memory as usual
+    :param resolution: resolution of the modularity (see modularity), higher values lead to more and smaller
+        communities
+    :param initial: if given, community id of each node of a partition to start from, e.g. the partition at a nearby
+        resolution (see resolution_sweep): the local moves of the first passage start from it instead of singleton
+        communities, so single nodes can still leave their community before the communities become hypernodes
+    :return: LouvainResult holding the membership arrays and modularity (at the resolution) of every passage
+    """
+    m = csr.number_of_edges()
+    result = LouvainResult(csr.labels)
+    level = Level(csr.indptr, csr.indices, csr.weights, csr.loops, csr.degrees())
+    rng = np.random.default_rng(seed) if seed is not None else None
+    if convergence is None:
+        convergence = Convergence()
+
+    node_sizes = np.ones(csr.number_of_nodes(), dtype=np.int64)  # original nodes per (hyper)node, for the observer
+
+    if initial is not None:
+        # community ids below the number of nodes, as the local moves index their community arrays with them
+        initial = np.unique(np.asarray(initial), return_inverse=True)[1].ravel()
+
+    old_mod = None
+    while True:
+        passage_start_time = time.time()
+        block_edges = None
+        if memory_budget is not None and level.indices.size * bytes_per_edge > memory_budget:
+            block_edges = max(memory_budget // bytes_per_edge, 1)
+        order = None
+        if rng is not None and block_edges is None:
+            order = rng.permutation(level.number_of_nodes()).tolist()
+        passage = len(result.passages) + 1
+        membership, iteration, communities, new_mod, start_mod, evaluated = local_moves(
+            level, m, order, observer, passage, convergence, block_edges, resolution=resolution,
+            initial=initial if passage == 1 else None)
+        passage_time = round((time.time() - passage_start_time) * 1000, 3)
+        if old_mod is None:
+            old_mod = start_mod
+
+        if observer is not None:
+            node_sizes = np.bincount(membership, weights=node_sizes, minlength=communities).astype(np.int64)
+            observer({'event': 'passage', 'engine': 'csr', 'passage': passage, 'iterations': iteration,
+                      'communities': communities, 'modularity': new_mod, 'modularity_delta': new_mod - old_mod,
+                      'largest_community': int(node_sizes.max()), 'accepted': new_mod >= old_mod,
+                      'time': passage_time})
+
+        # Termination criterion: as long as new modularity is higher than the old modularity
+        if new_mod < old_mod:
+            break
+        passage_gain = new_mod - old_mod
+        old_mod = new_mod
+
+        result.levels.append(membership)
+        result.modularity.append(new_mod)
+        result.passages.append({'iterations': iteration, 'communities': communities, 'evaluated': evaluated,
+                                'time': passage_time})
+
+        # no node left its singleton community, so every further passage would see the very same graph
+        if communities == level.number_of_nodes() or communities == 1:
+            break
+        if 0 < passage_gain < convergence.min_passage_gain:
+            break
+        level = aggregate(level, membership, communities, block_edges)
+    return result
+
+
+def resolution_sweep(csr, resolutions, convergence=None, memory_budget=None, observer=None):
+    """
+    Detects the communities at a range of resolutions. The resolutions are run from the highest to the lowest: the
+    first one is detected from singleton communities, every further one is warm-started from the partition of the
+    previous (next higher) resolution (see the initial partition of louvain). The local moves of the first passage
+    refine that partition node by node before its communities become hypernodes that merge further. Local moves can
+    merge communities but never split them, hence the order from fine to coarse partitions.
+    :param csr: CSRGraph of the network
+    :param resolutions: resolutions to run
+    :param convergence: Convergence settings of every detection, by default with active_nodes, so that a warm-started
+        passage mostly re-evaluates the surroundings of moved nodes
+    :param memory_budget: bytes the edges of a passage may occupy in memory, see louvain
+    :param observer: optional callable receiving the events of every detection
+    :return: list with a dictionary per resolution, in the order of the resolutions: 'resolution', 'membership'
+        (community id of each node), 'communities' (number of communities), 'modularity' (standard modularity,
+        comparable across the resolutions), 'resolution_modularity' (modularity at the resolution), 'warm_started'
+        (False for the cold detection at the highest resolution) and 'result' (LouvainResult of the detection)
+    """
+    if convergence is None:
+        convergence = Convergence(active_nodes=True)
+    m = csr.number_of_edges()
+    degrees = csr.degrees()
+    partitions = [None] * len(resolutions)
+    membership = None
+    for r in sorted(range(len(resolutions)), key=lambda r: resolutions[r], reverse=True):
+        warm_started = membership is not None
+        result = louvain(csr, observer=observer, convergence=convergence, memory_budget=memory_budget,
+                         resolution=resolutions[r], initial=membership)
+        membership = result.membership()
+        communities = int(membership.max()) + 1 if membership.size else 0
+        # the modularity at the resolution only weighs the expected internal edges differently
+        expected = np.square(np.bincount(membership, weights=degrees, minlength=communities) / (2 * m)).sum()
+        partitions[r] = {'resolution': resolutions[r], 'membership': membership, 'communities': communities,
+                         'modularity': result.modularity[-1] + (resolutions[r] - 1) * float(expected),
+                         'resolution_modularity': result.modularity[-1], 'warm_started': warm_started,
+                         'result': result}
+    return partitions
+
+
+def local_moves(level, m, order=None, observer=None, passage=None, convergence=None, block_edges=None, engine='csr',
+                keep_ids=False, resolution=1, initial=None):
+    """
+    Local-move phase of a passage: iterates over all nodes, removes each node from its community and puts it into the
+    neighbouring community with the highest modularity gain, as long as nodes change their community. The node degree
+    used in the gain is the number of neighbours of the (hyper)node, as in the object engine. If numba is installed,
+    every iteration runs as compiled kernel over arrays (see louvain/kernels.py), otherwise as the Python loop below,
+    both take exactly the same decisions.
+    :param level: Level holding the graph of the passage
+    :param m: number of edges of the original network
+    :param order: order in which the nodes are visited, by default the node order
+    :param observer: optional callable receiving an event after every iteration, see louvain/observers.py
+    :param passage: number of the passage, for the events
+    :param convergence: Convergence settings, by default the nodes move until none of them moves anymore
+    :param block_edges: if given, the adjacency is loaded in blocks of rows with at most this many edges (see
+        row_blocks), one block at a time, instead of all at once; the nodes are then visited in node order
+    :param engine: engine named in the events
+    :param keep_ids: if True, every community keeps its id, i.e. the node it started from as singleton community,
+        instead of being renumbered consecutively
+    :param resolution: resolution of the modularity, see modularity
+    :param initial: if given, community id (below the number of nodes) of each node to start from instead of
+        singleton communities
+    :return: (membership array with consecutive community ids, number of iterations, number of communities,
+        modularity after the passage, modularity of the starting (singleton) partition, number of node evaluations)
+    """
+    n = level.number_of_nodes()
+    blocks = row_blocks(level.indptr, block_edges)
+    if order is not None and len(blocks) > 1:
+        raise ValueError('A node order can only be given if the adjacency is processed in one block')
+    loops = np.array(level.loops, dtype=np.float64)
+    total_degree = np.array(level.total_degree)
+    degree = np.diff(level.indptr).astype(np.int64)
+    if initial is None:
+        membership = np.arange(n, dtype=np.int64)
+        community_degree = degree.copy()
+        community_total_degree = total_degree.copy()
+        community_internal = loops.copy()
+    else:
+        membership = np.array(initial, dtype=np.int64)
+        community_degree = np.bincount(membership, weights=degree, minlength=n).astype(np.int64)
+        community_total_degree = np.bincount(membership, weights=total_degree, minlength=n).astype(total_degree.dtype)
+        community_internal = internal_weights(level, membership, n, block_edges)
+    sweep = compiled_kernel()
+    if sweep is None:
+        # plain lists are considerably faster than numpy scalars for the sequential node-by-node updates
+        block = load_block(level, 0, n) if len(blocks) == 1 else None
+        loops, total_degree, degree = loops.tolist(), total_degree.tolist(), degree.tolist()
+        membership, community_degree = membership.tolist(), community_degree.tolist()
+        community_total_degree, community_internal = community_total_degree.tolist(), community_internal.tolist()
+        active = [True] * n  # with active_nodes, a node is only evaluated again once a neighbour moved
+        as_list = list
+    else:
+        block = load_block(level, 0, n, as_arrays=True) if len(blocks) == 1 else None
+        active = np.ones(n, dtype=bool)
+        as_list = np.ndarray.tolist
+        order = np.asarray(order, dtype=np.int64) if order is not None else None
+        link_weights = np.zeros(n)
+        seen = np.empty(n, dtype=np.int64)
+        is_seen = np.zeros(n, dtype=bool)
+    start_mod = modularity(as_list(community_internal), as_list(community_total_degree), m, resolution)
+
+    if convergence is None:
+        convergence = Convergence()
+    stay_active = not convergence.active_nodes
+    track_gain = observer is not None or convergence.min_iteration_gain > 0
+
+    start_time = time.time()
+    previous_mod = start_mod
+    evaluated = 0
+    updated = True
+    iteration = 0
+    while updated:  # iterate as long as the partitions change during the iteration
+        updated = False
+        iteration += 1
+        moved = 0
+        iteration_evaluated = 0
+        for start, end in blocks:
+            if block is None and not stay_active and not np.any(active[start:end]):
+                continue  # nothing to evaluate, the block is not even loaded
+            if sweep is not None:
+                indptr, indices, weights = block if block is not None else load_block(level, start, end, True)
+                block_moved, block_evaluated = sweep(indptr, indices, weights, start, order if order is not None
+                                                     else np.arange(start, end), m, float(resolution), degree, loops,
+                                                     total_degree, membership, community_degree, community_internal,
+                                                     community_total_degree, active, stay_active,
+                                                     convergence.active_nodes, link_weights, seen, is_seen)
+                updated = updated or block_moved > 0
+                moved += block_moved
+                iteration_evaluated += block_evaluated
+                continue
+            indptr, indices, weights = block if block is not None else load_block(level, start, end)
+            for i in order if order is not None else range(start, end):
+                if not active[i]:
+                    continue
+                active[i] = stay_active
+                iteration_evaluated += 1
+                old_community = membership[i]
+                degree_i = degree[i]
+                first, last = indptr[i - start], indptr[i - start + 1]
+
+                # edge weight between the node and each of its neighbouring communities, in order of first appearance
+                links = {}
+                for p in range(first, last):
+                    community = membership[indices[p]]
+                    links[community] = links.get(community, 0) + weights[p]
+
+                community_degree[old_community] -= degree_i
+                best_community = old_community
+                max_modularity_gain = 0  # only update the community, if there is a positive modularity gain
+                for community, weight in links.items():
+                    modularity_gain = 1.0 / (2 * m) * (2 * weight
+                                                       - resolution * degree_i * community_degree[community] / m)
+                    if max_modularity_gain < modularity_gain:
+                        max_modularity_gain = modularity_gain
+                        best_community = community
+                community_degree[best_community] += degree_i
+                membership[i] = best_community
+
+                if best_community != old_community:
+                    updated = True
+                    moved += 1
+                    if convergence.active_nodes:
+                        for p in range(first, last):
+                            active[indices[p]] = True
+                    community_internal[old_community] -= loops[i] + links.get(old_community, 0)
+                    community_internal[best_community] += loops[i] + links[best_community]
+                    community_total_degree[old_community] -= total_degree[i]
+                    community_total_degree[best_community] += total_degree[i]
+        evaluated += iteration_evaluated
+
+        iteration_mod = modularity(as_list(community_internal), as_list(community_total_degree), m, resolution) \
+            if track_gain else None
+        if observer is not None:
+            observer({'event': 'iteration', 'engine': engine, 'passage': passage, 'iteration': iteration,
+                      'moved': moved, 'evaluated': iteration_evaluated, 'communities': len(set(as_list(membership))),
+                      'modularity': iteration_mod, 'modularity_delta': iteration_mod - previous_mod,
+                      'time': round((time.time() - start_time) * 1000, 3)})
+        if updated and convergence.passage_done(iteration, iteration_mod - previous_mod if track_gain else None):
+            break
+        previous_mod = iteration_mod
+
+    # renumber the remaining communities consecutively, keeping the order of their ids
+    membership = np.array(membership, dtype=np.int64)
+    community_internal = as_list(community_internal)
+    community_total_degree = as_list(community_total_degree)
+    occupied = np.zeros(n, dtype=bool)
+    occupied[membership] = True
+    new_ids = np.cumsum(occupied) - 1
+    internal = [community_internal[c] for c in np.flatnonzero(occupied).tolist()]
+    total = [community_total_degree[c] for c in np.flatnonzero(occupied).tolist()]
+    new_mod = modularity(internal, total, m, resolution)
+    if not keep_ids:
+        membership = new_ids[membership]
+    return membership.astype(np.int32), iteration, len(internal), new_mod, start_mod, evaluated
+
+
+def row_blocks(indptr, block_edges=None):
+    """
+    Splits the nodes into consecutive blocks of rows whose adjacency holds at most block_edges edges (a single node
+    with more edges forms a block of its own).
+    :param indptr: CSR index pointer array
+    :param block_edges: maximum number of edges per block, None for a single block
+    :return: list of (first node, end node) of every block
+    """
+    n = indptr.size - 1
+    if block_edges is None:
+        return [(0, n)]
+    bounds = [0]
+    while bounds[-1] < n:
+        start = bounds[-1]
+        end = int(np.searchsorted(indptr, indptr[start] + block_edges, side='right')) - 1
+        bounds.append(min(max(end, start + 1), n))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def load_block(level, start, end, as_arrays=False):
+    """
+    Loads the adjacency of a block of rows as plain lists, with the index pointers relative to the block.
+    :param level: Level holding the graph
+    :param start: first node of the block
+    :param end: end node of the block (exclusive)
+    :param as_arrays: if True, loads the block as in-memory numpy arrays instead, for the compiled kernel
+    :return: (index pointers, neighbours, edge weights) of the block
+    """
+    first, last = int(level.indptr[start]), int(level.indptr[end])
+    indptr = np.asarray(level.indptr[start:end + 1], dtype=np.int64) - first
+    if as_arrays:
+        return (indptr, np.ascontiguousarray(level.indices[first:last], dtype=np.int64),
+                np.ascontiguousarray(level.weights[first:last], dtype=np.float64))
+    return indptr.tolist(), level.indices[first:last].tolist(), level.weights[first:last].tolist()
+
+
+def membership_matrix(membership, communities):
+    """
+    Sparse indicator matrix of a partition: entry (i, c) is 1 if node i belongs to community c.
+    :param membership: community id of each node
+    :param communities: number of communities
+    :return: scipy sparse matrix in CSR format with one row per node and one column per community
+    """
+    n = membership.size
+    return sp.csr_matrix((np.ones(n), (np.arange(n), membership)), shape=(n, communities))
+
+
+def aggregate(level, membership, communities, block_edges=None):
+    """
+    Turns the communities of a passage into the hypernodes of the next passage by coarsening the adjacency matrix A
+    with the membership matrix M: entry (c, d) of M^T A M sums up the edges between communities c and d into one
+    weighted edge, and its diagonal holds the edges inside each community (twice, as they are stored in both
+    directions), which become the self-loop weight of the hypernode. The cost only depends on the size of the level,
+    not on the number of original nodes inside the communities.
+    :param level: Level of the passage that just finished
+    :param membership: community id of each node of the passage
+    :param communities: number of communities
+    :param block_edges: if given, the coarsened matrix is summed up over blocks of rows with at most this many edges
+    :return: Level holding the graph of hypernodes
+    """
+    n = level.number_of_nodes()
+    coarsening = membership_matrix(membership, communities)
+    coarse = sp.csr_matrix((communities, communities))
+    for start, end in row_blocks(level.indptr, block_edges):
+        first, last = int(level.indptr[start]), int(level.indptr[end])
+        rows = sp.csr_matrix((np.asarray(level.weights[first:last], dtype=np.float64),
+                              np.asarray(level.indices[first:last]),
+                              np.asarray(level.indptr[start:end + 1]) - first), shape=(end - start, n))
+        coarse = coarse + coarsening[start:end].T @ rows @ coarsening
+
+    loops = np.bincount(membership, weights=level.loops, minlength=communities) + coarse.diagonal() / 2
+    total_degree = np.bincount(membership, weights=level.total_degree, minlength=communities)
+    between = (sp.triu(coarse, 1) + sp.tril(coarse, -1)).tocsr()
+    between.sort_indices()
+    return Level(between.indptr.astype(np.int64), between.indices.astype(np.int32), between.data, loops,
+                 total_degree)
+
+
+def internal_weights(csr, membership, communities, block_edges=None):
+    """
+    Sums up the weight of the edges inside every community (edges whose end nodes share the community plus
+    self-loops), going through the adjacency in blocks of rows.
+    :param csr: CSRGraph (or Level) of the network
+    :param membership: community id of each node
+    :param communities: number of communities
+    :param block_edges: if given, maximum number of edges per block, see row_blocks
+    :return: array with the internal weight of each community
+    """
+    internal = np.bincount(membership, weights=csr.loops, minlength=communities)
+    for start, end in row_blocks(csr.indptr, block_edges):
+        first, last = int(csr.indptr[start]), int(csr.indptr[end])
+        source = np.repeat(membership[start:end], np.diff(csr.indptr[start:end + 1]))
+        inside = source == membership[csr.indices[first:last]]
+        # every internal edge is stored in both directions, so it contributes half of its weight per direction
+        internal += np.bincount(source[inside], weights=np.asarray(csr.weights[first:last])[inside] / 2,
+                                minlength=communities)
+    return internal
+
+
+def modularity(internal, total_degree, m, resolution=1):
+    """
+    Calculates the modularity of a partition from the flat per-community arrays. The resolution weighs the expected
+    internal edges of every community: above 1, large communities are penalized more and the detection finds more and
+    smaller communities, below 1 fewer and larger ones. Resolution 1 gives the standard modularity.
+    :param internal: weight of the edges inside each community
+    :param total_degree: sum of the original degrees of each community
+    :param m: number of edges of the original network
+    :param resolution: resolution of the modularity
+    :return: modularity of the partition
+    """
+    mod = 0
+    for internal_links, degree in zip(internal, total_degree):
+        mod += ((internal_links / m) - resolution * math.pow(degree / (2 * m), 2))
+    return mod
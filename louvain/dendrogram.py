@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from louvain.csr_louvain import LouvainResult
+
+dendrogram_cache_dir = os.path.join('results', '.dendrogram_cache')
+dendrogram_version = 1
+
+
+def dendrogram_path(fingerprint, settings, cache_dir=dendrogram_cache_dir):
+    """
+    Returns the file holding the dendrogram of a detection, keyed by the fingerprint of the graph and the settings of
+    the detection, as different engines, seeds or convergence settings lead to different hierarchies.
+    :param fingerprint: fingerprint of the graph, see CSRGraph.fingerprint
+    :param settings: JSON-serializable dictionary of the settings of the detection
+    :param cache_dir: directory of the persisted dendrograms
+    :return: path of the dendrogram file
+    """
+    settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, fingerprint + '-' + settings_hash + '.npz')
+
+
+def save_dendrogram(result, path):
+    """
+    Stores the hierarchy of a detection: the membership array of every level (the levels shrink with every passage,
+    so the whole hierarchy takes little more than one entry per node) and the modularity of every level. The file is
+    written under a temporary name and then renamed, so an interrupted write never leaves a partial dendrogram.
+    :param result: LouvainResult of the detection
+    :param path: path of the dendrogram file, see dendrogram_path
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    arrays = {'level_' + str(level): np.asarray(membership, dtype=np.int32)
+              for level, membership in enumerate(result.levels)}
+    temporary_path = path + '.tmp.npz'
+    np.savez_compressed(temporary_path, version=dendrogram_version,
+                        modularity=np.asarray(result.modularity, dtype=np.float64), **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_dendrogram(path, labels):
+    """
+    Loads a stored hierarchy, any level of which can then be turned into communities without rerunning the detection
+    (see LouvainResult.membership).
+    :param path: path of the dendrogram file, see dendrogram_path
+    :param labels: node keys of the graph
+    :return: LouvainResult with the stored levels and modularities, None if no dendrogram is stored under the path
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as stored:
+        if int(stored['version']) != dendrogram_version:
+            return None
+        result = LouvainResult(labels)
+        result.modularity = stored['modularity'].tolist()
+        result.levels = [stored['level_' + str(level)].astype(np.int64) for level in range(len(result.modularity))]
+    return result
@@ -0,0 +1,214 @@
+from __future__ import division
+from collections import deque
+from itertools import count
+
+import time
+
+from louvain.Louvain_detection import LouvainSession, Community, Node
+
+
+class DynamicCommunities:
+    """
+    Keeps the communities found by louvain_method up to date while edges are added to and removed from the graph.
+    The communities are brought back once to the level of the original nodes (every community counts the links of its
+    nodes and of its neighbouring nodes, as in the first passage). From then on every batch of edge changes only
+    updates the counters of the touched nodes and communities in place and re-runs the local moves for the nodes
+    around the changed edges, so the cost of a batch depends on the size of the change and not on the size of the graph.
+    """
+
+    def __init__(self, graph_network, communities):
+        """
+        :param graph_network: networkx graph of the network, which is updated in place by apply_batch
+        :param communities: list of communities returned by louvain_method for this graph
+        """
+        self.session = LouvainSession(graph_network)
+        self.graph = graph_network
+        self.community_dict = self.session.community_dict
+        self.community_by_key = {}
+        self.community_ids = count(max((community.key for community in communities), default=-1) + 1)
+        self.session.community_ids = self.community_ids
+
+        for community in communities:
+            community.community_dict = self.community_dict
+            community.nodes = {}
+            community.neighbouring_communities = {}
+            community.internal_links = 0
+            community.degree = 0
+            community.total_degree = 0
+            community.size = 0
+            self.community_by_key[community.key] = community
+            for node in community.total_nodes:
+                self.community_dict[node.key] = community
+
+        for community in communities:
+            internal_weight = 0
+            for node in community.total_nodes:
+                self.init_node(node)
+                self.session.graph_nodes[node.key] = node
+                community.nodes[node.key] = 1
+                for neighbour_key, weight in node.neighbours.items():
+                    if self.community_dict[neighbour_key] is community:
+                        community.nodes[node.key] += weight
+                        internal_weight += weight
+                    else:
+                        community.neighbouring_communities[neighbour_key] = \
+                            community.neighbouring_communities.get(neighbour_key, 0) + weight
+                community.internal_links += node.internal_links
+                community.degree += node.degree
+                community.total_degree += node.total_degree
+                community.size += 1
+            community.internal_links += internal_weight / 2
+
+    @property
+    def communities(self):
+        """
+        :return: list of the current communities
+        """
+        return list(self.community_by_key.values())
+
+    def init_node(self, node):
+        """
+        Sets the neighbours, degrees and self-loop weight of a node from the current graph, as create_node_objects does
+        in the first passage.
+        :param node: Node object of an original node of the graph
+        """
+        node.neighbours = self.session.init_neighbours(node.key)
+        node.internal_links = node.neighbours.pop(node.key, 0)
+        node.degree = len(node.neighbours)
+        node.total_degree = self.graph.degree(node.key)
+
+    def apply_batch(self, added_edges=(), removed_edges=()):
+        """
+        Applies a batch of edge changes to the graph and the communities, then moves the nodes around the changed
+        edges (and, as long as nodes keep moving, their neighbours) to the community with the highest modularity gain.
+        :param added_edges: iterable of (u, v) edges to add, new nodes start in a community of their own
+        :param removed_edges: iterable of (u, v) edges to remove
+        :return: dictionary with the number of changed edges, affected nodes, evaluated nodes, moved nodes and the time
+            elapsed in ms
+        """
+        start_time = time.time()
+        affected = []
+        changed = 0
+        for u, v in removed_edges:
+            if self.graph.has_edge(u, v):
+                self.graph.remove_edge(u, v)
+                self.update_edge(u, v, -1)
+                affected.extend((u, v))
+                changed += 1
+        for u, v in added_edges:
+            if not self.graph.has_edge(u, v):
+                for key in (u, v):
+                    if key not in self.community_dict:
+                        self.add_singleton(key)
+                self.graph.add_edge(u, v)
+                self.update_edge(u, v, 1)
+                affected.extend((u, v))
+                changed += 1
+
+        evaluated, moved = self.local_moves(affected)
+        return {'edges': changed, 'affected': len(set(affected)), 'evaluated': evaluated, 'moved': moved,
+                'time': round((time.time() - start_time) * 1000, 3)}
+
+    def add_singleton(self, key):
+        """
+        Adds a node that is not part of the graph yet, in a community of its own.
+        :param key: key of the new node
+        """
+        if key not in self.graph:
+            self.graph.add_node(key)
+        node = Node(key)
+        self.session.graph_nodes[key] = node
+        community = Community(next(self.community_ids), self.community_dict)
+        community.nodes[key] = 1
+        community.total_nodes.add(node)
+        community.size = 1
+        self.community_dict[key] = community
+        self.community_by_key[community.key] = community
+
+    def update_edge(self, u, v, sign):
+        """
+        Updates the degrees, neighbours and link counters of the two end nodes of a changed edge and of their
+        communities.
+        :param u: key of the first node of the edge
+        :param v: key of the second node of the edge
+        :param sign: 1 if the edge was added, -1 if it was removed
+        """
+        self.session.m += sign
+        node_u = self.session.graph_nodes[u]
+        node_v = self.session.graph_nodes[v]
+        community_u = self.community_dict[u]
+        community_v = self.community_dict[v]
+        if u == v:  # a self-loop is an internal link of the node and its community
+            node_u.internal_links += sign
+            node_u.total_degree += 2 * sign
+            community_u.internal_links += sign
+            community_u.total_degree += 2 * sign
+            return
+
+        for node, community, neighbour_key in ((node_u, community_u, v), (node_v, community_v, u)):
+            if sign > 0:
+                node.neighbours[neighbour_key] = 1
+            else:
+                del node.neighbours[neighbour_key]
+            node.degree += sign
+            node.total_degree += sign
+            community.degree += sign
+            community.total_degree += sign
+
+        if community_u is community_v:
+            community_u.nodes[u] += sign
+            community_u.nodes[v] += sign
+            community_u.internal_links += sign
+        else:
+            for community, neighbour_key in ((community_u, v), (community_v, u)):
+                links = community.neighbouring_communities.get(neighbour_key, 0) + sign
+                if links == 0:
+                    del community.neighbouring_communities[neighbour_key]
+                else:
+                    community.neighbouring_communities[neighbour_key] = links
+
+    def local_moves(self, node_keys):
+        """
+        Runs the louvain local moves on a work queue: starting with the given nodes, every node is moved to the
+        neighbouring community with the highest modularity gain, and the neighbours of every node that moved are queued
+        again, until no queued node moves anymore.
+        :param node_keys: keys of the nodes to start with
+        :return: (number of evaluated nodes, number of moves)
+        """
+        queue = deque()
+        queued = set()
+        for key in node_keys:
+            if key not in queued:
+                queue.append(key)
+                queued.add(key)
+
+        evaluated = 0
+        moved = 0
+        while queue:
+            key = queue.popleft()
+            queued.discard(key)
+            node = self.session.graph_nodes[key]
+            community = self.community_dict[key]
+            evaluated += 1
+
+            community.remove_node(node)
+            max_community = self.session.find_maximizing_community(node)
+            max_community.add_node(node)
+
+            if max_community is not community:
+                moved += 1
+                community.total_nodes.discard(node)  # the communities only hold original nodes, see __init__
+                max_community.total_nodes.add(node)
+                if len(community.nodes) == 0:
+                    del self.community_by_key[community.key]
+                for neighbour_key in node.neighbours:
+                    if neighbour_key not in queued:
+                        queue.append(neighbour_key)
+                        queued.add(neighbour_key)
+        return evaluated, moved
+
+    def modularity(self):
+        """
+        :return: modularity of the current communities
+        """
+        return self.session.modularity(self.communities)
@@ -0,0 +1,95 @@
+"""
+Compiled local-move kernel of the louvain passages. If numba is installed, sweep is compiled to machine code
+(compiled_sweep) and used by csr_louvain.local_moves, and through it by the object engine. The compiled code is cached
+on disk (in __pycache__), so only the first run after an installation or a change of this file pays the compilation.
+Without numba, compiled_sweep is None and the engines run their pure Python local moves, which take exactly the same
+decisions.
+"""
+try:
+    import numba
+except ImportError:  # numba is optional
+    numba = None
+
+
+def sweep(indptr, indices, weights, start, nodes, m, resolution, degree, loops, total_degree, membership,
+          community_degree, community_internal, community_total_degree, active, stay_active, mark_neighbours,
+          link_weights, seen, is_seen):
+    """
+    One iteration of the local moves over the given nodes, over integer arrays: every active node is removed from its
+    community and put into the neighbouring community with the highest modularity gain, exactly as the pure Python
+    loop of csr_louvain.local_moves does (same visiting order of the neighbouring communities, same arithmetic).
+    :param indptr: index pointers of the loaded rows, relative to the first loaded row
+    :param indices: neighbours of the loaded rows
+    :param weights: edge weights of the loaded rows
+    :param start: first loaded row, i.e. node whose row starts at indptr[0]
+    :param nodes: array of the nodes to visit, in order, all within the loaded rows
+    :param m: number of edges of the original network
+    :param resolution: resolution of the modularity, see csr_louvain.modularity
+    :param degree: number of neighbours of each node
+    :param loops: self-loop weight of each node
+    :param total_degree: original degree of each node
+    :param membership: community of each node, updated in place
+    :param community_degree: sum of the degrees of each community, updated in place
+    :param community_internal: internal weight of each community, updated in place
+    :param community_total_degree: total degree of each community, updated in place
+    :param active: boolean array of the nodes to evaluate, updated in place
+    :param stay_active: whether an evaluated node stays active
+    :param mark_neighbours: whether the neighbours of a moved node become active
+    :param link_weights: scratch array of zeros with one entry per community
+    :param seen: scratch array with one entry per community
+    :param is_seen: scratch array of False with one entry per community
+    :return: (number of moved nodes, number of evaluated nodes)
+    """
+    moved = 0
+    evaluated = 0
+    for k in range(nodes.size):
+        i = nodes[k]
+        if not active[i]:
+            continue
+        active[i] = stay_active
+        evaluated += 1
+        old_community = membership[i]
+        degree_i = degree[i]
+        first = indptr[i - start]
+        last = indptr[i - start + 1]
+
+        # edge weight between the node and each of its neighbouring communities, in order of first appearance
+        number_seen = 0
+        for p in range(first, last):
+            community = membership[indices[p]]
+            if not is_seen[community]:
+                is_seen[community] = True
+                seen[number_seen] = community
+                number_seen += 1
+            link_weights[community] += weights[p]
+
+        community_degree[old_community] -= degree_i
+        best_community = old_community
+        max_modularity_gain = 0.0
+        for s in range(number_seen):
+            community = seen[s]
+            modularity_gain = 1.0 / (2 * m) * (2 * link_weights[community]
+                                               - resolution * degree_i * community_degree[community] / m)
+            if max_modularity_gain < modularity_gain:
+                max_modularity_gain = modularity_gain
+                best_community = community
+        community_degree[best_community] += degree_i
+        membership[i] = best_community
+
+        if best_community != old_community:
+            moved += 1
+            if mark_neighbours:
+                for p in range(first, last):
+                    active[indices[p]] = True
+            community_internal[old_community] -= loops[i] + link_weights[old_community]
+            community_internal[best_community] += loops[i] + link_weights[best_community]
+            community_total_degree[old_community] -= total_degree[i]
+            community_total_degree[best_community] += total_degree[i]
+
+        for s in range(number_seen):
+            link_weights[seen[s]] = 0.0
+            is_seen[seen[s]] = False
+    return moved, evaluated
+
+
+compiled_sweep = numba.njit(cache=True, nogil=True)(sweep) if numba is not None else None
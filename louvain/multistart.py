@@ -0,0 +1,102 @@
+from __future__ import division
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from louvain import csr_graph, csr_louvain
+
+shared_graph = None  # CSRGraph attached to the shared memory blocks, one per worker process
+
+
+def multistart_louvain(csr, restarts, workers=None, seed=None, convergence=None, resolution=1):
+    """
+    Runs the array engine several times with different node visiting orders across a process pool and keeps the
+    partition with the highest modularity. The CSR arrays are placed once into shared memory, so the workers read the
+    graph without it being pickled for every run. The first run uses the natural node order, i.e. it is the run a
+    single louvain call would do, the others visit the nodes in a random order.
+    :param csr: CSRGraph of the network
+    :param restarts: number of detections to run
+    :param workers: number of worker processes, by default the number of CPUs (but not more than restarts)
+    :param seed: seed from which the seeds of the randomized runs are derived
+    :param convergence: csr_louvain.Convergence settings of every run
+    :param resolution: resolution of the modularity, see csr_louvain.modularity
+    :return: (LouvainResult with the highest modularity, list with the statistics of every run)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, restarts))
+    seeds = [None] + [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(restarts - 1)]
+
+    blocks, spec = share_graph(csr)
+    try:
+        with ProcessPoolExecutor(workers, initializer=attach_shared_graph, initargs=(spec,)) as pool:
+            runs = list(pool.map(run_louvain, seeds, [convergence] * restarts, [resolution] * restarts))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    statistics = []
+    for run, (result, run_time) in enumerate(runs):
+        statistics.append({'run': run, 'seed': seeds[run], 'modularity': result.modularity[-1],
+                           'communities': result.passages[-1]['communities'], 'passages': len(result.passages),
+                           'time': run_time})
+    best = max(range(len(runs)), key=lambda run: runs[run][0].modularity[-1])
+    result = runs[best][0]
+    result.labels = csr.labels
+    return result, statistics
+
+
+def share_graph(csr):
+    """
+    Copies the CSR arrays of a graph into shared memory blocks, which worker processes attach to with
+    attach_shared_graph. The caller closes and unlinks the blocks once the workers are done.
+    :param csr: CSRGraph of the network
+    :return: (list of shared memory blocks, list of (shared memory name, shape, dtype) for the workers)
+    """
+    blocks = []
+    spec = []
+    try:
+        for name in ('indptr', 'indices', 'weights', 'loops'):
+            array = np.asarray(getattr(csr, name))
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            spec.append((block.name, array.shape, array.dtype.str))
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    return blocks, spec
+
+
+def attach_shared_graph(spec):
+    """
+    Initializer of the worker processes: maps the shared memory blocks holding the CSR arrays into a CSRGraph.
+    :param spec: list of (shared memory name, shape, dtype) for indptr, indices, weights and loops
+    """
+    global shared_graph
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in spec]
+    arrays = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+              for block, (_, shape, dtype) in zip(blocks, spec)]
+    shared_graph = csr_graph.CSRGraph(range(arrays[0].size - 1), *arrays)
+    shared_graph.blocks = blocks  # keep the mappings alive as long as the worker uses the arrays
+
+
+def run_louvain(seed, convergence=None, resolution=1):
+    """
+    Runs one detection in a worker process over the shared graph.
+    :param seed: seed of the node visiting order, None for the natural node order
+    :param convergence: csr_louvain.Convergence settings
+    :param resolution: resolution of the modularity
+    :return: (LouvainResult without node labels, run time in ms)
+    """
+    start_time = time.time()
+    result = csr_louvain.louvain(shared_graph, seed, convergence=convergence, resolution=resolution)
+    result.labels = None
+    return result, round((time.time() - start_time) * 1000, 3)
@@ -0,0 +1,72 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger('louvain')
+
+
+class LoggingObserver:
+    """
+    Default observer of a detection: logs every passage and the final result at INFO level and every iteration at
+    DEBUG level to the 'louvain' logger. Attach it with LouvainSession(graph, observer=LoggingObserver()).
+
+    An observer is any callable taking one event, a dictionary with the kind of the event under 'event':
+    'iteration' (passage, iteration, moved and evaluated nodes, communities, modularity, modularity_delta, time in ms
+    since the start of the passage), 'passage' (passage, iterations, communities, modularity, modularity_delta,
+    largest_community in original nodes, accepted i.e. whether the passage improved the modularity, time in ms),
+    'restart' (statistics of one multi-start run) and 'finish' (communities, modularity, time in ms, loaded i.e.
+    whether the partition was loaded from a stored dendrogram instead of detected). Every event also names the engine.
+    The engines only build events if an observer is attached.
+    """
+
+    def __init__(self, log=logger):
+        self.log = log
+
+    def __call__(self, event):
+        kind = event['event']
+        if kind == 'iteration':
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug('Passage %d, iteration %d: %d nodes moved, %d communities, modularity %.6f (%+.6f)',
+                               event['passage'], event['iteration'], event['moved'], event['communities'],
+                               event['modularity'], event['modularity_delta'])
+        elif kind == 'passage':
+            self.log.info('Passage %d: %d iterations, %d communities (largest %d nodes), modularity %.6f (%+.6f)%s, '
+                          '%.3f ms', event['passage'], event['iterations'], event['communities'],
+                          event['largest_community'], event['modularity'], event['modularity_delta'],
+                          '' if event['accepted'] else ', discarded', event['time'])
+        elif kind == 'restart':
+            self.log.info('Run %d: modularity %.6f, %d communities, %.3f ms', event['run'], event['modularity'],
+                          event['communities'], event['time'])
+        elif kind == 'finish':
+            self.log.info('%s %d communities with modularity %.6f in %.3f ms',
+                          'Loaded' if event['loaded'] else 'Detected', event['communities'], event['modularity'],
+                          event['time'])
+
+
+class TimelineCollector:
+    """
+    Observer collecting all events of a detection with their wall-clock offset in ms since the collector was created
+    (under 'at'), and writing them as one JSON object per line to a timeline file when the detection finishes, e.g. to
+    profile the convergence of the passages.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the timeline file, overwritten at the end of every detection
+        """
+        self.path = path
+        self.events = []
+        self.start_time = time.time()
+
+    def __call__(self, event):
+        self.events.append(dict(event, at=round((time.time() - self.start_time) * 1000, 3)))
+        if event['event'] == 'finish':
+            self.write()
+
+    def write(self):
+        """
+        Writes the collected events to the timeline file.
+        """
+        with open(self.path, 'w') as timeline_file:
+            for event in self.events:
+                timeline_file.write(json.dumps(event) + '\n')
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+def node_community_array(csr, communities):
+    """
+    Creates an integer array with the index (in the list of communities) of the community of each node, the array
+    counterpart of node_community_list.
+    :param csr: CSRGraph of the network
+    :param communities: list of communities
+    :return: integer array, entry i holds the community index of node i (-1 for nodes without community)
+    """
+    community_of = np.full(csr.number_of_nodes(), -1, dtype=np.int64)
+    index = csr.index
+    for community_index, community in enumerate(communities):
+        community_of[[index[node.key] for node in community.total_nodes]] = community_index
+    return community_of
+
+
+def batched_random_walks(csr, community_of, start_nodes, max_steps=None, seed=None, record_paths=False):
+    """
+    Runs many random walks at once: every step advances all walkers that have not yet visited every community by one
+    randomly selected neighbour. A node with a self-loop is one of its own neighbours, as in graph[node] of the walks
+    over networkx graphs, so the walker stays on it with probability 1 / (degree + 1). Each walker keeps the
+    communities it has visited as a bitset (one bit per community), and stops as soon as all bits are set.
+    :param csr: CSRGraph of the network
+    :param community_of: community index of each node, see node_community_array; every node needs a community
+    :param start_nodes: integer array with the start node of each walker
+    :param max_steps: maximum number of steps after which unfinished walkers are stopped, unlimited by default (which
+        requires every community to be reachable from every start node)
+    :param seed: seed of the random number generator
+    :param record_paths: if True, also returns the path of every walker (memory grows with walkers * steps)
+    :return: array with the number of steps each walker needed to visit all communities (-1 if it did not finish),
+        and if record_paths is set, the list of paths as integer arrays of visited nodes
+    """
+    community_of = np.asarray(community_of)
+    uncovered = np.flatnonzero(community_of < 0)
+    if uncovered.size:
+        raise ValueError('Every node needs a community, ' + str(uncovered.size) + ' nodes have none, e.g. '
+                         + str(csr.labels[int(uncovered[0])]))
+    rng = np.random.default_rng(seed)
+    indptr = np.asarray(csr.indptr)
+    indices = np.asarray(csr.indices)
+    neighbours = np.diff(indptr)
+    degree = neighbours + (np.asarray(csr.loops) != 0)  # the self-loop is the last choice of a node
+    start_nodes = np.asarray(start_nodes, dtype=np.int64)
+    walkers = start_nodes.size
+    number_of_communities = int(community_of.max()) + 1
+
+    visited = np.zeros((walkers, (number_of_communities + 63) // 64), dtype=np.uint64)
+    start_communities = community_of[start_nodes]
+    visited[np.arange(walkers), start_communities >> 6] |= np.left_shift(np.uint64(1), (start_communities & 63)
+                                                                         .astype(np.uint64))
+    covered = np.ones(walkers, dtype=np.int64)
+    steps = np.full(walkers, -1, dtype=np.int64)
+    steps[covered == number_of_communities] = 0
+
+    position = start_nodes.copy()
+    active = np.flatnonzero((covered < number_of_communities) & (degree[start_nodes] > 0))
+    history = []
+    step = 0
+    while active.size and (max_steps is None or step < max_steps):
+        step += 1
+        current = position[active]
+        offsets = (rng.random(active.size) * degree[current]).astype(np.int64)
+        next_nodes = current.copy()  # walkers drawing the self-loop stay where they are
+        move = offsets < neighbours[current]
+        next_nodes[move] = indices[indptr[current[move]] + offsets[move]]
+        position[active] = next_nodes
+        if record_paths:
+            history.append((active, next_nodes))
+
+        # set the bit of the reached community, counting it if it was not set before
+        communities = community_of[next_nodes]
+        words = communities >> 6
+        bits = np.left_shift(np.uint64(1), (communities & 63).astype(np.uint64))
+        new = (visited[active, words] & bits) == 0
+        visited[active[new], words[new]] |= bits[new]
+        covered[active[new]] += 1
+
+        done = covered[active] == number_of_communities
+        steps[active[done]] = step
+        active = active[~done]
+
+    if not record_paths:
+        return steps
+    # group the recorded steps by walker, keeping their order, and prepend the start nodes
+    walker_indices = np.concatenate([np.arange(walkers)] + [walker_indices for walker_indices, _ in history])
+    nodes = np.concatenate([start_nodes] + [next_nodes for _, next_nodes in history])
+    order = np.argsort(walker_indices, kind='stable')
+    bounds = np.cumsum(np.bincount(walker_indices, minlength=walkers))[:-1]
+    return steps, np.split(nodes[order], bounds)
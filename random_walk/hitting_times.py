@@ -0,0 +1,99 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import cg, splu
+
+from centrality.degree_centrality import highest_degrees_in_community
+from louvain.csr_graph import as_csr
+from random_walk.batched_walks import batched_random_walks, node_community_array
+
+
+def community_hitting_times(graph_network, communities, start_users=None):
+    """
+    Computes the expected number of steps a random walk (as in random_walk: every step moves to a uniformly chosen
+    neighbour) needs from each start user until it reaches each community. For every community C the expected hitting
+    times h of all nodes outside of C solve (D - A) h = d restricted to the nodes outside of C, where A is the
+    adjacency matrix and D the diagonal matrix of the degrees d. That is one sparse linear solve per community: the
+    restricted matrix is symmetric positive definite, so it is solved with preconditioned conjugate gradients (falling
+    back to a sparse LU factorization if they do not converge), no dense n x n matrix is ever built. Nodes that cannot
+    reach C get an infinite hitting time.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param communities: list of communities
+    :param start_users: keys of the start nodes, by default the top user of each community (as in distribute_messages)
+    :return: dictionary with the start users ('start_users'), the matrix of expected hitting times with one row per
+        start user and one column per community ('hitting_times') and bounds of the expected number of steps until all
+        communities are reached ('cover_time_lower', 'cover_time_upper')
+    """
+    csr = as_csr(graph_network)
+    n = csr.number_of_nodes()
+    if start_users is None:
+        start_users = [list(highest_degrees_in_community(graph_network, community))[0] for community in communities]
+    starts = np.array([csr.index[user] for user in start_users], dtype=np.int64)
+    community_of = node_community_array(csr, communities)
+
+    # unweighted adjacency, a self-loop counts as one neighbour like in graph[node]
+    adjacency = sp.csr_matrix((np.ones(csr.indices.size), np.asarray(csr.indices), np.asarray(csr.indptr)),
+                              shape=(n, n))
+    adjacency = adjacency + sp.diags((np.asarray(csr.loops) != 0).astype(np.float64))
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    laplacian = (sp.diags(degree) - adjacency).tocsc()
+    _, component = connected_components(adjacency, directed=False)
+
+    hitting_times = np.zeros((starts.size, len(communities)))
+    worst_hitting_time = 0.0  # largest finite hitting time over all nodes and communities, for the upper bound
+    for target in range(len(communities)):
+        inside = community_of == target
+        reachable = np.isin(component, np.unique(component[inside])) & ~inside
+        outside = np.flatnonzero(reachable)
+        times = np.full(n, np.inf)
+        times[inside] = 0
+        if outside.size:
+            times[outside] = solve_restricted(laplacian[outside][:, outside], degree[outside])
+            worst_hitting_time = max(worst_hitting_time, float(times[outside].max()))
+        hitting_times[:, target] = times[starts]
+
+    # Matthews bound: covering k targets takes at most the harmonic number H(k - 1) times the worst hitting time
+    harmonic = np.sum(1.0 / np.arange(1, len(communities)))
+    cover_time_upper = np.where(np.isfinite(hitting_times).all(axis=1), worst_hitting_time * harmonic, np.inf)
+    return {'start_users': list(start_users), 'hitting_times': hitting_times,
+            'cover_time_lower': hitting_times.max(axis=1), 'cover_time_upper': cover_time_upper}
+
+
+def solve_restricted(matrix, degree):
+    """
+    Solves the restricted system matrix * h = degree for the hitting times.
+    :param matrix: restricted (D - A) matrix, symmetric positive definite
+    :param degree: degrees of the nodes of the restricted system, right-hand side and Jacobi preconditioner
+    :return: solution h
+    """
+    solution, info = cg(matrix.tocsr(), degree, rtol=1e-10, maxiter=10 * degree.size, M=sp.diags(1 / degree))
+    if info != 0:
+        solution = splu(matrix.tocsc(), permc_spec='MMD_AT_PLUS_A').solve(degree)
+    return solution
+
+
+def simulated_hitting_times(graph_network, communities, start_users, walks=1000, seed=None):
+    """
+    Estimates the same hitting times as community_hitting_times by simulation, to validate them: for each community,
+    every start user releases the given number of walkers (batched_random_walks), which stop when they reach the
+    community.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param communities: list of communities
+    :param start_users: keys of the start nodes
+    :param walks: number of simulated walks per start user and community
+    :param seed: seed of the random number generator
+    :return: matrix of the mean simulated hitting times, one row per start user and one column per community
+    """
+    rng = np.random.default_rng(seed)
+    csr = as_csr(graph_network)
+    community_of = node_community_array(csr, communities)
+    starts = np.array([csr.index[user] for user in start_users], dtype=np.int64)
+
+    means = np.zeros((starts.size, len(communities)))
+    for target in range(len(communities)):
+        # two communities, the target and everything else: walkers starting outside cover both exactly when they hit it
+        is_target = (community_of == target).astype(np.int64)
+        outside = starts[is_target[starts] == 0]
+        steps = batched_random_walks(csr, is_target, np.repeat(outside, walks), seed=int(rng.integers(0, 2 ** 32)))
+        means[is_target[starts] == 0, target] = steps.reshape(outside.size, walks).mean(axis=1)
+    return means
@@ -0,0 +1,181 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from centrality import sparse_centrality
+from centrality.degree_centrality import nr_top_users
+from louvain import multistart
+from louvain.csr_graph import as_csr
+from louvain.csr_louvain import row_blocks
+from random_walk.batched_walks import node_community_array
+
+trials_per_task = 100  # trials per task of the process pool, fixed so that the results do not depend on the workers
+trial_memory = 1 << 27  # bytes of the infection state of the trials simulated together, one byte per node and trial
+frontier_edges = 1 << 22  # edges expanded at once within a step, bounds the memory of a step
+worker_community_of = None  # community index of each node, in the worker processes
+
+
+def spread_trials(csr, community_of, seeds, trials, transmission, recovery=1.0, max_steps=None, seed=None):
+    """
+    Simulates the spread of a message from the seed nodes in many independent trials at once. In every step each
+    infectious node passes the message to each of its neighbours that has not received it yet with probability
+    transmission (per unit of edge weight) and then recovers, i.e. stops passing it on, with probability recovery. With
+    recovery 1 every node only passes the message on in the step after it received it, i.e. the independent cascade
+    model, below 1 the SIR model. All trials are propagated together, frontier by frontier: the infectious (trial, node)
+    pairs of a step expand all their edges as flat arrays, one random draw per edge decides the transmissions.
+    :param csr: CSRGraph of the network
+    :param community_of: community index of each node, see node_community_array
+    :param seeds: integer array of the seed nodes, infected at step 0 in every trial
+    :param trials: number of trials
+    :param transmission: probability that an infectious node passes the message over an edge of weight 1 in a step
+    :param recovery: probability that an infectious node recovers after a step
+    :param max_steps: maximum number of steps per trial, unlimited by default
+    :param seed: seed of the random number generator
+    :return: (integer array with one row per trial and one column per community holding the step at which the trial
+        first reached the community, -1 if it never did, integer array with the number of reached nodes per trial)
+    """
+    rng = np.random.default_rng(seed)
+    n = csr.number_of_nodes()
+    indptr = np.asarray(csr.indptr)
+    indices = np.asarray(csr.indices)
+    degree = np.diff(indptr)
+    probability = 1 - (1 - transmission) ** np.asarray(csr.weights, dtype=np.float64)
+    seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+    number_of_communities = int(community_of.max()) + 1
+
+    reach_time = np.full((trials, number_of_communities), -1, dtype=np.int64)
+    reached = np.zeros(trials, dtype=np.int64)
+    batch = max(1, min(trials, trial_memory // max(n, 1)))
+    for first in range(0, trials, batch):
+        count = min(batch, trials - first)
+        times = reach_time[first:first + count]
+        infected = np.zeros(count * n, dtype=bool)  # received the message, entry trial * n + node
+        trial = np.repeat(np.arange(count, dtype=np.int64), seeds.size)
+        node = np.tile(seeds, count)
+        infected[trial * n + node] = True
+        times[trial, community_of[node]] = 0
+
+        step = 0
+        while trial.size and (max_steps is None or step < max_steps):
+            step += 1
+            new_trial = []
+            new_node = []
+            frontier_degree = degree[node]
+            for start, end in row_blocks(np.concatenate(([0], np.cumsum(frontier_degree))), frontier_edges):
+                degrees = frontier_degree[start:end]
+                total = int(degrees.sum())
+                if total == 0:
+                    continue
+                # edge positions of all infectious nodes of the chunk, one after the other
+                edges = np.repeat(indptr[node[start:end]] - (np.cumsum(degrees) - degrees), degrees) + np.arange(total)
+                hit = rng.random(total) < probability[edges]
+                targets = np.repeat(trial[start:end], degrees)[hit] * n + indices[edges[hit]]
+                targets = np.unique(targets[~infected[targets]])
+                infected[targets] = True
+                new_trial.append(targets // n)
+                new_node.append(targets % n)
+            new_trial = np.concatenate(new_trial) if new_trial else np.zeros(0, dtype=np.int64)
+            new_node = np.concatenate(new_node) if new_node else np.zeros(0, dtype=np.int64)
+
+            new_communities = community_of[new_node]
+            first_reached = times[new_trial, new_communities] < 0
+            times[new_trial[first_reached], new_communities[first_reached]] = step
+            if recovery < 1:
+                infectious = rng.random(trial.size) >= recovery
+                trial = np.concatenate((trial[infectious], new_trial))
+                node = np.concatenate((node[infectious], new_node))
+            else:
+                trial, node = new_trial, new_node
+        reached[first:first + count] = infected.reshape(count, n).sum(axis=1)
+    return reach_time, reached
+
+
+def attach_simulation(spec, community_of):
+    """
+    Initializer of the worker processes: maps the shared graph (see multistart.attach_shared_graph) and keeps the
+    community index of each node.
+    :param spec: list of (shared memory name, shape, dtype) of the CSR arrays
+    :param community_of: community index of each node
+    """
+    global worker_community_of
+    multistart.attach_shared_graph(spec)
+    worker_community_of = community_of
+
+
+def run_trials(seeds, trials, transmission, recovery, max_steps, seed):
+    """
+    Runs trials in a worker process over the shared graph, see spread_trials.
+    """
+    return spread_trials(multistart.shared_graph, worker_community_of, seeds, trials, transmission, recovery,
+                         max_steps, seed)
+
+
+def simulate_influence(graph_network, communities, sources=None, trials=1000, transmission=0.05, recovery=1.0,
+                       measure='degree', k=nr_top_users, workers=None, max_steps=None, seed=None):
+    """
+    Monte Carlo study of how fast a message reaches each community when many users reshare it, as opposed to the
+    single walker of distribute_messages: for every source community, the message starts at its top users (see
+    sparse_centrality.top_users) and spreads as independent cascade (recovery 1) or SIR process (see spread_trials).
+    The trials are split into tasks of trials_per_task trials, which run across a process pool reading the graph from
+    shared memory.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param communities: list of communities
+    :param sources: keys of the communities whose top users start the message, by default every community
+    :param trials: number of trials per source community
+    :param transmission: probability that an infectious user passes the message to a neighbour in a step
+    :param recovery: probability that an infectious user stops passing the message on after a step, 1 for the
+        independent cascade model
+    :param measure: centrality selecting the top users, see sparse_centrality.py
+    :param k: number of top users per source community
+    :param workers: number of worker processes, by default the number of CPUs
+    :param max_steps: maximum number of steps per trial, unlimited by default
+    :param seed: seed from which the seeds of the tasks are derived
+    :return: list with a dictionary per source community: 'source' (community key), 'seeds' (keys of the top users),
+        'communities' (community keys, the column order of the arrays), 'reach_probability' (fraction of the trials
+        reaching each community), 'time_to_reach' (step at which each trial first reached each community, -1 if it
+        never did, one row per trial), 'mean_time_to_reach' (mean over the trials reaching the community, nan if none
+        did) and 'reached_users' (number of users reached by each trial)
+    """
+    csr = as_csr(graph_network)
+    community_of = node_community_array(csr, communities)
+    top_users = sparse_centrality.top_users(csr, communities, measure, k)
+    sources = [community.key for community in communities] if sources is None else list(sources)
+    index = csr.index
+    source_seeds = [np.array([index[user] for user in top_users[source]], dtype=np.int64) for source in sources]
+
+    chunks = [min(trials_per_task, trials - first) for first in range(0, trials, trials_per_task)]
+    tasks = [(seeds, count) for seeds in source_seeds for count in chunks]
+    task_seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(len(tasks))]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        runs = [spread_trials(csr, community_of, seeds, count, transmission, recovery, max_steps, task_seed)
+                for (seeds, count), task_seed in zip(tasks, task_seeds)]
+    else:
+        blocks, spec = multistart.share_graph(csr)
+        try:
+            with ProcessPoolExecutor(workers, initializer=attach_simulation, initargs=(spec, community_of)) as pool:
+                runs = list(pool.map(run_trials, [seeds for seeds, _ in tasks], [count for _, count in tasks],
+                                     [transmission] * len(tasks), [recovery] * len(tasks),
+                                     [max_steps] * len(tasks), task_seeds))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    labels = np.asarray(csr.labels, dtype=object)
+    results = []
+    for s, (source, seeds) in enumerate(zip(sources, source_seeds)):
+        source_runs = runs[s * len(chunks):(s + 1) * len(chunks)]
+        reach_time = np.concatenate([run[0] for run in source_runs])
+        reached = reach_time >= 0
+        with np.errstate(invalid='ignore'):
+            mean_time = np.where(reached, reach_time, 0).sum(axis=0) / reached.sum(axis=0)
+        results.append({'source': source, 'seeds': labels[seeds].tolist(),
+                        'communities': [community.key for community in communities],
+                        'reach_probability': reached.mean(axis=0), 'time_to_reach': reach_time,
+                        'mean_time_to_reach': mean_time,
+                        'reached_users': np.concatenate([run[1] for run in source_runs])})
+    return results
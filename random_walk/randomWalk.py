@@ -1,21 +1,40 @@
-import networkx as nx
 import random
-from centrality.degree_centrality import highest_degrees_in_community
 
-graph = nx.Graph()
+import numpy as np
+
+from centrality import sparse_centrality
+from centrality.betweenness import betweenness_samples
+from centrality.degree_centrality import highest_degrees_in_community
+from louvain.csr_graph import as_csr
+from random_walk.batched_walks import batched_random_walks, node_community_array
 
 
-def distribute_messages(graph_network, communities):
+def distribute_messages(graph_network, communities, engine='python', measure='degree', samples=betweenness_samples,
+                        workers=None):
     """
     Traverses network from given initial node as random walk. Takes the node and its neighbours and randomly selects
     one. Revisiting already visited nodes is possible
     '''
+    :param graph_network: graph of the network to walk on
     :param communities: list of communities
-    :param initial_node: initial node to start random walk from
-    :return: walked path
+    :param engine: 'python' walks node by node over the graph, 'batched' runs the walks together over CSR arrays (see
+        random_walk/batched_walks.py)
+    :param measure: centrality selecting the start user of each walk, the top user of its community (see
+        sparse_centrality.py), e.g. 'betweenness' to start from the bridge users between communities
+    :param samples: number of sampled source nodes of the betweenness, see sparse_centrality.error_bound
+    :param workers: number of worker processes of the betweenness, by default the number of CPUs
+    :return: walked paths
     """
-    global graph
-    graph = graph_network
+    if engine == 'batched':
+        start_nodes = community_top_users(graph_network, random.choices(communities, k=3), measure, samples, workers)
+        csr = as_csr(graph_network)
+        _, paths = batched_random_walks(csr, node_community_array(csr, communities),
+                                        [csr.index[node] for node in start_nodes], record_paths=True)
+        labels = np.asarray(csr.labels, dtype=object)
+        return [labels[path].tolist() for path in paths]
+    if engine != 'python':
+        raise ValueError('Unknown random walk engine: ' + str(engine))
+
     walked_paths = []
     # Pick three random communities
     start_communities = []
@@ -24,17 +43,33 @@ def distribute_messages(graph_network, communities):
         start_communities.append(communities[community_index])
 
     # Get top user from community
-    for community in start_communities:
-        top_user = list(highest_degrees_in_community(graph_network, community))[0]
-        walk_path = random_walk(communities, top_user)
+    for top_user in community_top_users(graph_network, start_communities, measure, samples, workers):
+        walk_path = random_walk(graph_network, communities, top_user)
         walked_paths.append(walk_path)
 
     return walked_paths
 
 
-def random_walk(communities, initial_node):
+def community_top_users(graph_network, communities, measure='degree', samples=betweenness_samples, workers=None):
+    """
+    Returns the top user of each given community, the start node of its walks.
+    :param graph_network: graph of the network to walk on
+    :param communities: list of communities
+    :param measure: centrality ranking the users, see sparse_centrality.py
+    :param samples: number of sampled source nodes of the betweenness
+    :param workers: number of worker processes of the betweenness, by default the number of CPUs
+    :return: list with the key of the top user of each community
+    """
+    if measure == 'degree':
+        return [list(highest_degrees_in_community(graph_network, community))[0] for community in communities]
+    top_users = sparse_centrality.top_users(graph_network, communities, measure, 1, samples, workers)
+    return [list(top_users[community.key])[0] for community in communities]
+
+
+def random_walk(graph_network, communities, initial_node):
     """
     Runs random walk from given start node by randomly selecting neighbouring node.
+    :param graph_network: graph of the network to walk on
     :param communities: list of communities
     :param initial_node: node with highest degree centrality to randomly selected community.
     :return: walk path i.e. list of nodes visited along the walk
@@ -45,7 +80,7 @@ def random_walk(communities, initial_node):
     walk_path = [node_t]
     visited_communities.add(node_dict[node_t])
     while len(communities) > len(visited_communities):
-        neighbours = list(graph[node_t])
+        neighbours = list(graph_network[node_t])
         random_neighbour_index = random.randint(0, len(neighbours) - 1)
         next_node = neighbours[random_neighbour_index]
         visited_communities.add(node_dict[next_node])
@@ -66,3 +101,25 @@ def node_community_list(communities):
             node_dict[node.key] = community
     return node_dict
 
+
+def simulate_message_spread(graph_network, communities, walks=1000, max_steps=None, seed=None):
+    """
+    Monte Carlo study of the message distribution: runs many random walks at once, each starting from the top user of
+    a randomly selected community, and measures how many steps each walk needs until it reached every community.
+    :param graph_network: graph of the network to walk on
+    :param communities: list of communities
+    :param walks: number of walks
+    :param max_steps: maximum number of steps per walk, unlimited by default
+    :param seed: seed of the random number generator
+    :return: dictionary with the start user of each walk ('start_users') and the number of steps each walk needed
+        ('steps', -1 for walks stopped by max_steps)
+    """
+    rng = np.random.default_rng(seed)
+    csr = as_csr(graph_network)
+    top_users = [csr.index[list(highest_degrees_in_community(graph_network, community))[0]]
+                 for community in communities]
+    start_nodes = np.array(top_users, dtype=np.int64)[rng.integers(0, len(communities), walks)]
+    steps = batched_random_walks(csr, node_community_array(csr, communities), start_nodes, max_steps,
+                                 int(rng.integers(0, 2 ** 32)))
+    labels = np.asarray(csr.labels, dtype=object)
+    return {'start_users': labels[start_nodes].tolist(), 'steps': steps}
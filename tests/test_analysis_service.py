@@ -0,0 +1,36 @@
+import asyncio
+
+from AnalysisService import AnalysisService
+from tests.test_edge_list_cache import write_edge_list
+
+
+def test_recompute_after_the_edge_list_changed_while_queries_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the stored dendrograms go to results/ in the working directory
+    path = str(tmp_path / 'graph.txt')
+    write_edge_list(path, seed=0)
+
+    async def run():
+        service = AnalysisService(path, workers=2)
+        try:
+            service.load()
+            old_partition = service.partition
+            write_edge_list(path, seed=1, nodes=400, edges=3000)
+            answers = await asyncio.gather(service.answer({'query': 'recompute'}),
+                                           *[service.answer({'query': 'top_users', 'measure': measure})
+                                             for measure in ('degree', 'pagerank', 'eigenvector')],
+                                           service.answer({'query': 'membership', 'user': '0'}))
+            status = await service.answer({'query': 'status'})
+            answers.append(await service.answer({'query': 'top_users', 'measure': 'pagerank'}))
+            return old_partition, answers, status
+        finally:
+            service.pool.shutdown()
+
+    old_partition, answers, status = asyncio.run(run())
+    # the queries of the replaced partition are answered from the old graph or fail, but never use the new graph
+    assert all(answer.get('error', 'The edge list changed').startswith('The edge list changed')
+               for answer in answers[1:4]), answers
+    assert 'error' not in answers[0] and 'error' not in answers[4] and 'error' not in answers[5], answers
+    assert len(answers[5]['top_users']) == answers[0]['communities']
+    assert status['nodes'] == 400 and status['communities'] == answers[0]['communities']
+    assert old_partition.graph.number_of_nodes() == 300
+    assert int(old_partition.graph.indices.sum()) >= 0  # the replaced graph is still mapped and readable
@@ -0,0 +1,35 @@
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from louvain.csr_graph import from_networkx
+from louvain.Louvain_detection import LouvainSession
+from random_walk.batched_walks import batched_random_walks, node_community_array
+from random_walk.randomWalk import random_walk
+
+
+def looped_path():
+    # path 0 - 1 - 2 with self-loops on 0 and 1; from node 0, node 2 is hit after 7 steps on average (4 without loops)
+    graph = nx.Graph([(0, 1), (1, 2), (0, 0), (1, 1)])
+    csr = from_networkx(graph)
+    communities = LouvainSession(csr).communities_from_membership(csr, np.array([0, 0, 1]))
+    return graph, csr, communities
+
+
+def test_batched_walks_take_self_loops_like_the_python_walks():
+    graph, csr, communities = looped_path()
+    steps = batched_random_walks(csr, node_community_array(csr, communities), np.zeros(20000, dtype=np.int64),
+                                 seed=0)
+    random.seed(0)
+    python_steps = [len(random_walk(graph, communities, 0)) - 1 for _ in range(3000)]
+    assert steps.mean() == pytest.approx(7, abs=0.3)
+    assert np.mean(python_steps) == pytest.approx(7, abs=0.6)
+
+
+def test_batched_walks_need_a_community_for_every_node():
+    _, csr, communities = looped_path()
+    community_of = node_community_array(csr, communities[:1])
+    with pytest.raises(ValueError):
+        batched_random_walks(csr, community_of, np.zeros(10, dtype=np.int64), seed=0)
@@ -0,0 +1,77 @@
+import os
+
+import networkx as nx
+import numpy as np
+
+from loader.edge_list_cache import edge_list_cache_path, is_cache_valid, load_edge_list, read_edge_list
+from louvain.csr_graph import from_networkx
+
+
+def write_edge_list(path, seed=0, nodes=300, edges=1500):
+    """
+    Writes a random edge list with duplicate edges (in both directions), self-loops and comments.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, nodes, (edges, 2))
+    pairs = np.concatenate([pairs, pairs[:50, ::-1], pairs[:20]])
+    with open(path, 'w') as edge_file:
+        edge_file.write('# random edge list\n')
+        for u, v in pairs.tolist():
+            edge_file.write(str(u) + ' ' + str(v) + '\n')
+
+
+def assert_same_graph(first, second):
+    assert list(first.labels) == list(second.labels)
+    for name in ('indptr', 'indices', 'weights', 'loops'):
+        assert np.array_equal(np.asarray(getattr(first, name)), np.asarray(getattr(second, name))), name
+
+
+def test_cached_and_streamed_graphs_equal_the_parsed_one(tmp_path):
+    path = str(tmp_path / 'graph.txt')
+    write_edge_list(path)
+    parsed = read_edge_list(path)
+    assert_same_graph(parsed, from_networkx(nx.read_edgelist(path)))
+    assert_same_graph(parsed, load_edge_list(path, cache_dir=str(tmp_path / 'cache')))
+    assert_same_graph(parsed, load_edge_list(path, cache_dir=str(tmp_path / 'cache')))  # memory-mapped from the cache
+    assert_same_graph(parsed, load_edge_list(path, cache_dir=str(tmp_path / 'streamed'), memory_budget=2000))
+
+
+def test_touched_file_keeps_and_changed_file_invalidates_the_cache(tmp_path):
+    path = str(tmp_path / 'graph.txt')
+    write_edge_list(path)
+    cache_path = edge_list_cache_path(path, str(tmp_path / 'cache'))
+    load_edge_list(path, cache_dir=str(tmp_path / 'cache'))
+    assert is_cache_valid(path, cache_path)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert is_cache_valid(path, cache_path)
+
+    with open(path) as edge_file:
+        lines = edge_file.readlines()
+    lines[1] = lines[1][:-2] + str((int(lines[1][-2]) + 1) % 10) + '\n'  # same size, another edge
+    with open(path, 'w') as edge_file:
+        edge_file.writelines(lines)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+    assert os.path.getsize(path) == stat.st_size
+    assert not is_cache_valid(path, cache_path)
+    assert_same_graph(load_edge_list(path, cache_dir=str(tmp_path / 'cache')), read_edge_list(path))
+
+    with open(path, 'a') as edge_file:
+        edge_file.write('0 1\n')
+    assert not is_cache_valid(path, cache_path)
+
+
+def test_rebuilding_the_cache_keeps_loaded_graphs_intact(tmp_path):
+    path = str(tmp_path / 'graph.txt')
+    cache_dir = str(tmp_path / 'cache')
+    write_edge_list(path, seed=0)
+    graph = load_edge_list(path, cache_dir=cache_dir)
+    expected = read_edge_list(path)
+
+    for seed, memory_budget in ((1, None), (2, 2000)):  # written at once and streamed
+        write_edge_list(path, seed=seed, edges=3000)
+        changed = load_edge_list(path, cache_dir=cache_dir, memory_budget=memory_budget)
+        assert_same_graph(changed, read_edge_list(path))
+        assert_same_graph(graph, expected)  # still mapped from the files of the first version
+    assert len([name for name in os.listdir(edge_list_cache_path(path, cache_dir)) if name.startswith('arrays-')]) == 1
@@ -0,0 +1,86 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from benchmarks.suite import planted_partition_graph
+from louvain import csr_louvain
+from louvain.csr_graph import from_networkx
+from louvain.Louvain_detection import Community, LouvainSession
+
+
+def karate_graph():
+    return nx.Graph(nx.karate_club_graph().edges())  # without the weight attributes
+
+
+@pytest.fixture(params=[True, False], ids=['kernel', 'no_kernel'])
+def use_compiled_kernel(request, monkeypatch):
+    monkeypatch.setattr(csr_louvain, 'use_compiled_kernel', request.param)
+    return request.param
+
+
+def test_engines_and_blocked_passages_give_the_same_partition():
+    network = planted_partition_graph(2000, seed=1)[0].to_networkx()
+    memberships = []
+    modularity = []
+    for graph, settings in ((network, {'engine': 'objects'}), (from_networkx(network), {'engine': 'csr'}),
+                            (from_networkx(network), {'engine': 'csr', 'memory_budget': 1 << 20})):
+        session = LouvainSession(graph)
+        session.louvain_method(**settings)
+        memberships.append(session.dendrogram.membership().tolist())
+        modularity.append(session.dendrogram.modularity[-1])
+    assert memberships[0] == memberships[1] == memberships[2]
+    assert modularity[1] == pytest.approx(modularity[0]) and modularity[2] == pytest.approx(modularity[0])
+
+
+def test_check_consistency_accepts_correct_accounting(use_compiled_kernel):
+    communities = LouvainSession(karate_graph()).louvain_method(check_consistency=True)
+    assert sorted(node.key for community in communities for node in community.total_nodes) == list(range(34))
+
+
+def test_check_consistency_detects_corrupted_accounting(use_compiled_kernel, monkeypatch):
+    add_node = Community.add_node
+
+    def corrupted_add_node(community, node):
+        add_node(community, node)
+        community.internal_links += 1
+
+    monkeypatch.setattr(Community, 'add_node', corrupted_add_node)
+    with pytest.raises(ValueError, match='Inconsistent community'):
+        LouvainSession(karate_graph()).louvain_method(check_consistency=True)
+
+
+@pytest.mark.parametrize('engine', ['objects', 'csr'])
+@pytest.mark.parametrize('convergence', [None, csr_louvain.Convergence(active_nodes=True)], ids=['full', 'active'])
+def test_compiled_kernel_gives_the_same_membership(engine, convergence, monkeypatch):
+    pytest.importorskip('numba')
+    graph = planted_partition_graph(2000, seed=1)[0].to_networkx()
+    memberships = []
+    for use_compiled_kernel in (True, False):
+        monkeypatch.setattr(csr_louvain, 'use_compiled_kernel', use_compiled_kernel)
+        session = LouvainSession(graph)
+        session.louvain_method(engine=engine, convergence=convergence)
+        memberships.append(session.dendrogram.membership())
+    assert memberships[0].tolist() == memberships[1].tolist()
+    assert session.dendrogram.levels  # the detection did run
+
+
+def test_resolution_sweep_starts_cold_and_stays_close_to_cold_detections():
+    csr = planted_partition_graph(2000, seed=2)[0]
+    resolutions = [0.5, 1, 2, 4]
+    convergence = csr_louvain.Convergence(active_nodes=True)
+    partitions = csr_louvain.resolution_sweep(csr, resolutions, convergence, memory_budget=1 << 20)
+    m = csr.number_of_edges()
+    for resolution, partition in zip(resolutions, partitions):
+        cold = csr_louvain.louvain(csr, convergence=convergence, memory_budget=1 << 20, resolution=resolution)
+        membership = partition['membership']
+        assert partition['resolution'] == resolution
+        assert partition['warm_started'] == (resolution != max(resolutions))
+        assert partition['result'].membership().tolist() == membership.tolist()
+        internal = csr_louvain.internal_weights(csr, membership, partition['communities'])
+        total_degree = np.bincount(membership, weights=csr.degrees(), minlength=partition['communities'])
+        assert partition['resolution_modularity'] == pytest.approx(
+            csr_louvain.modularity(internal, total_degree, m, resolution))
+        if partition['warm_started']:
+            assert partition['resolution_modularity'] >= cold.modularity[-1] - 0.01
+        else:
+            assert membership.tolist() == cold.membership().tolist()
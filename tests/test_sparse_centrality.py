@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import networkx as nx
+import numpy as np
+
+from centrality import sparse_centrality
+from louvain.csr_graph import from_networkx
+
+
+def test_centrality_cache_from_several_threads(monkeypatch):
+    monkeypatch.setattr(sparse_centrality, 'centralities', type(sparse_centrality.centralities)())
+    monkeypatch.setattr(sparse_centrality, 'max_cached_centralities', 2)
+    graphs = [from_networkx(nx.gnm_random_graph(200, 800, seed=seed)) for seed in range(6)]
+    expected = {(g, measure): sparse_centrality.measures[measure](graph)
+                for g, graph in enumerate(graphs) for measure in ('degree', 'pagerank')}
+    queries = [(q % len(graphs), ('degree', 'pagerank')[q % 4 // 2]) for q in range(400)]
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda query: sparse_centrality.centrality(graphs[query[0]], query[1]), queries))
+    for query, scores in zip(queries, results):
+        assert np.allclose(scores, expected[query])
+    assert len(sparse_centrality.centralities) <= 2
@@ -7,11 +7,10 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.colors as pltc
 
-graph = nx.Graph()
-pos = nx.spring_layout(graph, iterations=100)
+from visualization.layout_cache import node_positions
 
 
-def visualize_network(graph_network, file_name, communities, path, edge_color):
+def visualize_network(graph_network, file_name, communities, path, edge_color, pos=None):
     """
     Visualizes communities and potential paths of the network.
 
@@ -20,11 +19,9 @@ def visualize_network(graph_network, file_name, communities, path, edge_color):
     :param communities: list of communities to be colored
     :param path: potential paths that should be colored
     :param edge_color: color of potential paths to be used
+    :param pos: node positions, by default the cached spring layout of the graph (see layout_cache.node_positions)
     :return: graph visualization including colored communities and colored paths.
     """
-    global graph, pos
-    graph = graph_network
-
     print('Visualizing Network...')
     plt.figure(num=None, figsize=(100, 100), dpi=300)
     plt.axis('off')
@@ -33,20 +30,21 @@ def visualize_network(graph_network, file_name, communities, path, edge_color):
     colors = sample(all_colors, len(communities))
 
     i = 0
-    pos = nx.spring_layout(graph, iterations=100)
+    if pos is None:
+        pos = node_positions(graph_network)
     for community in communities:
         community = [node.key for node in community.total_nodes]
-        nx.draw_networkx_nodes(graph, pos, nodelist=community, node_color=colors[i])
+        nx.draw_networkx_nodes(graph_network, pos, nodelist=community, node_color=colors[i])
         i += 1
-    nx.draw_networkx_edges(graph, pos, edge_color='k', width=0.01)
-    nx.draw_networkx_labels(graph, pos)
+    nx.draw_networkx_edges(graph_network, pos, edge_color='k', width=0.01)
+    nx.draw_networkx_labels(graph_network, pos)
 
     if len(path) > 0:
         edge_list = []
         for i in range(len(path) - 1):
             edge = (path[i], path[i + 1])
             edge_list.append(edge)
-        nx.draw_networkx_edges(graph, pos, edgelist=edge_list, edge_color=edge_color, width=0.1)
+        nx.draw_networkx_edges(graph_network, pos, edgelist=edge_list, edge_color=edge_color, width=0.1)
 
     cut = 1.4
     xmax = cut * max(xx for xx, yy in pos.values())
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import networkx as nx
+
+from louvain.csr_graph import as_csr
+from random_walk.batched_walks import node_community_array
+
+layouts = OrderedDict()  # in-memory cache: (graph fingerprint, method, partition hash, seed) -> positions array
+max_cached_layouts = 4  # layouts kept in memory, the least recently used one is dropped beyond
+layouts_lock = threading.Lock()  # guards the LRU order of layouts, the layouts are computed outside of it
+layout_cache_dir = os.path.join('results', '.layout_cache')
+max_community_spring_size = 1000  # larger communities are placed randomly inside their disc instead
+
+
+def node_positions(graph_network, communities=None, method='spring', cache_dir=layout_cache_dir, seed=None):
+    """
+    Returns the node positions used to draw the network, computing them only once per graph: positions are cached in
+    memory (the max_cached_layouts most recently used) and on disk, keyed by the fingerprint of the graph, the method,
+    the seed and, for the 'community' method, the partition, and reused by every community and walk rendering. Safe
+    to call from several threads.
+    :param graph_network: graph of the network, networkx graph or CSRGraph
+    :param communities: list of communities, needed by the 'community' method
+    :param method: 'spring' runs nx.spring_layout over the whole graph (100 iterations), 'community' lays out the
+        graph of communities and then every community inside its own disc, which is much faster on large graphs
+    :param cache_dir: directory of the persisted layouts, None disables the disk cache
+    :param seed: seed of the layout
+    :return: dictionary of node key -> (x, y) position, as returned by nx.spring_layout
+    """
+    csr = as_csr(graph_network)
+    cache_key = (csr.fingerprint(), method, partition_hash(csr, communities) if method == 'community' else 'any',
+                 str(seed))
+    with layouts_lock:
+        positions = layouts.get(cache_key)
+    cache_path = os.path.join(cache_dir, '-'.join(cache_key) + '.npy') if cache_dir else None
+
+    if positions is None and cache_path and os.path.exists(cache_path):
+        positions = np.load(cache_path)
+    if positions is None:
+        if method == 'spring':
+            graph = graph_network if isinstance(graph_network, nx.Graph) else csr.to_networkx()
+            layout = nx.spring_layout(graph, iterations=100, seed=seed)
+            positions = np.array([layout[label] for label in csr.labels]).reshape(-1, 2)
+        elif method == 'community':
+            positions = community_layout(csr, communities, seed)
+        else:
+            raise ValueError('Unknown layout method: ' + str(method))
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(cache_path, positions)
+    with layouts_lock:
+        layouts[cache_key] = positions
+        layouts.move_to_end(cache_key)
+        if len(layouts) > max_cached_layouts:
+            layouts.popitem(last=False)
+    return dict(zip(csr.labels, positions))
+
+
+def partition_hash(csr, communities):
+    """
+    Hash of the partition of the nodes into communities, as part of the key of the cached community layouts.
+    :param csr: CSRGraph of the network
+    :param communities: list of communities, None if there are none
+    :return: hex string of the sha256 hash (shortened), 'none' without communities
+    """
+    if communities is None:
+        return 'none'
+    return hashlib.sha256(node_community_array(csr, communities).tobytes()).hexdigest()[:16]
+
+
+def community_layout(csr, communities, seed=None):
+    """
+    Community-aware layout: the communities are laid out as weighted graph of super-nodes, then every community is
+    laid out separately inside a disc around its position, with a size depending on the number of its members.
+    :param csr: CSRGraph of the network
+    :param communities: list of communities found by louvain_method
+    :param seed: seed of the layout
+    :return: array with the (x, y) position of each node, in the node order of the graph
+    """
+    if communities is None:
+        raise ValueError('The community layout needs the communities of the graph')
+    rng = np.random.default_rng(seed)
+    n = csr.number_of_nodes()
+    index = csr.index
+    members = [np.array([index[node.key] for node in community.total_nodes], dtype=np.int64)
+               for community in communities]
+    community_of = np.zeros(n, dtype=np.int64)
+    for community_index, nodes in enumerate(members):
+        community_of[nodes] = community_index
+
+    # graph of communities, weighted by the number of edges between them
+    pairs, weights = community_edges(csr, community_of)
+    community_graph = nx.Graph()
+    community_graph.add_nodes_from(range(len(communities)))
+    community_graph.add_weighted_edges_from(zip(pairs[0].tolist(), pairs[1].tolist(), weights.tolist()))
+    centres = nx.spring_layout(community_graph, weight='weight', seed=int(rng.integers(0, 2 ** 32)))
+
+    positions = np.zeros((n, 2))
+    for community_index, nodes in enumerate(members):
+        radius = np.sqrt(nodes.size / n)
+        if 1 < nodes.size <= max_community_spring_size:
+            local = nx.spring_layout(community_subgraph(csr, nodes), iterations=30,
+                                     seed=int(rng.integers(0, 2 ** 32)))
+            offsets = np.array([local[i] for i in range(nodes.size)])
+        else:  # uniformly inside the disc
+            angles = rng.uniform(0, 2 * np.pi, nodes.size)
+            distances = np.sqrt(rng.uniform(0, 1, nodes.size))
+            offsets = np.stack([distances * np.cos(angles), distances * np.sin(angles)], axis=1)
+        positions[nodes] = centres[community_index] + radius * offsets
+    return positions
+
+
+def community_edges(csr, community_of):
+    """
+    Aggregates the edges of the graph into edges between communities.
+    :param csr: CSRGraph of the network
+    :param community_of: community index of each node
+    :return: (2 x k array of community pairs with the smaller index first, number of edges between each pair)
+    """
+    source = community_of[np.repeat(np.arange(csr.number_of_nodes()), np.diff(csr.indptr))]
+    target = community_of[csr.indices]
+    between = source < target
+    return np.unique(np.stack([source[between], target[between]]), axis=1, return_counts=True)
+
+
+def community_subgraph(csr, nodes):
+    """
+    Builds the networkx graph induced by a set of nodes, with the nodes renumbered 0..k-1 in the given order.
+    :param csr: CSRGraph of the network
+    :param nodes: integer array of the nodes
+    :return: networkx graph of the induced subgraph
+    """
+    local_index = {node: i for i, node in enumerate(nodes.tolist())}
+    subgraph = nx.Graph()
+    subgraph.add_nodes_from(range(nodes.size))
+    for i, node in enumerate(nodes.tolist()):
+        for neighbour in csr.indices[csr.indptr[node]:csr.indptr[node + 1]].tolist():
+            j = local_index.get(neighbour)
+            if j is not None and j > i:
+                subgraph.add_edge(i, j)
+    return subgraph
@@ -0,0 +1,140 @@
+from __future__ import division
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+
+from louvain.csr_graph import as_csr
+from random_walk.batched_walks import node_community_array
+from visualization.layout_cache import community_edges, node_positions
+
+max_vector_segments = 5000  # walk overlays with more distinct edges are rasterized as well
+
+
+class NetworkRenderer:
+    """
+    Level-of-detail renderer: draws the base picture of the network (all edges as one collection, nodes colored by
+    community, or one super-node per community) once into an image, and renders every output, e.g. one per random
+    walk, as that cached image plus an overlay. The size of every output is bounded by the image resolution instead of
+    growing with the number of nodes and edges.
+    """
+
+    def __init__(self, graph_network, communities, pos=None, view='nodes', labels=(), figsize=(16, 16), dpi=150,
+                 seed=None):
+        """
+        :param graph_network: graph of the network, networkx graph or CSRGraph
+        :param communities: list of communities to be colored
+        :param pos: node positions, by default the cached community layout (see layout_cache.node_positions)
+        :param view: 'nodes' draws every node and edge, 'communities' draws one super-node per community and one
+            super-edge per pair of connected communities
+        :param labels: keys of the nodes to be labelled, e.g. the top users; no other node gets a label
+        :param figsize: size of the outputs in inches
+        :param dpi: resolution of the base image and the outputs
+        :param seed: seed of the community colors
+        """
+        self.csr = as_csr(graph_network)
+        self.communities = communities
+        self.view = view
+        self.labels = list(labels)
+        self.figsize = figsize
+        self.dpi = dpi
+
+        if pos is None:
+            pos = node_positions(self.csr, communities, method='community')
+        self.positions = np.array([pos[label] for label in self.csr.labels]).reshape(-1, 2)
+        self.community_of = node_community_array(self.csr, communities)
+        sizes = np.bincount(self.community_of, minlength=len(communities))
+        self.centres = np.zeros((len(communities), 2))
+        np.add.at(self.centres, self.community_of, self.positions)
+        self.centres /= np.maximum(sizes, 1)[:, None]
+        self.sizes = sizes
+
+        rng = np.random.default_rng(seed)
+        self.colors = plt.get_cmap('hsv')(rng.permutation(np.linspace(0, 1, max(len(communities), 1),
+                                                                      endpoint=False)))
+        lower = self.positions.min(axis=0)
+        upper = self.positions.max(axis=0)
+        margin = 0.05 * np.maximum(upper - lower, 1e-9)
+        self.limits = (lower[0] - margin[0], upper[0] + margin[0], lower[1] - margin[1], upper[1] + margin[1])
+        self.base = self.render_base()
+
+    def new_axes(self):
+        """
+        Creates a figure whose axes cover the whole canvas, so that the base image and the overlays line up.
+        :return: (figure, axes)
+        """
+        fig = Figure(figsize=self.figsize, dpi=self.dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        ax.set_xlim(self.limits[0], self.limits[1])
+        ax.set_ylim(self.limits[2], self.limits[3])
+        return fig, ax
+
+    def render_base(self):
+        """
+        Draws the network once and keeps it as an RGBA image.
+        :return: image array of the base picture
+        """
+        print('Rendering base picture of the network...')
+        fig, ax = self.new_axes()
+        if self.view == 'communities':
+            pairs, weights = community_edges(self.csr, self.community_of)
+            ax.add_collection(LineCollection(self.centres[pairs.T], colors='k', alpha=0.4,
+                                             linewidths=0.2 + np.log1p(weights) / 4))
+            ax.scatter(self.centres[:, 0], self.centres[:, 1], s=20 * np.sqrt(self.sizes), c=self.colors,
+                       edgecolors='k', linewidths=0.3, zorder=2)
+        elif self.view == 'nodes':
+            source = np.repeat(np.arange(self.csr.number_of_nodes()), np.diff(self.csr.indptr))
+            target = np.asarray(self.csr.indices)
+            forward = source < target
+            ax.plot(*segment_line(self.positions[source[forward]], self.positions[target[forward]]), color='k',
+                    alpha=0.15, linewidth=0.1)
+            ax.scatter(self.positions[:, 0], self.positions[:, 1], s=2, c=self.colors[self.community_of],
+                       linewidths=0, zorder=2)
+        else:
+            raise ValueError('Unknown view: ' + str(self.view))
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba()).copy()
+
+    def render(self, file_name, path=(), edge_color='r'):
+        """
+        Saves the cached base picture together with a walk overlay and the labels of the selected nodes.
+        :param file_name: name of the output file, the format follows the extension (e.g. .pdf, .png)
+        :param path: potential path (list of node keys) to be highlighted
+        :param edge_color: color of the path
+        """
+        fig, ax = self.new_axes()
+        ax.imshow(self.base, extent=self.limits, interpolation='nearest', aspect='auto', zorder=0)
+
+        if len(path) > 1:
+            nodes = np.array([self.csr.index[key] for key in path], dtype=np.int64)
+            points = self.centres[self.community_of[nodes]] if self.view == 'communities' else self.positions[nodes]
+            ends = self.community_of[nodes] if self.view == 'communities' else nodes
+            # every traversed edge is drawn once, however often the walk crossed it
+            steps = np.stack([np.minimum(ends[:-1], ends[1:]), np.maximum(ends[:-1], ends[1:])], axis=1)
+            _, first = np.unique(steps, axis=0, return_index=True)
+            first = first[steps[first, 0] != steps[first, 1]]
+            ax.plot(*segment_line(points[first], points[first + 1]), color=edge_color, linewidth=0.6, zorder=1,
+                    rasterized=first.size > max_vector_segments)
+            ax.scatter(points[:1, 0], points[:1, 1], s=40, c=edge_color, marker='*', zorder=2)
+
+        for key in self.labels:
+            x, y = self.positions[self.csr.index[key]]
+            ax.text(x, y, str(key), fontsize=6, zorder=3)
+        fig.savefig(file_name, dpi=self.dpi)
+        print('Finished visualization, saved as ', file_name, '\n')
+
+
+def segment_line(start, end):
+    """
+    Joins line segments into one line broken by NaN points, which matplotlib draws as a single path: much faster than a
+    collection of one path per segment, with the same picture.
+    :param start: k x 2 array with the start points of the segments
+    :param end: k x 2 array with the end points of the segments
+    :return: (x, y) coordinate arrays of the joined line
+    """
+    points = np.stack([start, end, np.full_like(start, np.nan)], axis=1).reshape(-1, 2)
+    return points[:, 0], points[:, 1]